@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the YouTube to PDF bot hot paths (no YouTube needed)
+
+Usage:
+    python benchmark.py sampling [--video FILE] [--duration 120] [--n 400]
+    python benchmark.py similarity [--pairs 2000] [--batch 32]
+    python benchmark.py suite [--lengths 60,180] [--resolutions 640x360,1280x720] [--n 15,30] [--ssim-thresholds 1,0.9]
+                              [--json results.json] [--baseline old.json] [--max-regression 0.25]
+                              [--max-accuracy-drop 0.05] [--min-recall 0.9] [--min-precision 0.9]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+import main as bot
+
+try:
+    import resource  # Peak RSS - Windows पर नहीं है
+except ImportError:
+    resource = None
+
+
+def make_synthetic_video(path, duration_seconds=120, fps=30, size=(1280, 720), slide_seconds=10, seed=0,
+                         noise=0, talking_head=False):
+    """Slides वाली deterministic video बनाता है और slide change times (seconds) लौटाता है
+
+    noise (pixel amplitude) हर frame पर sensor/compression जैसा noise डालता है और
+    talking_head कोने में हिलता-बोलता चेहरा - दोनों slide change नहीं हैं।
+    """
+    rng = np.random.RandomState(seed)
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    # हर frame पर नया noise बनाना धीमा है - कुछ patterns बारी-बारी से
+    noise_patterns = [
+        (rng.randint(0, noise + 1, size=(height, width, 3)).astype(np.uint8),
+         rng.randint(0, noise + 1, size=(height, width, 3)).astype(np.uint8))
+        for _ in range(8)
+    ] if noise else []
+    head_radius = max(12, height // 10)
+    head_center = (width - head_radius * 2, height - head_radius * 2)
+    change_times = []
+    slide = None
+    total_frames = int(duration_seconds * fps)
+    for frame_index in range(total_frames):
+        if frame_index % int(slide_seconds * fps) == 0:
+            slide_number = len(change_times)
+            change_times.append(frame_index / fps)
+            slide = np.full((height, width, 3), 255, dtype=np.uint8)
+            color = tuple(int(c) for c in rng.randint(0, 200, size=3))
+            # Layout resolution के अनुपात में - हर slide पर अलग lines और एक figure
+            scale = height / 720
+            cv2.rectangle(slide, (int(40 * scale), int(40 * scale)), (width - int(40 * scale), int(140 * scale)), color, -1)
+            cv2.putText(slide, f"Slide {slide_number + 1}", (int(60 * scale), int(115 * scale)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 2 * scale, (255, 255, 255), max(1, int(4 * scale)))
+            for line in range(rng.randint(2, 7)):
+                y = int((220 + line * 70) * scale)
+                line_width = int(rng.randint(width // 6, width // 2))
+                cv2.rectangle(slide, (int(80 * scale), y), (int(80 * scale) + line_width, y + int(30 * scale)),
+                              (60, 60, 60), -1)
+            figure_x = int(rng.randint(width // 2 + 20, width - width // 6))
+            figure_y = int(rng.randint(height // 3, height // 2))
+            figure_color = tuple(int(c) for c in rng.randint(0, 256, size=3))
+            cv2.rectangle(slide, (figure_x - width // 8, figure_y - height // 8),
+                          (figure_x + width // 12, figure_y + height // 8), figure_color, -1)
+        frame = slide
+        if noise_patterns:
+            add, subtract = noise_patterns[frame_index % len(noise_patterns)]
+            frame = cv2.subtract(cv2.add(slide, add), subtract)
+        if talking_head:
+            if frame is slide:
+                frame = slide.copy()
+            phase = frame_index / fps
+            center = (head_center[0] + int(head_radius * 0.3 * np.sin(phase * 1.3)),
+                      head_center[1] + int(head_radius * 0.15 * np.sin(phase * 2.1)))
+            cv2.rectangle(frame, (head_center[0] - head_radius * 2, head_center[1] - head_radius * 2),
+                          (width, height), (90, 110, 130), -1)
+            cv2.circle(frame, center, head_radius, (150, 180, 220), -1)
+            mouth_open = 1 + int(head_radius * 0.25 * abs(np.sin(phase * 9)))
+            cv2.ellipse(frame, (center[0], center[1] + head_radius // 2), (head_radius // 3, mouth_open),
+                        0, 0, 360, (40, 40, 120), -1)
+        writer.write(frame)
+    writer.release()
+    return change_times
+
+
+def bench_sampling(args):
+    """पुराना read-every-frame loop बनाम नए sampling modes"""
+    with tempfile.TemporaryDirectory() as temp_folder:
+        video_path = args.video
+        if not video_path:
+            video_path = os.path.join(temp_folder, 'synthetic.mp4')
+            print(f"🎞️  Generating {args.duration}s synthetic video...")
+            make_synthetic_video(video_path, duration_seconds=args.duration)
+
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        video_seconds = total_frames / fps
+
+        print(f"📹 {video_path}: {video_seconds:.0f}s @ {fps:.0f} fps, n={args.n}")
+        print(f"{'mode':<10} {'wall s':>8} {'full/vsec':>10} {'grab/vsec':>10} {'seeks':>7} {'samples':>8} {'speedup':>8}")
+
+        # Baseline: पुराना loop - हर frame cap.read() (decode + BGR conversion)
+        cap = cv2.VideoCapture(video_path)
+        started = time.perf_counter()
+        decoded = 0
+        samples = 0
+        frame_number = 0
+        while frame_number < total_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            decoded += 1
+            if frame_number % args.n == 0:
+                samples += 1
+            frame_number += 1
+        baseline_seconds = time.perf_counter() - started
+        cap.release()
+        print(f"{'baseline':<10} {baseline_seconds:>8.2f} {decoded / video_seconds:>10.2f} {0:>10.2f} "
+              f"{0:>7} {samples:>8} {1:>7.2f}x")
+
+        for mode in ('exact', 'keyframe'):
+            cap = cv2.VideoCapture(video_path)
+            counters = {}
+            started = time.perf_counter()
+            samples = sum(1 for _ in bot.iter_sampled_frames(cap, 0, total_frames, args.n, mode, counters))
+            elapsed = time.perf_counter() - started
+            cap.release()
+            print(f"{mode:<10} {elapsed:>8.2f} {counters['retrieved'] / video_seconds:>10.2f} "
+                  f"{counters['grabbed'] / video_seconds:>10.2f} {counters['seeks']:>7} {samples:>8} "
+                  f"{baseline_seconds / max(elapsed, 1e-9):>7.2f}x")
+
+        if not args.video:
+            print("ℹ️  Synthetic mp4v files have short keyframe intervals; use --video with a real "
+                  "YouTube download to measure 'keyframe' mode realistically.")
+
+
+def make_similarity_pairs(pairs, seed=0):
+    """SSIM size के gray frames: ज़्यादातर same slide + noise, कुछ slide changes"""
+    rng = np.random.RandomState(seed)
+    height, width = bot.SSIM_RESIZE_DIM[1], bot.SSIM_RESIZE_DIM[0]
+    slides = rng.randint(0, 256, size=(8, height, width)).astype(np.int16)
+    slides = np.stack([cv2.GaussianBlur(slide.astype(np.uint8), (9, 9), 0) for slide in slides]).astype(np.int16)
+    frames = np.empty((pairs + 1, height, width), dtype=np.uint8)
+    slide_index = 0
+    for i in range(pairs + 1):
+        if rng.rand() < 0.1:
+            slide_index = rng.randint(len(slides))
+        noise = rng.randint(-3, 4, size=(height, width))
+        frames[i] = np.clip(slides[slide_index] + noise, 0, 255)
+    return frames[1:], frames[:-1]
+
+
+def bench_similarity(args):
+    """skimage per-pair SSIM बनाम batch_ssim - समय और decisions का मिलान"""
+    current, previous = make_similarity_pairs(args.pairs)
+
+    started = time.perf_counter()
+    reference = bot.compute_similarities(current, previous, engine='skimage')
+    skimage_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batched = np.concatenate([
+        bot.batch_ssim(current[i:i + args.batch], previous[i:i + args.batch])
+        for i in range(0, len(current), args.batch)
+    ])
+    batch_seconds = time.perf_counter() - started
+
+    print(f"🔬 {args.pairs} pairs of {bot.SSIM_RESIZE_DIM[0]}x{bot.SSIM_RESIZE_DIM[1]}, batch={args.batch}")
+    print(f"{'engine':<10} {'wall s':>8} {'pairs/s':>10} {'speedup':>8}")
+    print(f"{'skimage':<10} {skimage_seconds:>8.3f} {args.pairs / skimage_seconds:>10.0f} {1:>7.2f}x")
+    print(f"{'batch':<10} {batch_seconds:>8.3f} {args.pairs / batch_seconds:>10.0f} "
+          f"{skimage_seconds / max(batch_seconds, 1e-9):>7.2f}x")
+    print(f"📏 max |Δ SSIM| = {np.abs(reference - batched).max():.2e}")
+    for threshold in (0.5, 0.8, 0.9, 0.95, 1.0):
+        mismatches = int(np.sum((reference < threshold) != (batched < threshold)))
+        print(f"   threshold {threshold:<5} decision mismatches: {mismatches}")
+
+
+def peak_rss_mb():
+    """इस process का अब तक का peak RSS (MB); पता न चले तो None
+
+    Linux पर /proc का VmHWM - ru_maxrss spawn से पहले वाले parent का peak भी ले आता है।
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # macOS पर bytes, Linux पर KB
+
+
+def match_detections(detected_times, change_times, tolerance):
+    """Detected page timestamps को ground truth से मिलाता है - (precision, recall)
+
+    हर change time ज़्यादा से ज़्यादा एक detection से tolerance seconds के अंदर match होता है।
+    """
+    unmatched = sorted(change_times)
+    matched = 0
+    for detected in sorted(detected_times):
+        nearest = min(unmatched, key=lambda t: abs(t - detected), default=None)
+        if nearest is not None and abs(nearest - detected) <= tolerance:
+            unmatched.remove(nearest)
+            matched += 1
+    precision = matched / len(detected_times) if detected_times else 0.0
+    recall = matched / len(change_times) if change_times else 1.0
+    return precision, recall
+
+
+def run_suite_case(case):
+    """एक case (fresh process में) - extraction और PDF stage का समय, memory और accuracy"""
+    started_rss = peak_rss_mb()
+    profile = bot.get_quality_profile(case['profile'])
+    counters = {}
+    started = time.perf_counter()
+    pages = bot.EXTRACTION_STRATEGIES[case['strategy']](
+        case['video'], None, 0, case['duration'], 0, n=case['n'], ssim_threshold=case['ssim_threshold'],
+        counters=counters, quality_profile=case['profile']
+    )
+    extract_seconds = time.perf_counter() - started
+
+    pdf_path = os.path.join(case['work_dir'], f"{case['name']}.pdf")
+    started = time.perf_counter()
+    pdf_pages = bot.convert_frames_to_pdf_chunk(None, pdf_path, pages, 0, profile['page_format'])
+    pdf_seconds = time.perf_counter() - started
+    pdf_bytes = os.path.getsize(pdf_path) if pdf_pages else 0
+    bot.remove_file_quietly(pdf_path)
+
+    precision, recall = match_detections([page.timestamp_seconds for page in pages], case['change_times'],
+                                         case['tolerance'])
+    peak = peak_rss_mb()
+    return {
+        'extract_seconds': extract_seconds,
+        'video_fps': case['frames'] / max(extract_seconds, 1e-9),
+        'pdf_seconds': pdf_seconds,
+        'pages': pdf_pages,
+        'pdf_bytes': pdf_bytes,
+        'peak_rss_mb': peak,
+        'rss_growth_mb': peak - started_rss if peak is not None else None,
+        'precision': precision,
+        'recall': recall,
+        'frames_sampled': counters.get('retrieved', 0),
+    }
+
+
+def parse_list(text, convert=int):
+    return [convert(item) for item in text.split(',') if item.strip()]
+
+
+def parse_resolution(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def check_regressions(results, baseline, args):
+    """Baseline से तुलना (accuracy भी) और सिर्फ दिए गए absolute accuracy floors - failures की list"""
+    failures = []
+    for name, result in results.items():
+        if args.min_recall is not None and result['recall'] < args.min_recall:
+            failures.append(f"{name}: recall {result['recall']:.2f} < {args.min_recall}")
+        if args.min_precision is not None and result['precision'] < args.min_precision:
+            failures.append(f"{name}: precision {result['precision']:.2f} < {args.min_precision}")
+        old = baseline.get(name)
+        if not old:
+            continue
+        for metric in ('recall', 'precision'):
+            if result[metric] < old[metric] - args.max_accuracy_drop:
+                failures.append(f"{name}: {metric} {result[metric]:.2f} vs baseline {old[metric]:.2f}")
+        allowed = 1 + args.max_regression
+        if result['video_fps'] * allowed < old['video_fps']:
+            failures.append(f"{name}: extraction {result['video_fps']:.0f} fps vs baseline {old['video_fps']:.0f}")
+        # बहुत छोटे समय में scheduler का noise ही ज़्यादा होता है
+        if result['pdf_seconds'] > old['pdf_seconds'] * allowed + 0.05:
+            failures.append(f"{name}: PDF {result['pdf_seconds']:.2f}s vs baseline {old['pdf_seconds']:.2f}s")
+        if result['pdf_bytes'] > old['pdf_bytes'] * allowed:
+            failures.append(f"{name}: PDF {result['pdf_bytes']} bytes vs baseline {old['pdf_bytes']}")
+        if result['peak_rss_mb'] and old.get('peak_rss_mb') and result['peak_rss_mb'] > old['peak_rss_mb'] * allowed:
+            failures.append(f"{name}: peak RSS {result['peak_rss_mb']:.0f} MB vs baseline {old['peak_rss_mb']:.0f} MB")
+    return failures
+
+
+def bench_suite(args):
+    """Synthetic lecture videos पर extraction + PDF stages - lengths x resolutions x n
+
+    हर case अलग process में चलता है ताकि peak RSS उसी case का हो। --baseline से
+    --max-regression से ज़्यादा धीमा/बड़ा होने या --max-accuracy-drop से ज़्यादा accuracy
+    गिरने पर exit code 1। Absolute accuracy हमेशा print होती है, पर gate सिर्फ तब
+    जब --min-recall / --min-precision दिए हों।
+    """
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"🧪 strategy={args.strategy}, profile={args.profile}, noise={args.noise}, "
+              f"talking_head={not args.no_talking_head} (bot SSIM_THRESHOLD={bot.SSIM_THRESHOLD})")
+        print(f"{'case':<30} {'extract s':>9} {'video fps':>9} {'pdf s':>7} {'pages':>6} {'pdf KB':>8} "
+              f"{'RSS MB':>7} {'+RSS':>6} {'prec':>5} {'recall':>6}")
+        for length in parse_list(args.lengths):
+            for width, height in [parse_resolution(r) for r in args.resolutions.split(',')]:
+                video = os.path.join(work_dir, f"lecture_{length}s_{width}x{height}.mp4")
+                change_times = make_synthetic_video(
+                    video, duration_seconds=length, fps=args.fps, size=(width, height),
+                    slide_seconds=args.slide_seconds, seed=args.seed, noise=args.noise,
+                    talking_head=not args.no_talking_head
+                )
+                for n, ssim_threshold in [(n, t) for n in parse_list(args.n)
+                                          for t in parse_list(args.ssim_thresholds, float)]:
+                    name = f"{length}s_{width}x{height}_n{n}_t{ssim_threshold:g}"
+                    case = {
+                        'name': name, 'video': video, 'work_dir': work_dir, 'duration': length,
+                        'frames': int(length * args.fps), 'n': n, 'strategy': args.strategy,
+                        'ssim_threshold': ssim_threshold, 'profile': args.profile,
+                        'change_times': change_times,
+                        # Page timestamp पूरे seconds में और change अगले sample पर ही दिखता है
+                        'tolerance': args.tolerance if args.tolerance is not None else n / args.fps + 1,
+                    }
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        result = results[name] = executor.submit(run_suite_case, case).result()
+                    rss = f"{result['peak_rss_mb']:>7.0f} {result['rss_growth_mb']:>6.0f}" \
+                        if result['peak_rss_mb'] is not None else f"{'n/a':>7} {'n/a':>6}"
+                    print(f"{name:<30} {result['extract_seconds']:>9.2f} {result['video_fps']:>9.0f} "
+                          f"{result['pdf_seconds']:>7.3f} {result['pages']:>6} {result['pdf_bytes'] / 1024:>8.0f} "
+                          f"{rss} {result['precision']:>5.2f} {result['recall']:>6.2f}")
+                os.remove(video)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': {key: value for key, value in vars(args).items() if key != 'func'},
+                       'results': results}, f, indent=2)
+        print(f"💾 Results saved: {args.json}")
+
+    if results:
+        precisions = [result['precision'] for result in results.values()]
+        recalls = [result['recall'] for result in results.values()]
+        print(f"🎯 Absolute accuracy: precision min {min(precisions):.2f} / mean {sum(precisions) / len(precisions):.2f}, "
+              f"recall min {min(recalls):.2f} / mean {sum(recalls) / len(recalls):.2f}")
+
+    failures = check_regressions(results, baseline, args)
+    if failures:
+        print(f"❌ {len(failures)} check(s) failed:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print(f"✅ {len(results)} cases passed" + (f" (baseline: {args.baseline})" if args.baseline else ""))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+
+    sampling = subparsers.add_parser('sampling', help='frames decoded per second of video, before/after')
+    sampling.add_argument('--video', help='existing video file (default: generate a synthetic one)')
+    sampling.add_argument('--duration', type=int, default=120, help='synthetic video length in seconds')
+    sampling.add_argument('--n', type=int, default=bot.FRAME_SKIP_FOR_SSIM_CHECK, help='sampling stride')
+    sampling.set_defaults(func=bench_sampling)
+
+    similarity = subparsers.add_parser('similarity', help='batch SSIM vs skimage per-pair SSIM')
+    similarity.add_argument('--pairs', type=int, default=2000, help='number of adjacent frame pairs')
+    similarity.add_argument('--batch', type=int, default=bot.SSIM_BATCH_SIZE, help='batch size for batch_ssim')
+    similarity.set_defaults(func=bench_similarity)
+
+    suite = subparsers.add_parser('suite', help='extraction + PDF stages on synthetic lectures, with accuracy '
+                                                'and regression checks')
+    suite.add_argument('--lengths', default='60,180', help='video lengths in seconds (comma separated)')
+    suite.add_argument('--resolutions', default='640x360,1280x720', help='WxH list (comma separated)')
+    suite.add_argument('--n', default='15,30', help='sampling strides (comma separated)')
+    suite.add_argument('--fps', type=int, default=30, help='synthetic video frame rate')
+    suite.add_argument('--slide-seconds', type=float, default=10, help='time between slide changes')
+    suite.add_argument('--noise', type=int, default=6, help='per-frame pixel noise amplitude (0 = none)')
+    suite.add_argument('--no-talking-head', action='store_true', help='no moving presenter overlay')
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--strategy', default=bot.EXTRACTION_STRATEGY, choices=sorted(bot.EXTRACTION_STRATEGIES))
+    suite.add_argument('--ssim-thresholds', default=f'{bot.SSIM_THRESHOLD:g}',
+                       help='change thresholds to test, comma separated (default: the bot\'s SSIM_THRESHOLD, '
+                            'so the reported accuracy reflects production)')
+    suite.add_argument('--profile', default=bot.DEFAULT_QUALITY_PROFILE, choices=sorted(bot.QUALITY_PROFILES))
+    suite.add_argument('--tolerance', type=float, help='seconds a detection may be off (default: n/fps + 1)')
+    suite.add_argument('--min-recall', type=float, help='fail below this slide-change recall (default: no floor)')
+    suite.add_argument('--min-precision', type=float, help='fail below this detection precision (default: no floor)')
+    suite.add_argument('--baseline', help='results JSON from an earlier --json run to compare against')
+    suite.add_argument('--max-regression', type=float, default=0.25,
+                       help='allowed fractional slowdown / growth vs baseline before failing')
+    suite.add_argument('--max-accuracy-drop', type=float, default=0.05,
+                       help='allowed absolute precision / recall drop vs baseline before failing')
+    suite.add_argument('--json', help='write results JSON here (usable as a later --baseline)')
+    suite.set_defaults(func=bench_suite)
+
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        sys.exit(1)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
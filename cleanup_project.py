@@ -11,8 +11,12 @@ keep_files = {
     'README.md',
     'data.json',
     'extract_and_merge_users.py',
+    'benchmark.py',
     'cookies.txt',
 }
+# Job queue, users DB और downloads अब bot_state/ (BOT_STATE_DIR) folder में हैं - यह script सिर्फ
+# root की files हटाती है, इसलिए वो folder सुरक्षित रहता है
+
 
 # Remove unnecessary files in root
 for fname in os.listdir('.'):
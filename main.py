@@ -8,18 +8,29 @@ import asyncio
 import numpy as np
 from telegram import Update
 from telegram.constants import ChatAction
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters
 from fpdf import FPDF
 from PIL import Image
 import yt_dlp
 from skimage.metrics import structural_similarity as ssim
 from threading import Semaphore
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 import threading
 import uuid
 import logging
-import io
 import json
+import copy
+import sqlite3
+import hashlib
+import shutil
+import subprocess
+import multiprocessing
+from collections import namedtuple, OrderedDict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # Logging setup - Clean console output
 logging.basicConfig(
@@ -47,55 +58,888 @@ CHANNEL_USERNAME = '@alluserpdf'  # आपका channel username
 SSIM_THRESHOLD = 1  # समानता का थ्रेशोल्ड
 SSIM_RESIZE_DIM = (128, 72) # SSIM तुलना के लिए फ्रेम का आकार
 FRAME_SKIP_FOR_SSIM_CHECK = 400 # हर 400th फ्रेम पर SSIM जांच
+# Frame sampling mode:
+#   'exact'    - हर n-th frame; बीच के frames सिर्फ grab() होते हैं (BGR conversion/copy नहीं)
+#   'keyframe' - हर sample पर seek; decoder पिछले keyframe से शुरू करता है, इसलिए जब n
+#                keyframe interval से बड़ा हो तो बीच के पूरे GOPs decode ही नहीं होते
+FRAME_SAMPLING_MODE = 'exact'
+# Frame source: 'opencv' (cv2.VideoCapture) या 'ffmpeg' (decoder के अंदर scaling, gray frames pipe से)
+FRAME_SOURCE = 'opencv'
+FFMPEG_BINARY = 'ffmpeg'
+FRAME_RENDER_DIM = (640, 360)  # PDF में जाने वाले frame का आकार
+# Similarity engine: 'batch' (पूरे batch का SSIM एक साथ NumPy में) या 'skimage' (हर pair पर अलग call)
+SIMILARITY_ENGINE = 'batch'
+SSIM_BATCH_SIZE = 8  # एक बार में कितने sampled frames का SSIM निकलेगा (छोटा batch CPU cache में रहता है)
+# Prefilter - साफ cases SSIM के बिना तय होते हैं: pixel-identical pair = same (SSIM 1, हर threshold पर सही)
+# और 64-bit dHash की बड़ी Hamming distance = slide change। छोटी hash distance "same" नहीं मानी जाती -
+# एक नया bullet जुड़ने पर भी distance 1-2 रहती है जबकि SSIM ~0.93-0.98 होता है
+HASH_PREFILTER_ENABLED = True
+HASH_DIFF_MIN_DISTANCE = 20  # इतनी या ज़्यादा distance = slide change (SSIM नहीं चलेगा)
+# Extraction strategy:
+#   'stride'     - हर n-th frame की तुलना (extract_unique_frames_for_chunk)
+#   'transition' - बहुत sparse samples, फिर binary search से exact slide change frame
+#                  (extract_transition_frames_for_chunk) - decode काम slide changes के हिसाब से बढ़ता है
+EXTRACTION_STRATEGY = 'stride'
+TRANSITION_COARSE_STEP_SECONDS = 15  # Transition strategy में coarse samples का अंतर
+TRANSITION_SEARCH_PRECISION_FRAMES = 1  # Binary search कितने frames तक सटीक होगा
+# Frame pipeline: 'memory' (JPEG bytes सीधे PDF builder को) या 'files' (debug - PNG files temp folder में)
+FRAME_PIPELINE = 'memory'
+FRAME_JPEG_QUALITY = 85  # Memory pipeline में frames की JPEG quality
+# Video-wide dedup: chunk boundary पर वही slide दोबारा नहीं, और लौटकर आई slides के लिए policy
+# 'reference' (page रहेगा पर पहले वाली image reuse होगी), 'skip' (page नहीं बनेगा) या 'keep'
+DUPLICATE_PAGE_POLICY = 'reference'
+DUPLICATE_HASH_MAX_DISTANCE = 4  # इतनी dHash distance तक की पुरानी pages को SSIM से जांचा जाता है
 
 # PDF के लिए सेटिंग्स
 PDF_FRAME_WIDTH_TARGET = 1280 # PDF में फ्रेम की चौड़ाई
 WATERMARK_TEXT = "Created by @youpdf_bot"
 MAX_PDF_PAGES = 5000 # PDF में अधिकतम पेज
+# PDF backend: 'streaming' (हर page सीधे file में, memory constant) या 'fpdf' (पूरा document memory में)
+PDF_BACKEND = 'streaming'
+# Part policy: 'size' (part PDF की size या page count पूरी होने पर बंद) या 'time' (हर chunk का अलग part)
+PART_POLICY = 'size'
+PART_TARGET_BYTES = 20 * 1024 * 1024  # एक part की लक्ष्य size (20 MB)
+PART_MAX_PAGES = 400  # एक part में अधिकतम pages
+TELEGRAM_MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # Bot API upload limit - इससे बड़ी PDF upload नहीं की जाएगी
+PDF_PAGE_SIZES = {'A5': (595.28, 420.94), 'A4': (841.89, 595.28), 'A3': (1190.55, 841.89)}  # Landscape, points में (FPDF 1.7.2 वाले)
+
+# Quality profiles - user हर request के लिए चुन सकता है (/profile या URL के बाद profile का नाम)
+# format: render size तक पहुंचने वाला सबसे छोटा stream (video-only avc1 - audio नहीं चाहिए, OpenCV decode कर ले)
+QUALITY_PROFILES = {
+    'fast': {
+        'format': 'worstvideo[height>=360][vcodec^=avc1]/worst[height>=360]/best[height<=480]/best',
+        'render_dim': (640, 360),
+        'interpolation': cv2.INTER_AREA,
+        'ffmpeg_scale': 'area',
+        'jpeg_quality': 75,
+        'page_format': 'A5',
+    },
+    'standard': {
+        'format': 'best[height<=720]/best',
+        'render_dim': FRAME_RENDER_DIM,
+        'interpolation': cv2.INTER_CUBIC,
+        'ffmpeg_scale': 'bicubic',
+        'jpeg_quality': FRAME_JPEG_QUALITY,
+        'page_format': 'A4',
+    },
+    'hq': {
+        'format': 'worstvideo[height>=720][vcodec^=avc1]/best[height>=720]/best',
+        'render_dim': (PDF_FRAME_WIDTH_TARGET, PDF_FRAME_WIDTH_TARGET * 9 // 16),
+        'interpolation': cv2.INTER_AREA,
+        'ffmpeg_scale': 'area',
+        'jpeg_quality': 90,
+        'page_format': 'A3',
+    },
+}
+DEFAULT_QUALITY_PROFILE = 'standard'
 
 # Multi-user processing के लिए settings
-MAX_CONCURRENT_TOTAL_REQUESTS = 50  # Total parallel requests allowed
-MAX_REQUESTS_PER_USER = 10  # Per user parallel requests
-CHUNK_DURATION_MINUTES = 30  # 30 मिनट के chunks
+MAX_CONCURRENT_TOTAL_REQUESTS = 50  # एक साथ चलने वाली jobs (बाकी queue में इंतज़ार करती हैं)
+MAX_REQUESTS_PER_USER = 10  # एक user की एक साथ चलने वाली jobs
+CHUNK_DURATION_MINUTES = 30  # 30 मिनट के chunks (extraction की इकाई; 'size' policy में parts इनसे अलग बनते हैं)
 MAX_VIDEO_DURATION_HOURS = 2 # अधिकतम 1.5 घंटे
 ADMIN_MAX_VIDEO_DURATION_HOURS = 50 # Admin के लिए अधिकतम 50 घंटे
 
+# Parallel chunk extraction की settings
+PARALLEL_CHUNK_EXTRACTION = True  # एक video के सभी chunks अलग-अलग CPU cores पर extract होंगे
+MAX_PARALLEL_CHUNKS_PER_VIDEO = 4  # एक video एक साथ इससे ज़्यादा chunks extract नहीं करेगी
+
+# Streaming ingestion - पूरा download खत्म होने से पहले Part 1 शुरू करना
+#   'off'       - पहले पूरी video download, फिर processing
+#   'watermark' - एक ही download; जिस chunk के bytes disk पर आ गए उसकी extraction शुरू
+#   'sections'  - हर chunk का time range yt-dlp से अलग download (ffmpeg ज़रूरी), disk पर 1-2 chunks ही
+STREAMING_INGESTION_MODE = 'off'
+STREAMING_WATERMARK_MARGIN = 0.05  # Bitrate के उतार-चढ़ाव के लिए extra downloaded fraction
+STREAMING_SECTIONS_IN_FLIGHT = 2  # Sections mode में एक साथ disk पर रहने वाले chunks
+
+# Stage-wise executors की settings
+CPU_POOL_WORKERS = os.cpu_count() or 1  # Frame extraction + PDF rendering के लिए process pool का size
+# Workers 'spawn' से बनते हैं - fork होने पर event loop, sqlite connections और threads की copy child में चली जाती
+CPU_POOL_START_METHOD = 'spawn'
+IO_POOL_WORKERS = 32  # Downloads और file I/O के लिए thread pool का size
+STAGE_LIMITS = {
+    'download': 10,               # एक साथ चलने वाले yt-dlp downloads
+    'metadata': 4,                # yt-dlp extract_info (network) - io stage के छोटे file कामों को न रोके
+    'extract': CPU_POOL_WORKERS,  # OpenCV decode + SSIM
+    'pdf': CPU_POOL_WORKERS,      # PDF rendering
+    'io': 16,                     # Cache copy जैसे छोटे file काम
+}
+
+# Metrics - हर stage का समय (histograms) और counters; /stats, optional Prometheus endpoint और per-request trace
+METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)  # seconds
+METRICS_SAMPLE_WINDOW = 1000  # Percentiles हर histogram के आख़िरी इतने samples से
+METRICS_HTTP_PORT = int(os.getenv('METRICS_HTTP_PORT', '0'))  # 0 = बंद; वरना /metrics पर Prometheus text
+REQUEST_TRACE_DIR = os.getenv('REQUEST_TRACE_DIR', '')  # Set हो तो हर request का JSONL trace यहाँ
+
+# Progress messages - Telegram edits की rate सीमित, सिर्फ latest state भेजी जाती है
+PROGRESS_EDIT_INTERVAL_SECONDS = 3  # एक message की दो edits के बीच कम से कम इतना समय
+EXTRACTION_PROGRESS_ENABLED = True  # Workers से frames scanned / ETA (multiprocessing.Manager dict से)
+EXTRACTION_PROGRESS_INTERVAL_SECONDS = 2  # Worker कितनी देर में progress लिखता है
+
+# Bot state (job queue + resumable downloads) - GitHub workflow restart के बीच यही folder cache होता है
+STATE_DIR = os.getenv('BOT_STATE_DIR', 'bot_state')
+DOWNLOAD_DIR = os.path.join(STATE_DIR, 'downloads')
+
+# Job queue - requests SQLite queue में जाती हैं और capacity मिलने पर fair order में चलती हैं
+JOB_DB_PATH = os.path.join(STATE_DIR, 'jobs.db')
+MAX_QUEUED_PER_USER = 20  # एक user की queued + running jobs की सीमा
+USER_JOB_WEIGHT = 1
+ADMIN_JOB_WEIGHT = 4  # Fair share में admin का हिस्सा (admin jobs वैसे भी पहले चलती हैं)
+ADMISSION_MAX_EXTRACT_BACKLOG = 2  # extract queue CPU workers के इतने गुना हो जाए तो नई job शुरू नहीं होगी
+DEFAULT_PROCESSING_RATE = 0.1  # ETA अनुमान: video के हर second पर processing seconds (चलते-चलते measure होता है)
+JOB_HISTORY_DAYS = 7  # पूरी हुई jobs इतने दिन DB में रहती हैं
+JOB_SCHEDULER_POLL_SECONDS = 2  # Stage queues खाली होने पर capacity कितनी देर में फिर देखी जाए
+
 # Admin/Owner की ID
 OWNER_ID = 2141959380
 
-# Global tracking for concurrent processing
-processing_requests = {}  # {request_id: {user_id, video_id, start_time, title, task}}
-user_request_counts = {}  # {user_id: count}
-thread_pool = ThreadPoolExecutor(max_workers=50)  # Thread pool for parallel processing
+def merge_counters(total, counters):
+    """counters dict की गिनती total में जोड़ता है"""
+    for key, value in counters.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+def warm_up_cpu_worker():
+    """हर CPU worker process में एक बार चलता है - OpenCV/skimage/FPDF पहले से load कर देता है"""
+    cv2.setNumThreads(1)  # हर worker एक core - pool खुद parallelism देता है
+    dummy = np.zeros(SSIM_RESIZE_DIM[::-1], dtype=np.uint8)
+    ssim(dummy, dummy, data_range=255)
+    cv2.resize(dummy, (16, 9))
+    FPDF("L")
+
+class Metrics:
+    """Thread-safe histograms (Prometheus buckets + percentiles के लिए recent samples) और counters"""
+
+    def __init__(self, buckets=METRICS_BUCKETS, sample_window=METRICS_SAMPLE_WINDOW):
+        self.buckets = tuple(buckets)
+        self.sample_window = sample_window
+        self.lock = threading.Lock()
+        self.histograms = {}  # {name: {'buckets': [...], 'count': n, 'sum': s, 'samples': deque}}
+        self.counters = {}
+        self.started = time.time()
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0,
+                    'samples': deque(maxlen=self.sample_window),
+                }
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            histogram['samples'].append(seconds)
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def time(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def summary(self):
+        """{name: (count, mean, p50, p90, p99)} - percentiles recent samples से"""
+        with self.lock:
+            items = [(name, h['count'], h['sum'], list(h['samples'])) for name, h in self.histograms.items()]
+        result = {}
+        for name, count, total, samples in sorted(items):
+            p50, p90, p99 = np.percentile(samples, [50, 90, 99]) if samples else (0, 0, 0)
+            result[name] = (count, total / max(1, count), p50, p90, p99)
+        return result
+
+    def prometheus_text(self, gauges=()):
+        """Prometheus text format; gauges = [(metric, labels dict, value)]"""
+        def labels_text(labels):
+            return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}' if labels else ''
+
+        with self.lock:
+            histograms = {name: (list(h['buckets']), h['count'], h['sum']) for name, h in self.histograms.items()}
+            counters = dict(self.counters)
+        lines = ['# TYPE bot_stage_seconds histogram']
+        for name, (buckets, count, total) in sorted(histograms.items()):
+            for bound, bucket_count in zip(self.buckets, buckets):
+                lines.append(f'bot_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {bucket_count}')
+            lines.append(f'bot_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'bot_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'bot_stage_seconds_count{{stage="{name}"}} {count}')
+        for name, value in sorted(counters.items()):
+            lines.append(f'# TYPE bot_{name}_total counter')
+            lines.append(f'bot_{name}_total {value}')
+        declared = set()
+        for metric, labels, value in gauges:
+            if metric not in declared:
+                lines.append(f'# TYPE bot_{metric} gauge')
+                declared.add(metric)
+            lines.append(f'bot_{metric}{labels_text(labels)} {value}')
+        lines.append(f'bot_uptime_seconds {time.time() - self.started:.0f}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def trace_event(request_id, event, **fields):
+    """Request का एक event REQUEST_TRACE_DIR/<request_id>.jsonl में (offline analysis के लिए)"""
+    if not REQUEST_TRACE_DIR or not request_id:
+        return
+    record = dict(ts=round(time.time(), 3), request=request_id, event=event, **fields)
+    try:
+        os.makedirs(REQUEST_TRACE_DIR, exist_ok=True)
+        with open(os.path.join(REQUEST_TRACE_DIR, f"{request_id}.jsonl"), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    except Exception as e:
+        logger.debug(f"Trace write error: {e}")
+
+io_pool = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS)  # Downloads और file I/O
+def create_cpu_pool():
+    return ProcessPoolExecutor(max_workers=CPU_POOL_WORKERS, initializer=warm_up_cpu_worker,
+                               mp_context=multiprocessing.get_context(CPU_POOL_START_METHOD))
+
+cpu_pool = create_cpu_pool()  # CPU stages; कोई worker crash हो तो StageExecutor नया pool बनाता है
+
+class StageExecutor:
+    """हर stage (download/metadata/extract/pdf/io) को अपनी limit के साथ सही pool पर चलाता है"""
+
+    STAGE_POOLS = {
+        'download': 'io',
+        'metadata': 'io',
+        'extract': 'cpu',
+        'pdf': 'cpu',
+        'io': 'io',
+    }
+
+    def __init__(self, limits):
+        self.limits = dict(limits)
+        self.semaphores = {}  # Event loop के अंदर lazily बनते हैं
+        self.queued = {stage: 0 for stage in self.limits}
+        self.running = {stage: 0 for stage in self.limits}
+        self.completed = {stage: 0 for stage in self.limits}
+
+    def _executor_for(self, stage):
+        return cpu_pool if self.STAGE_POOLS[stage] == 'cpu' else io_pool
+
+    def _replace_cpu_pool(self, broken):
+        """Broken cpu_pool की जगह नया pool (एक साथ fail हुई calls में से सिर्फ पहली बदलती है)"""
+        global cpu_pool
+        if cpu_pool is not broken:
+            return
+        print("⚠️  CPU worker crash हुआ - नया process pool बनाया जा रहा है")
+        metrics.inc('cpu_pool_restarts')
+        cpu_pool = create_cpu_pool()
+        broken.shutdown(wait=False)
 
-USERS_DB_PATH = 'users.json'
+    async def run(self, stage, func, *args, **kwargs):
+        """func को stage की limit के अंदर उसके pool में चलाता है
 
-def load_users():
-    if not os.path.exists(USERS_DB_PATH):
-        return []
-    with open(USERS_DB_PATH, 'r', encoding='utf-8') as f:
+        Queue में इंतज़ार 'wait.<stage>' और चलने का समय '<stage>.<func>' histogram में जाता है।
+        """
+        if stage not in self.semaphores:
+            self.semaphores[stage] = asyncio.Semaphore(self.limits[stage])
+        self.queued[stage] += 1
+        queued_at = time.perf_counter()
+        try:
+            await self.semaphores[stage].acquire()
+        finally:
+            self.queued[stage] -= 1
+        metrics.observe(f"wait.{stage}", time.perf_counter() - queued_at)
+        self.running[stage] += 1
+        try:
+            loop = asyncio.get_event_loop()
+            func_name = getattr(func, '__qualname__', None) or getattr(func, '__name__', 'call')
+            with metrics.time(f"{stage}.{func_name.split('.<locals>.')[-1]}"):
+                executor = self._executor_for(stage)
+                try:
+                    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+                except BrokenProcessPool:
+                    # एक worker मरने पर पूरा pool broken हो जाता है - नया pool बनाकर एक बार फिर;
+                    # दोबारा crash हो तो error सिर्फ इसी job को जाता है, बाद की jobs नए pool पर चलती हैं
+                    self._replace_cpu_pool(executor)
+                    return await loop.run_in_executor(self._executor_for(stage), partial(func, *args, **kwargs))
+        finally:
+            self.running[stage] -= 1
+            self.completed[stage] += 1
+            self.semaphores[stage].release()
+
+    def stats(self):
+        return {
+            stage: {
+                'queued': self.queued[stage],
+                'running': self.running[stage],
+                'limit': self.limits[stage],
+                'completed': self.completed[stage],
+            }
+            for stage in self.limits
+        }
+
+    def pool_utilisation(self):
+        """{pool: (busy workers, pool size)} - stages की running गिनती से"""
+        busy = {'io': 0, 'cpu': 0}
+        for stage, count in self.running.items():
+            busy[self.STAGE_POOLS[stage]] += count
+        return {'io': (busy['io'], IO_POOL_WORKERS), 'cpu': (busy['cpu'], CPU_POOL_WORKERS)}
+
+    def format_load(self):
+        """Queue depths को छोटे text में दिखाता है"""
+        return ' | '.join(
+            f"{stage}: {info['running']}/{info['limit']} (+{info['queued']} queued)"
+            for stage, info in self.stats().items()
+        )
+
+stage_executor = StageExecutor(STAGE_LIMITS)
+
+# सभी workers से जुड़े extraction counters (sampling + change-detector tiers)
+extraction_counters = {}
+
+def format_change_detector_stats():
+    """Change-detector tiers का hit-rate text"""
+    tiers = ('identical', 'hash_different', 'ssim')
+    total = sum(extraction_counters.get(tier, 0) for tier in tiers)
+    if total == 0:
+        return "No frame pairs compared yet."
+    lines = [f"🔍 Frame pairs compared: {total}"]
+    for tier in tiers:
+        count = extraction_counters.get(tier, 0)
+        lines.append(f"• {tier}: {count} ({count * 100 / total:.1f}%)")
+    lines.append(f"⚙️ Prefilter: identical pixels = same, hash distance ≥ {HASH_DIFF_MIN_DISTANCE} = different")
+    lines.append(f"♻️ Dedup ({DUPLICATE_PAGE_POLICY}): {extraction_counters.get('boundary_duplicates', 0)} boundary, "
+                 f"{extraction_counters.get('repeat_pages', 0)} repeat pages")
+    return '\n'.join(lines)
+
+# User store - हर message पर user जुड़ता है, इसलिए IDs memory में और DB writes batch में
+USERS_DB_PATH = os.path.join(STATE_DIR, 'users.db')
+USERS_JSON_PATH = 'users.json'  # पुरानी list (extract_and_merge_users.py भी यही लिखता है) - startup पर import
+USER_STORE_FLUSH_SECONDS = 5  # नए users इतनी देर में एक batch में DB में लिखे जाते हैं
+USER_STORE_BATCH_SIZE = 100  # इतने pending users होते ही तुरंत flush
+
+# Broadcast - background में, Telegram की rate limits के अंदर
+BROADCAST_RATE_PER_SECOND = 25  # Global limit ~30 msg/s, थोड़ी जगह छोड़कर
+BROADCAST_BURST = 5  # Token bucket की capacity
+BROADCAST_WINDOW = 50  # एक साथ in-flight sends
+BROADCAST_SAVE_EVERY = 50  # इतने users पूरे होने पर (या हर progress update पर) cursor DB में save
+BROADCAST_MAX_ATTEMPTS = 3  # Network error पर एक user को इतनी बार कोशिश
+BROADCAST_PROGRESS_SECONDS = 5  # Admin के progress message का update interval
+
+# Audit outbox - channel mirroring background worker से, user replies इसका इंतज़ार नहीं करतीं
+AUDIT_PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+AUDIT_QUEUE_MAX_EVENTS = 500  # Queue भरने पर सबसे कम priority का सबसे पुराना event drop
+AUDIT_SHED_LOW_ABOVE = 50  # Queue इससे लंबी हो तो 'low' events (progress वगैरह) आते ही drop
+AUDIT_RATE_PER_MINUTE = 20  # Channel में bot के messages की Telegram limit
+AUDIT_BURST = 3
+AUDIT_MAX_ATTEMPTS = 3
+AUDIT_MAX_MESSAGE_CHARS = 4000  # एक request के coalesced texts एक message में इतने तक
+AUDIT_DRAIN_SECONDS = 5  # Shutdown पर बचे events भेजने का समय
+
+# Result cache की settings - same video दोबारा आने पर बिना download के PDFs भेजने के लिए
+RESULT_CACHE_DIR = os.path.join(STATE_DIR, 'pdf_cache')  # PDFs + index/file_ids, बाकी bot state के साथ
+RESULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # Cache का अधिकतम size (2 GB)
+RESULT_CACHE_MAX_ENTRIES = 500  # अधिकतम cached videos
+RESULT_CACHE_PENDING_TTL_SECONDS = 6 * 3600  # अधूरी entries इतने समय बाद हटेंगी
+
+class PdfResultCache:
+    """Video ID + extraction settings के हिसाब से बनी PDFs और उनके Telegram file_ids को cache करता है"""
+
+    def __init__(self, cache_dir, max_bytes, max_entries):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.lock = threading.Lock()
+        self.entries = self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
         try:
-            return json.load(f)
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
         except Exception:
-            return []
+            return {}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """Complete entry लौटाता है (LRU time update करके), वरना None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry or not entry.get('complete'):
+                return None
+            entry['last_access'] = time.time()
+            self._save_index()
+            return json.loads(json.dumps(entry))
+
+    def begin(self, key, video_id, title, duration):
+        """नई processing के लिए pending entry बनाता है"""
+        with self.lock:
+            self._remove_entry(key)
+            self.entries[key] = {
+                'video_id': video_id,
+                'title': title,
+                'duration': duration,
+                'parts': [],
+                'total_pages': 0,
+                'size': 0,
+                'complete': False,
+                'created': time.time(),
+                'last_access': time.time(),
+            }
+            self._save_index()
+
+    def add_part(self, key, part_num, total_parts, pages, start_time, end_time, filename, pdf_path, file_id=None):
+        """एक part की PDF copy और file_id entry में जोड़ता है"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry_dir = self._entry_dir(key)
+            os.makedirs(entry_dir, exist_ok=True)
+            cached_path = os.path.join(entry_dir, f'part{part_num}.pdf')
+            size = 0
+            try:
+                shutil.copyfile(pdf_path, cached_path)
+                size = os.path.getsize(cached_path)
+            except Exception as e:
+                print(f"⚠️  Cache copy error: {e}")
+                cached_path = None
+            entry['parts'].append({
+                'part': part_num,
+                'total': total_parts,
+                'pages': pages,
+                'start': start_time,
+                'end': end_time,
+                'filename': filename,
+                'path': cached_path,
+                'file_id': file_id,
+                'size': size,
+            })
+            entry['size'] += size
+            self._save_index()
+
+    def complete(self, key, total_pages):
+        """सभी parts बन जाने पर entry को usable mark करता है और eviction चलाता है"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            if not entry['parts']:
+                self._remove_entry(key)
+            else:
+                entry['complete'] = True
+                entry['total_pages'] = total_pages
+                for part in entry['parts']:
+                    part['total'] = len(entry['parts'])
+                entry['last_access'] = time.time()
+            self._evict()
+            self._save_index()
+
+    def invalidate(self, key):
+        with self.lock:
+            self._remove_entry(key)
+            self._save_index()
+
+    def _remove_entry(self, key):
+        if key in self.entries:
+            del self.entries[key]
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
 
-def save_users(users):
-    with open(USERS_DB_PATH, 'w', encoding='utf-8') as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
+    def _evict(self):
+        """पुरानी pending entries हटाता है, फिर LRU order में size/count limit तक evict करता है"""
+        now = time.time()
+        for key in [k for k, e in self.entries.items()
+                    if not e.get('complete') and now - e.get('created', 0) > RESULT_CACHE_PENDING_TTL_SECONDS]:
+            self._remove_entry(key)
+
+        total_size = sum(e.get('size', 0) for e in self.entries.values())
+        lru_keys = sorted(
+            (k for k, e in self.entries.items() if e.get('complete')),
+            key=lambda k: self.entries[k].get('last_access', 0)
+        )
+        for key in lru_keys:
+            if total_size <= self.max_bytes and len(self.entries) <= self.max_entries:
+                break
+            total_size -= self.entries[key].get('size', 0)
+            self._remove_entry(key)
+
+def size_based_parts_enabled():
+    """Size-driven parts के लिए streaming writer चाहिए (memory pipeline + streaming backend)"""
+    return PART_POLICY == 'size' and FRAME_PIPELINE == 'memory' and PDF_BACKEND == 'streaming'
+
+def get_result_cache_key(video_id, quality_profile=DEFAULT_QUALITY_PROFILE):
+    """Video ID, quality profile और output बदलने वाली settings से cache key बनाता है"""
+    profile = get_quality_profile(quality_profile)
+    settings = {
+        'video_id': video_id,
+        'profile': [profile['format'], profile['render_dim'], profile['interpolation'],
+                    profile['jpeg_quality'], profile['page_format']],
+        'frame_skip': FRAME_SKIP_FOR_SSIM_CHECK,
+        'frame_source': [FRAME_SOURCE, FRAME_SAMPLING_MODE, SIMILARITY_ENGINE],
+        'ssim_threshold': SSIM_THRESHOLD,
+        'chunk_minutes': CHUNK_DURATION_MINUTES,
+        'parts': [PART_POLICY, PART_TARGET_BYTES, PART_MAX_PAGES] if size_based_parts_enabled() else PART_POLICY,
+        'watermark': WATERMARK_TEXT,
+        'hash_prefilter': [HASH_PREFILTER_ENABLED, HASH_DIFF_MIN_DISTANCE],
+        'strategy': [EXTRACTION_STRATEGY, TRANSITION_COARSE_STEP_SECONDS, TRANSITION_SEARCH_PRECISION_FRAMES],
+        'dedup': [DUPLICATE_PAGE_POLICY, DUPLICATE_HASH_MAX_DISTANCE],
+    }
+    raw = json.dumps(settings, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+result_cache = None  # open_state_stores() में (bot process में) बनता है
+
+def normalize_user_id(user_id):
+    """Telegram user ID int में (users.json में IDs string हैं), गलत हो तो None"""
+    try:
+        return int(str(user_id).strip())
+    except (TypeError, ValueError):
+        return None
+
+class UserStore:
+    """SQLite user table + memory में IDs का set (write-behind)
+
+    IDs startup पर एक बार load होते हैं, इसलिए add() सिर्फ set lookup है और
+    /usercount O(1)। नए users pending list में जाते हैं और USER_STORE_FLUSH_SECONDS
+    बाद (या batch भरते ही) I/O pool में एक transaction से लिखे जाते हैं।
+    """
+
+    def __init__(self, db_path, import_json_path=None):
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    real_name TEXT,
+                    first_seen REAL,
+                    blocked_at REAL
+                )
+            """)
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_info(users)')}
+            if 'blocked_at' not in columns:
+                self.conn.execute('ALTER TABLE users ADD COLUMN blocked_at REAL')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS broadcasts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message TEXT NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    status TEXT DEFAULT 'running',
+                    cursor INTEGER DEFAULT 0,
+                    total INTEGER DEFAULT 0,
+                    delivered INTEGER DEFAULT 0,
+                    blocked INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    created_at REAL,
+                    finished_at REAL
+                )
+            """)
+        self.pending = []
+        self.pending_unblocks = set()
+        self.flush_handle = None
+        if import_json_path:
+            self.import_json(import_json_path)
+        self.ids = {row[0] for row in self.conn.execute('SELECT user_id FROM users')}
+        self.blocked = {row[0] for row in self.conn.execute('SELECT user_id FROM users WHERE blocked_at IS NOT NULL')}
+
+    def import_json(self, json_path):
+        """पुरानी users.json के users (normalised IDs, duplicates हटाकर) DB में डालता है"""
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                users = json.load(f)
+        except Exception as e:
+            print(f"⚠️  {json_path} import error: {e}")
+            return
+        rows = []
+        for user in users:
+            user_id = normalize_user_id(user.get('user_id'))
+            if user_id is not None:
+                rows.append((user_id, user.get('username', ''), user.get('real_name', ''), None))
+        with self.lock, self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO users (user_id, username, real_name, first_seen) '
+                                  'VALUES (?, ?, ?, ?)', rows)
+
+    def add(self, user_id, username, real_name):
+        """नया user हो तो True - DB write बाद में batch में होता है"""
+        user_id = normalize_user_id(user_id)
+        if user_id in self.blocked:
+            # Bot block करने वाला user फिर message कर रहा है - broadcasts फिर मिलेंगे
+            with self.lock:
+                self.blocked.discard(user_id)
+                self.pending_unblocks.add(user_id)
+            self._schedule_flush()
+        if user_id is None or user_id in self.ids:
+            return False
+        with self.lock:
+            self.ids.add(user_id)
+            self.pending.append((user_id, username, real_name, time.time()))
+        self._schedule_flush()
+        return True
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()  # Event loop के बाहर (scripts) सीधे लिखना
+            return
+        if len(self.pending) >= USER_STORE_BATCH_SIZE and self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.flush_handle is None:
+            delay = 0 if len(self.pending) >= USER_STORE_BATCH_SIZE else USER_STORE_FLUSH_SECONDS
+            self.flush_handle = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self.flush_handle = None
+        asyncio.ensure_future(stage_executor.run('io', self.flush))
+
+    def flush(self):
+        """Pending users एक transaction में DB में लिखता है"""
+        with self.lock:
+            rows, self.pending = self.pending, []
+            unblocks, self.pending_unblocks = self.pending_unblocks, set()
+            if not rows and not unblocks:
+                return
+            with self.conn:
+                self.conn.executemany('INSERT OR IGNORE INTO users (user_id, username, real_name, first_seen) '
+                                      'VALUES (?, ?, ?, ?)', rows)
+                self.conn.executemany('UPDATE users SET blocked_at = NULL WHERE user_id = ?',
+                                      [(user_id,) for user_id in unblocks])
+
+    def count(self):
+        return len(self.ids)
+
+    def blocked_count(self):
+        return len(self.blocked)
+
+    def create_broadcast(self, message, chat_id):
+        """नया broadcast (total = अभी के reachable users) बनाकर उसका row dict लौटाता है"""
+        self.flush()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO broadcasts (message, chat_id, total, created_at) VALUES (?, ?, ?, ?)',
+                (message, chat_id, len(self.ids) - len(self.blocked), time.time())
+            )
+        return self.get_broadcast(cursor.lastrowid)
+
+    def get_broadcast(self, broadcast_id):
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM broadcasts WHERE id = ?', (broadcast_id,)).fetchone()
+        return dict(row) if row else None
+
+    def running_broadcasts(self):
+        with self.lock:
+            ids = [row[0] for row in self.conn.execute("SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id")]
+        return [self.get_broadcast(broadcast_id) for broadcast_id in ids]
+
+    def broadcast_batch(self, after_user_id, limit):
+        """Cursor के बाद के reachable users, ID order में (resume के लिए stable order)"""
+        self.flush()
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                'SELECT user_id FROM users WHERE blocked_at IS NULL AND user_id > ? ORDER BY user_id LIMIT ?',
+                (after_user_id, limit)
+            )]
+
+    def save_broadcast_progress(self, broadcast_id, cursor, counts, blocked_ids, status='running'):
+        """Batch के बाद cursor/counts और block करने वाले users - एक transaction में"""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                'UPDATE broadcasts SET cursor = ?, delivered = ?, blocked = ?, failed = ?, status = ?, '
+                'finished_at = ? WHERE id = ?',
+                (cursor, counts['delivered'], counts['blocked'], counts['failed'], status,
+                 now if status != 'running' else None, broadcast_id)
+            )
+            self.conn.executemany('UPDATE users SET blocked_at = ? WHERE user_id = ?',
+                                  [(now, user_id) for user_id in blocked_ids])
+            self.blocked.update(blocked_ids)
+
+    def close(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
+user_store = None  # open_state_stores() में - import करने वाले processes (workers, benchmark) DB नहीं छूते
 
 def add_user(user_id, username, real_name):
-    users = load_users()
-    if not any(u['user_id'] == user_id for u in users):
-        users.append({
-            'user_id': user_id,
-            'username': username,
-            'real_name': real_name
-        })
-        save_users(users)
+    user_store.add(user_id, username, real_name)
+
+class TokenBucket:
+    """Async token bucket: rate tokens/second, capacity तक burst; RetryAfter पर pause"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def pause(self, seconds):
+        """Telegram ने flood wait कहा - सभी senders इतनी देर रुकेंगे"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
 
 def is_admin(user_id):
     return user_id == OWNER_ID
 
+async def send_broadcast_message(bot, bucket, chat_id, message):
+    """एक user को broadcast - 'delivered', 'blocked' या 'failed'"""
+    attempt = 0
+    while attempt < BROADCAST_MAX_ATTEMPTS:
+        await bucket.acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, text=message)
+            return 'delivered'
+        except RetryAfter as e:
+            # Flood wait attempt नहीं गिनता - bucket रुककर वही message फिर भेजता है
+            retry_after = e.retry_after
+            bucket.pause(retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else retry_after)
+        except Forbidden:
+            return 'blocked'  # User ने bot block किया या account deleted
+        except BadRequest as e:
+            return 'blocked' if 'chat not found' in str(e).lower() else 'failed'
+        except NetworkError:
+            attempt += 1
+            if attempt < BROADCAST_MAX_ATTEMPTS:
+                await asyncio.sleep(attempt)
+        except Exception as e:
+            print(f"⚠️  Broadcast error for {chat_id}: {e}")
+            return 'failed'
+    return 'failed'
+
+def format_broadcast_progress(broadcast, counts, started, finished=False):
+    done = counts['delivered'] + counts['blocked'] + counts['failed']
+    total = max(broadcast['total'], done)
+    elapsed = time.time() - started
+    header = '✅ Broadcast Complete!' if finished else '📣 Broadcast चल रहा है...'
+    lines = [
+        header,
+        f"📊 Progress: {done}/{total} ({done * 100 // max(1, total)}%)",
+        f"✅ Delivered: {counts['delivered']}",
+        f"🚫 Blocked: {counts['blocked']}",
+        f"❌ Failed: {counts['failed']}",
+    ]
+    if not finished and done:
+        lines.append(f"⌛ ETA: ~{format_duration(int(elapsed / done * (total - done)))}")
+    return '\n'.join(lines)
+
+async def run_broadcast(bot, broadcast):
+    """Broadcast को cursor से आगे चलाता है - कई sends साथ-साथ, global token bucket से सीमित
+
+    एक समय पर BROADCAST_WINDOW sends in-flight रहते हैं (retry कर रहा धीमा user
+    बाकियों को नहीं रोकता)। Cursor = वो user ID जिस तक के सभी users पूरे हो चुके; हर
+    BROADCAST_SAVE_EVERY users पर cursor और counts DB में जाते हैं, इसलिए restart के
+    बाद broadcast वहीं से चलता है। Block करने वाले users flag होते हैं और अगले
+    broadcasts में शामिल नहीं होते।
+    """
+    broadcast_id = broadcast['id']
+    counts = {key: broadcast[key] for key in ('delivered', 'blocked', 'failed')}
+    cursor = broadcast['cursor']
+    bucket = TokenBucket(BROADCAST_RATE_PER_SECOND, BROADCAST_BURST)
+    started = time.time()
+    last_progress = started
+    progress_msg = await send_job_message(bot, broadcast['chat_id'], format_broadcast_progress(broadcast, counts, started))
+
+    queued_ids = []  # DB से आए, अभी भेजे नहीं गए
+    dispatched = []  # (chat_id, task) dispatch order में - cursor इसी order में आगे बढ़ता है
+    fetch_after = cursor
+    exhausted = False
+    blocked_ids = []
+    unsaved = 0
+    try:
+        while True:
+            # Window भरना (पूरे हो चुके पर cursor से पीछे अटके sends window में नहीं गिने जाते)
+            while sum(1 for _, task in dispatched if not task.done()) < BROADCAST_WINDOW:
+                if not queued_ids and not exhausted:
+                    queued_ids = await stage_executor.run('io', user_store.broadcast_batch, fetch_after, BROADCAST_WINDOW)
+                    exhausted = not queued_ids
+                    if queued_ids:
+                        fetch_after = queued_ids[-1]
+                if not queued_ids:
+                    break
+                chat_id = queued_ids.pop(0)
+                dispatched.append((chat_id, asyncio.ensure_future(
+                    send_broadcast_message(bot, bucket, chat_id, broadcast['message']))))
+            if not dispatched:
+                break
+
+            in_flight = [task for _, task in dispatched if not task.done()]
+            if in_flight:
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            # सबसे पुराने पूरे हुए sends से cursor आगे
+            while dispatched and dispatched[0][1].done():
+                chat_id, task = dispatched.pop(0)
+                result = task.result()
+                counts[result] += 1
+                if result == 'blocked':
+                    blocked_ids.append(chat_id)
+                cursor = chat_id
+                unsaved += 1
+
+            progress_due = time.time() - last_progress >= BROADCAST_PROGRESS_SECONDS
+            if unsaved >= BROADCAST_SAVE_EVERY or (unsaved and progress_due):
+                await stage_executor.run('io', user_store.save_broadcast_progress, broadcast_id, cursor, counts, blocked_ids)
+                blocked_ids, unsaved = [], 0
+            if progress_due:
+                last_progress = time.time()
+                try:
+                    await progress_msg.edit_text(format_broadcast_progress(broadcast, counts, started))
+                except Exception:
+                    pass
+    finally:
+        for _, task in dispatched:
+            task.cancel()
+    await stage_executor.run('io', user_store.save_broadcast_progress, broadcast_id, cursor, counts, blocked_ids, 'done')
+    try:
+        await progress_msg.edit_text(format_broadcast_progress(broadcast, counts, started, finished=True))
+    except Exception:
+        pass
+    print(f"📣 Broadcast {broadcast_id} done: {counts}")
+
+def start_broadcast_task(application, broadcast):
+    task = asyncio.create_task(run_broadcast(application.bot, broadcast))
+    application.bot_data.setdefault('broadcasts', {})[broadcast['id']] = task
+    task.add_done_callback(lambda _: application.bot_data['broadcasts'].pop(broadcast['id'], None))
+
+def resume_broadcasts(application):
+    """Restart से पहले अधूरे रहे broadcasts उनके cursor से फिर शुरू करना"""
+    for broadcast in user_store.running_broadcasts():
+        print(f"📣 Resuming broadcast {broadcast['id']} after user {broadcast['cursor']}")
+        start_broadcast_task(application, broadcast)
+
 async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if not is_admin(user_id):
@@ -104,16 +948,132 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
         await update.message.reply_text('Usage: /broadcast <message>')
         return
+    if context.application.bot_data.get('broadcasts'):
+        await update.message.reply_text('⏳ एक broadcast पहले से चल रहा है, उसके पूरा होने का इंतज़ार करें।')
+        return
     message = ' '.join(context.args)
-    users = load_users()
-    count = 0
-    for user in users:
-        try:
-            await context.bot.send_message(chat_id=user['user_id'], text=message)
-            count += 1
-        except Exception as e:
-            pass  # Ignore failures (user blocked bot, etc.)
-    await update.message.reply_text(f'✅ Broadcast sent to {count} users.')
+    new_broadcast = await stage_executor.run('io', user_store.create_broadcast, message, update.effective_chat.id)
+    start_broadcast_task(context.application, new_broadcast)
+
+class AuditOutbox:
+    """Channel mirroring का bounded outbox - handlers event डालकर तुरंत आगे बढ़ते हैं
+
+    Background worker events FIFO order में token bucket की rate से भेजता है।
+    एक ही key (request ID या user) के queued text events एक message में जुड़ जाते
+    हैं। Queue लंबी होने पर 'low' events आते ही drop होते हैं और भरी queue में
+    नया event सबसे कम priority के सबसे पुराने event की जगह लेता है। RetryAfter पर
+    worker रुककर वही event फिर भेजता है; network errors पर कुछ बार retry।
+    """
+
+    def __init__(self, chat_id, max_events=AUDIT_QUEUE_MAX_EVENTS, shed_low_above=AUDIT_SHED_LOW_ABOVE):
+        self.chat_id = chat_id
+        self.max_events = max_events
+        self.shed_low_above = shed_low_above
+        self.events = []  # Arrival order में
+        self.wakeup = None  # Event loop के अंदर lazily बनता है
+        self.bucket = TokenBucket(AUDIT_RATE_PER_MINUTE / 60, AUDIT_BURST)
+        self.stats = {'queued': 0, 'sent': 0, 'coalesced': 0, 'shed': 0, 'failed': 0}
+
+    def text(self, text, key=None, priority='normal'):
+        """Channel में text message; same key के queued texts साथ भेजे जाते हैं"""
+        self._put({'kind': 'text', 'text': text.strip(), 'key': key, 'priority': priority})
+
+    def forward(self, message, priority='normal'):
+        """User का message channel में forward"""
+        self._put({'kind': 'forward', 'from_chat_id': message.chat_id, 'message_id': message.message_id,
+                   'key': None, 'priority': priority})
+
+    def _put(self, event):
+        rank = AUDIT_PRIORITIES[event['priority']]
+        if rank == AUDIT_PRIORITIES['low'] and len(self.events) >= self.shed_low_above:
+            self.stats['shed'] += 1
+            return
+        if len(self.events) >= self.max_events:
+            victim = max(range(len(self.events)), key=lambda i: (AUDIT_PRIORITIES[self.events[i]['priority']], -i))
+            self.stats['shed'] += 1
+            if AUDIT_PRIORITIES[self.events[victim]['priority']] <= rank:
+                return  # Queue में सब इससे ज़रूरी हैं - नया event ही drop
+            del self.events[victim]
+        self.events.append(event)
+        self.stats['queued'] += 1
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def _take(self):
+        """सबसे पुराना event, उसके बाद के same-key texts उसी में जोड़कर"""
+        event = self.events.pop(0)
+        if event['kind'] != 'text' or event['key'] is None:
+            return event
+        texts = [event['text']]
+        length = len(event['text'])
+        remaining = []
+        for other in self.events:
+            if (other['kind'] == 'text' and other['key'] == event['key']
+                    and length + len(other['text']) + 2 <= AUDIT_MAX_MESSAGE_CHARS):
+                texts.append(other['text'])
+                length += len(other['text']) + 2
+                self.stats['coalesced'] += 1
+            else:
+                remaining.append(other)
+        self.events = remaining
+        return dict(event, text='\n\n'.join(texts))
+
+    async def _deliver(self, bot, event):
+        attempt = 0
+        while attempt < AUDIT_MAX_ATTEMPTS:
+            await self.bucket.acquire()
+            try:
+                if event['kind'] == 'forward':
+                    await bot.forward_message(chat_id=self.chat_id, from_chat_id=event['from_chat_id'],
+                                              message_id=event['message_id'])
+                else:
+                    await bot.send_message(chat_id=self.chat_id, text=event['text'])
+                self.stats['sent'] += 1
+                return
+            except RetryAfter as e:
+                # Flood wait attempt नहीं गिनता - worker रुककर वही event फिर भेजता है
+                retry_after = e.retry_after
+                self.bucket.pause(retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else retry_after)
+            except (BadRequest, Forbidden) as e:
+                print(f"⚠️  Channel audit error: {e}")
+                break
+            except NetworkError:
+                attempt += 1
+                if attempt < AUDIT_MAX_ATTEMPTS:
+                    await asyncio.sleep(attempt)
+            except Exception as e:
+                print(f"⚠️  Channel audit error: {e}")
+                break
+        self.stats['failed'] += 1
+
+    async def run(self, bot):
+        """Worker loop - on_startup से background task में"""
+        self.wakeup = asyncio.Event()
+        while True:
+            if not self.events:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            await self._deliver(bot, self._take())
+
+    async def drain(self, timeout):
+        """Shutdown से पहले queue खाली होने का (timeout तक) इंतज़ार"""
+        deadline = time.monotonic() + timeout
+        while self.events and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+audit_outbox = AuditOutbox(CHANNEL_USERNAME)
+
+def get_quality_profile(name):
+    """Profile का settings dict (अनजान नाम पर default profile)"""
+    return QUALITY_PROFILES.get(name) or QUALITY_PROFILES[DEFAULT_QUALITY_PROFILE]
+
+def parse_requested_profile(message_text):
+    """Message में URL के बाद लिखा profile नाम (जैसे "https://youtu.be/... fast"), न हो तो None"""
+    for word in message_text.split()[1:]:
+        if word.lower() in QUALITY_PROFILES:
+            return word.lower()
+    return None
 
 def get_video_id(url):
     """YouTube URL से video ID extract करता है"""
@@ -139,8 +1099,12 @@ def format_duration(seconds):
         minutes = int((seconds % 3600) // 60)
         return f"{hours}h {minutes}m"
 
-def get_video_duration(video_id):
-    """Video की duration निकालता है"""
+def get_video_info(video_id):
+    """Video की metadata (info_dict) निकालता है, न मिले तो None
+
+    process=False: format selection नहीं होता, इसलिए यही info_dict बाद में किसी भी
+    quality profile के download में process_ie_result को दिया जा सकता है।
+    """
     video_url = f"https://www.youtube.com/watch?v={video_id}"
     ydl_opts = {
         'quiet': True,
@@ -149,463 +1113,2185 @@ def get_video_duration(video_id):
     }
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
         try:
-            info_dict = ydl.extract_info(video_url, download=False)
-            if info_dict:
-                duration = info_dict.get('duration', 0)  # seconds में
-                return duration
-            return 0
+            return ydl.extract_info(video_url, download=False, process=False)
         except Exception as e:
             print(f"⚠️  Duration check error for {video_id}: {e}")
-            return 0
+            return None
+
+# Metadata cache - duration check और download दोनों एक ही extract_info से
+METADATA_CACHE_TTL_SECONDS = 3600  # Format URLs कुछ घंटों में expire होते हैं, उससे पहले फिर extract
+METADATA_CACHE_MAX_ENTRIES = 256
+
+class VideoMetadataCache:
+    """video_id → info_dict, TTL और size bound के साथ (LRU)
+
+    Lookup I/O pool में चलता है ताकि event loop न रुके; एक ही video की एक साथ
+    आई lookups एक ही extract_info पर इंतज़ार करती हैं। Fail हुई lookup cache नहीं होती।
+    """
+
+    def __init__(self, ttl_seconds, max_entries):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # {video_id: (expires_at, info_dict)}
+        self.pending = {}  # {video_id: future}
+        self.hits = 0
+        self.misses = 0
+
+    def get_cached(self, video_id):
+        entry = self.entries.get(video_id)
+        if entry is None:
+            return None
+        expires_at, info_dict = entry
+        if expires_at < time.time():
+            del self.entries[video_id]
+            return None
+        self.entries.move_to_end(video_id)
+        return info_dict
+
+    def put(self, video_id, info_dict):
+        self.entries[video_id] = (time.time() + self.ttl_seconds, info_dict)
+        self.entries.move_to_end(video_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get(self, video_id):
+        """Cached info_dict, वरना I/O pool में lookup; न मिले तो None"""
+        info_dict = self.get_cached(video_id)
+        if info_dict is not None:
+            self.hits += 1
+            return info_dict
+        future = self.pending.get(video_id)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(stage_executor.run('metadata', get_video_info, video_id))
+            self.pending[video_id] = future
+            try:
+                info_dict = await future
+            finally:
+                self.pending.pop(video_id, None)
+            if info_dict:
+                self.put(video_id, info_dict)
+            return info_dict
+        return await asyncio.shield(future)
+
+video_metadata = VideoMetadataCache(METADATA_CACHE_TTL_SECONDS, METADATA_CACHE_MAX_ENTRIES)
+
+async def get_video_duration(video_id):
+    """Video की duration (seconds) - metadata cache से, न मिले तो 0"""
+    info_dict = await video_metadata.get(video_id)
+    if info_dict:
+        return info_dict.get('duration', 0) or 0
+    return 0
 
-async def download_video_async(video_id, progress_callback=None):
-    """YouTube video download करता है with async support"""
+def download_video_sync(video_id, output_file, progress_hooks=None, extra_opts=None, info_dict=None):
+    """yt-dlp से video (या उसका section) download करता है - worker thread में चलता है
+
+    info_dict (metadata cache से) मिले तो दोबारा extract_info नहीं होता - उसी पर
+    सिर्फ format selection और download चलता है।
+    """
     video_url = f"https://www.youtube.com/watch?v={video_id}"
-    output_file = f"video_{video_id}_{int(time.time())}.mp4"
+    ydl_opts = {
+        'format': 'best[height<=720]/best',
+        'outtmpl': output_file,
+        'noplaylist': True,
+        'quiet': True,
+        'no_warnings': True,
+        'progress_hooks': progress_hooks or [],
+        'retries': 5,
+        'fragment_retries': 5,
+        'extractaudio': False,
+        'keepvideo': True,
+        'cookiefile': 'cookies.txt',
+    }
+    if extra_opts:
+        ydl_opts.update(extra_opts)
+
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if info_dict:
+                # Cached dict shared है - yt-dlp उसे बदलता है, इसलिए copy
+                info_dict = ydl.process_ie_result(copy.deepcopy(info_dict), download=True)
+            else:
+                info_dict = ydl.extract_info(video_url, download=True)
+            title = info_dict.get('title', 'Unknown Title')
+            duration = info_dict.get('duration', 0)
+
+            if not os.path.exists(output_file):
+                raise Exception("Video file download failed")
+
+            return title, output_file, duration
+
+    except Exception as e:
+        if os.path.exists(output_file):
+            try:
+                os.remove(output_file)
+            except:
+                pass
+        raise Exception(f"Download failed: {str(e)}")
+
+async def download_video_async(video_id, progress_callback=None, quality_profile=DEFAULT_QUALITY_PROFILE):
+    """YouTube video download करता है with async support
+
+    progress_callback(percent, speed) download worker thread में हर yt-dlp tick पर
+    call होता है, इसलिए thread-safe और सस्ता होना चाहिए (जैसे ProgressReporter.update)।
+    """
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    output_file = os.path.join(DOWNLOAD_DIR, f"video_{video_id}_{int(time.time())}.mp4")
     
     def progress_hook(d):
         if progress_callback and d['status'] == 'downloading':
             try:
                 percent = d.get('_percent_str', 'N/A').strip()
                 speed = d.get('_speed_str', 'N/A').strip()
-                # Schedule callback in event loop safely
-                try:
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        asyncio.create_task(progress_callback(percent, speed))
-                except:
-                    pass  # Ignore if no event loop
-            except Exception as e:
+                progress_callback(percent, speed)
+            except Exception:
                 pass  # Ignore progress callback errors silently
     
-    def download_sync():
-        ydl_opts = {
-            'format': 'best[height<=720]/best',
-            'outtmpl': output_file,
-            'noplaylist': True,
-            'quiet': True,
-            'no_warnings': True,
-            'progress_hooks': [progress_hook],
-            'retries': 5,
-            'fragment_retries': 5,
-            'extractaudio': False,
-            'keepvideo': True,
-            'cookiefile': 'cookies.txt',
-        }
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info_dict = ydl.extract_info(video_url, download=True)
-                title = info_dict.get('title', 'Unknown Title')
-                duration = info_dict.get('duration', 0)
-                
-                if not os.path.exists(output_file):
-                    raise Exception("Video file download failed")
-                    
-                return title, output_file, duration
-                
-        except Exception as e:
-            if os.path.exists(output_file):
-                try:
-                    os.remove(output_file)
-                except:
-                    pass
-            raise Exception(f"Download failed: {str(e)}")
-    
-    # Run download in thread pool
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(thread_pool, download_sync)
+    # Run download on the I/O pool (metadata पहले से cache में हो तो extract_info दोबारा नहीं)
+    info_dict = await video_metadata.get(video_id)
+    return await stage_executor.run('download', download_video_sync, video_id, output_file, [progress_hook],
+                                    {'format': get_quality_profile(quality_profile)['format']}, info_dict)
 
-def extract_unique_frames_for_chunk(video_file, output_folder, start_time, end_time, chunk_num, n=3, ssim_threshold=0.8):
-    """Video के specific chunk से unique frames extract करता है"""
-    cap = cv2.VideoCapture(video_file)
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    
-    start_frame = int(start_time * fps)
-    end_frame = int(end_time * fps)
-    
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-    
-    last_frame = None
-    saved_frame = None
-    frame_number = start_frame
-    last_saved_frame_number = -1
-    timestamps = []
+def remove_file_quietly(path):
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except:
+        pass
 
-    while frame_number < end_frame and cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+class FullFileChunkInput:
+    """पहले से पूरी download हुई video - हर chunk उसी file से पढ़ा जाता है"""
 
-        if (frame_number - start_frame) % n == 0:
-            frame = cv2.resize(frame, (640 , 360), interpolation=cv2.INTER_CUBIC)
-            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            gray_frame = cv2.resize(gray_frame, (128, 72))
+    max_parallel_chunks = MAX_PARALLEL_CHUNKS_PER_VIDEO
 
-            if last_frame is not None:
-                try:
-                    data_range = gray_frame.max() - gray_frame.min()
-                    if data_range > 0:
-                        similarity = ssim(gray_frame, last_frame, data_range=data_range)
-                    else:
-                        similarity = 1.0
-                except Exception as e:
-                    similarity = 0.0
+    def __init__(self, video_path):
+        self.video_path = video_path
 
-                if similarity < ssim_threshold:
-                    if saved_frame is not None and frame_number - last_saved_frame_number > fps:
-                        frame_path = os.path.join(output_folder, f'chunk{chunk_num}_frame{frame_number:04d}_{frame_number // fps}.png')
-                        cv2.imwrite(frame_path, saved_frame, [int(cv2.IMWRITE_PNG_COMPRESSION), 3])
-                        timestamps.append((frame_number, frame_number // fps))
+    async def wait_for_chunk(self, chunk_num, start_time, end_time):
+        """(video file, file में start, file में end, timestamp offset) लौटाता है"""
+        return self.video_path, start_time, end_time, 0
 
-                    saved_frame = frame
-                    last_saved_frame_number = frame_number
-                else:
-                    saved_frame = frame
-            else:
-                frame_path = os.path.join(output_folder, f'chunk{chunk_num}_frame{frame_number:04d}_{frame_number // fps}.png')
-                cv2.imwrite(frame_path, frame, [int(cv2.IMWRITE_PNG_COMPRESSION), 3])
-                timestamps.append((frame_number, frame_number // fps))
-                last_saved_frame_number = frame_number
+    def release_chunk(self, chunk_num):
+        pass
 
-            last_frame = gray_frame
+    async def close(self):
+        remove_file_quietly(self.video_path)
 
-        frame_number += 1
+    async def suspend(self):
+        """Bot बंद हो रहा है - file रखना ताकि resume पर दोबारा download न हो"""
 
-    cap.release()
-    return timestamps
+class WatermarkChunkInput:
+    """एक ही download चलता रहता है; जिस chunk तक के bytes आ गए उसकी extraction शुरू हो जाती है
 
-def convert_frames_to_pdf_chunk(input_folder, output_file, timestamps, chunk_num):
-    """Specific chunk के frames को PDF में convert करता है"""
-    frame_files = [f for f in os.listdir(input_folder) if f.startswith(f'chunk{chunk_num}_')]
-    frame_files = sorted(frame_files, key=lambda x: int(x.split('_')[1].split('frame')[-1]))
-    
-    pdf = FPDF("L")
-    pdf.set_auto_page_break(False)
+    Downloaded bytes / total bytes को video duration का अनुपात मानकर watermark निकलता है।
+    .part file का hard link बनाया जाता है ताकि download खत्म होने पर rename से
+    चल रही extraction की file गायब न हो।
+    """
 
-    total_pages = 0
+    max_parallel_chunks = MAX_PARALLEL_CHUNKS_PER_VIDEO
 
-    for i, (frame_file, (frame_number, timestamp_seconds)) in enumerate(zip(frame_files, timestamps)):
-        frame_path = os.path.join(input_folder, frame_file)
-        if not os.path.exists(frame_path):
-            continue
-            
-        image = Image.open(frame_path)
+    def __init__(self, video_id, duration_seconds, quality_profile=DEFAULT_QUALITY_PROFILE):
+        self.video_id = video_id
+        self.duration_seconds = duration_seconds
+        self.quality_profile = quality_profile
+        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        self.output_file = os.path.join(DOWNLOAD_DIR, f"video_{video_id}_{int(time.time())}.mp4")
+        self.stream_file = self.output_file + '.stream'
+        self.partial_file = None
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.changed = asyncio.Event()
+        self.download_future = None
 
-        pdf.add_page()
-        total_pages += 1
+    def start(self):
+        loop = asyncio.get_event_loop()
 
-        width, height = image.size
-        pdf_width = pdf.w
-        pdf_height = pdf.h
+        def progress_hook(d):
+            if d.get('status') != 'downloading':
+                return
+            self.partial_file = d.get('tmpfilename') or self.partial_file
+            self.downloaded_bytes = d.get('downloaded_bytes') or 0
+            self.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            loop.call_soon_threadsafe(self.changed.set)
 
-        aspect_ratio = width / height
-        new_width = pdf_width
-        new_height = pdf_width / aspect_ratio
+        async def download():
+            info_dict = await video_metadata.get(self.video_id)
+            return await stage_executor.run(
+                'download', download_video_sync, self.video_id, self.output_file, [progress_hook],
+                {'format': get_quality_profile(self.quality_profile)['format']}, info_dict
+            )
 
-        if new_height > pdf_height:
-            new_height = pdf_height
-            new_width = pdf_height * aspect_ratio
+        self.download_future = asyncio.ensure_future(download())
+        self.download_future.add_done_callback(lambda future: self.changed.set())
 
-        x = (pdf_width - new_width) / 2
-        y = (pdf_height - new_height) / 2
+    def _streamable_path(self):
+        """Partial file का stable hard link बनाता है"""
+        if not os.path.exists(self.stream_file):
+            try:
+                os.link(self.partial_file, self.stream_file)
+            except Exception:
+                return None
+        return self.stream_file
 
-        pdf.image(frame_path, x=x, y=y, w=new_width, h=new_height)
+    async def wait_for_chunk(self, chunk_num, start_time, end_time):
+        needed_fraction = end_time / self.duration_seconds + STREAMING_WATERMARK_MARGIN if self.duration_seconds else 1.0
+        while True:
+            self.changed.clear()
+            if self.download_future.done():
+                self.download_future.result()  # Download fail हुआ हो तो error यहीं उठेगा
+                return self.output_file, start_time, end_time, 0
+            if (needed_fraction < 1.0 and self.total_bytes and self.partial_file
+                    and self.downloaded_bytes >= needed_fraction * self.total_bytes):
+                stream_path = self._streamable_path()
+                if stream_path:
+                    return stream_path, start_time, end_time, 0
+            await self.changed.wait()
 
-        timestamp = f"{timestamp_seconds // 3600:02d}:{(timestamp_seconds % 3600) // 60:02d}:{timestamp_seconds % 60:02d}"
-        watermark_text = "Created by @youpdf_bot"
-        combined_text = f"{timestamp} - {watermark_text}"
+    def release_chunk(self, chunk_num):
+        pass
 
-        pdf.set_xy(5, 5)
-        pdf.set_font("Arial", size=18)
-        pdf.cell(0, 0, combined_text)
+    async def close(self):
+        if self.download_future and not self.download_future.done():
+            self.download_future.cancel()
+        remove_file_quietly(self.stream_file)
+        remove_file_quietly(self.output_file)
+        remove_file_quietly(self.partial_file)
 
-    if total_pages > 0:
-        pdf.output(output_file)
-    return total_pages
+    async def suspend(self):
+        """अधूरा download resume नहीं होता - resume पर फिर से शुरू होगा"""
+        await self.close()
 
-def can_process_request(user_id):
-    """Check if user can start a new request"""
-    current_user_requests = user_request_counts.get(user_id, 0)
-    total_requests = len(processing_requests)
-    
-    if total_requests >= MAX_CONCURRENT_TOTAL_REQUESTS:
-        return False, "server_full"
-    
-    if current_user_requests >= MAX_REQUESTS_PER_USER:
-        return False, "user_limit"
-    
-    return True, "ok"
+class SectionChunkInput:
+    """हर chunk का time range yt-dlp section download से अलग file में लाता है
 
-def start_request(user_id, video_id, title="Processing...", task=None):
-    """Start tracking a new request"""
-    request_id = str(uuid.uuid4())
-    processing_requests[request_id] = {
-        'user_id': user_id,
-        'video_id': video_id,
-        'start_time': time.time(),
-        'title': title,
-        'task': task
-    }
-    
-    if user_id not in user_request_counts:
-        user_request_counts[user_id] = 0
-    user_request_counts[user_id] += 1
-    
-    return request_id
+    Extraction हो जाने पर chunk की file तुरंत delete होती है, इसलिए disk पर
+    STREAMING_SECTIONS_IN_FLIGHT chunks से ज़्यादा नहीं रहते। बिना re-encode के cut
+    होने से section पिछले keyframe से शुरू हो सकता है (timestamps कुछ सेकंड आगे-पीछे)।
+    """
 
-def finish_request(request_id):
-    """Finish tracking a request"""
-    if request_id in processing_requests:
-        user_id = processing_requests(request_id)['user_id']
-        
-        # Cancel task if it exists
-        task = processing_requests(request_id).get('task')
-        if task and not task.done():
-            task.cancel()
-        
-        del processing_requests[request_id]
-        
-        if user_id in user_request_counts:
-            user_request_counts[user_id] -= 1
-            if user_request_counts[user_id] <= 0:
-                del user_request_counts[user_id]
+    max_parallel_chunks = STREAMING_SECTIONS_IN_FLIGHT
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Start command handler"""
-    user_name = update.effective_user.first_name
-    user_id = update.effective_user.id
-    username = update.effective_user.username or "No username"
+    def __init__(self, video_id, duration_seconds, quality_profile=DEFAULT_QUALITY_PROFILE):
+        self.video_id = video_id
+        self.duration_seconds = duration_seconds
+        self.quality_profile = quality_profile
+        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+        self.file_prefix = os.path.join(DOWNLOAD_DIR, f"video_{video_id}_{int(time.time())}")
+        self.downloads = {}  # {chunk_num: future}
+        self.paths = {}
 
-    # Save user to database
-    add_user(user_id, username, user_name)
+    def start(self):
+        pass
 
-    welcome_message = f"""
+    async def wait_for_chunk(self, chunk_num, start_time, end_time):
+        path = f"{self.file_prefix}_part{chunk_num}.mp4"
+        self.paths[chunk_num] = path
+        extra_opts = {
+            'format': get_quality_profile(self.quality_profile)['format'],
+            'download_ranges': yt_dlp.utils.download_range_func(None, [(start_time, end_time)]),
+        }
+        info_dict = await video_metadata.get(self.video_id)
+        self.downloads[chunk_num] = asyncio.ensure_future(
+            stage_executor.run('download', download_video_sync, self.video_id, path, [], extra_opts, info_dict)
+        )
+        await self.downloads[chunk_num]
+        return path, 0, end_time - start_time, int(start_time)
+
+    def release_chunk(self, chunk_num):
+        self.downloads.pop(chunk_num, None)
+        remove_file_quietly(self.paths.pop(chunk_num, None))
+
+    async def close(self):
+        for future in self.downloads.values():
+            future.cancel()
+        for path in self.paths.values():
+            remove_file_quietly(path)
+        self.downloads.clear()
+        self.paths.clear()
+
+    async def suspend(self):
+        await self.close()
+
+def create_streaming_chunk_input(video_id, duration_seconds, mode=STREAMING_INGESTION_MODE,
+                                 quality_profile=DEFAULT_QUALITY_PROFILE):
+    if mode == 'sections':
+        return SectionChunkInput(video_id, duration_seconds, quality_profile)
+    return WatermarkChunkInput(video_id, duration_seconds, quality_profile)
+
+def iter_sampled_frames(cap, start_frame, end_frame, n, sampling_mode='exact', counters=None):
+    """start_frame से end_frame तक हर n-th frame (frame_number, BGR frame) yield करता है
+
+    सिर्फ sampled frames retrieve/decode होते हैं; counters dict में
+    'grabbed', 'retrieved' और 'seeks' गिने जाते हैं।
+    """
+    if counters is None:
+        counters = {}
+    for key in ('grabbed', 'retrieved', 'seeks'):
+        counters.setdefault(key, 0)
+
+    if sampling_mode == 'keyframe':
+        target_frame = start_frame
+        while target_frame < end_frame and cap.isOpened():
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame)
+            counters['seeks'] += 1
+            ret, frame = cap.read()
+            if not ret:
+                break
+            counters['retrieved'] += 1
+            yield target_frame, frame
+            target_frame += n
+        return
+
+    if sampling_mode != 'exact':
+        raise ValueError(f"Unknown sampling mode: {sampling_mode}")
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    counters['seeks'] += 1
+    frame_number = start_frame
+    while frame_number < end_frame and cap.isOpened():
+        if not cap.grab():
+            break
+        counters['grabbed'] += 1
+        if (frame_number - start_frame) % n == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            counters['retrieved'] += 1
+            yield frame_number, frame
+        frame_number += 1
+
+class OpenCVFrameSource:
+    """cv2.VideoCapture से sampled frames देता है - हर sample का full frame भी साथ में"""
+
+    def __init__(self, video_file, sampling_mode=FRAME_SAMPLING_MODE, quality_profile=DEFAULT_QUALITY_PROFILE):
+        self.cap = cv2.VideoCapture(video_file)
+        self.fps = int(self.cap.get(cv2.CAP_PROP_FPS))
+        self.sampling_mode = sampling_mode
+        self.profile = get_quality_profile(quality_profile)
+        self.counters = {}
+
+    def samples(self, start_frame, end_frame, n):
+        """(frame_number, gray SSIM frame, full BGR frame) yield करता है"""
+        for frame_number, frame in iter_sampled_frames(self.cap, start_frame, end_frame, n, self.sampling_mode, self.counters):
+            frame = cv2.resize(frame, self.profile['render_dim'], interpolation=self.profile['interpolation'])
+            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            gray_frame = cv2.resize(gray_frame, SSIM_RESIZE_DIM)
+            yield frame_number, gray_frame, frame
+
+    def full_frame(self, frame_number):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        ret, frame = self.cap.read()
+        if not ret:
+            return None
+        return cv2.resize(frame, self.profile['render_dim'], interpolation=self.profile['interpolation'])
+
+    def close(self):
+        self.cap.release()
+
+class FfmpegFrameSource:
+    """ffmpeg pipe से छोटे gray frames सीधे preallocated NumPy buffers में पढ़ता है
+
+    Sampling (select filter), scaling और gray conversion ffmpeg के अंदर होते हैं।
+    Full-size frame सिर्फ उन frames का निकाला जाता है जो PDF में जाने वाले हैं।
+    Yield किए गए gray buffers reuse होते हैं - अगले-से-अगले sample तक ही valid हैं।
+    """
+
+    def __init__(self, video_file, ffmpeg_binary=FFMPEG_BINARY, quality_profile=DEFAULT_QUALITY_PROFILE):
+        self.video_file = video_file
+        self.ffmpeg_binary = ffmpeg_binary
+        self.profile = get_quality_profile(quality_profile)
+        cap = cv2.VideoCapture(video_file)
+        self.exact_fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        cap.release()
+        self.fps = int(self.exact_fps)
+        self.counters = {'retrieved': 0, 'full_fetches': 0}
+        self.process = None
+        self.gray_buffers = [np.empty(SSIM_RESIZE_DIM[::-1], dtype=np.uint8) for _ in range(2)]
+        render_width, render_height = self.profile['render_dim']
+        self.full_buffer = np.empty((render_height, render_width, 3), dtype=np.uint8)
+
+    @staticmethod
+    def is_available(ffmpeg_binary=FFMPEG_BINARY):
+        return shutil.which(ffmpeg_binary) is not None
+
+    def _read_exact(self, stream, buffer):
+        """Pipe से पूरा buffer भरता है; EOF पर False"""
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < len(view):
+            count = stream.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def samples(self, start_frame, end_frame, n):
+        """(frame_number, gray SSIM frame, None) yield करता है - full frame बाद में full_frame() से"""
+        if self.exact_fps <= 0:
+            return
+        width, height = SSIM_RESIZE_DIM
+        command = [
+            self.ffmpeg_binary, '-v', 'error', '-nostdin',
+            '-ss', f'{start_frame / self.exact_fps:.3f}', '-i', self.video_file,
+            '-t', f'{(end_frame - start_frame) / self.exact_fps:.3f}',
+            '-an', '-sn',
+            '-vf', f'select=not(mod(n\\,{n})),scale={width}:{height}:flags=area,format=gray',
+            '-vsync', '0',
+            '-f', 'rawvideo', '-pix_fmt', 'gray', 'pipe:1',
+        ]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        bufsize=width * height * 16)
+        try:
+            sample_index = 0
+            while True:
+                buffer = self.gray_buffers[sample_index % 2]
+                if not self._read_exact(self.process.stdout, buffer):
+                    break
+                frame_number = start_frame + sample_index * n
+                if frame_number >= end_frame:
+                    break
+                self.counters['retrieved'] += 1
+                yield frame_number, buffer, None
+                sample_index += 1
+        finally:
+            self._stop()
+
+    def full_frame(self, frame_number):
+        """एक frame को render size पर pipe से पढ़ता है (buffer अगली call तक valid)"""
+        width, height = self.profile['render_dim']
+        command = [
+            self.ffmpeg_binary, '-v', 'error', '-nostdin',
+            '-ss', f'{frame_number / self.exact_fps:.3f}', '-i', self.video_file,
+            '-frames:v', '1', '-an', '-sn',
+            '-vf', f"scale={width}:{height}:flags={self.profile['ffmpeg_scale']}",
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1',
+        ]
+        self.counters['full_fetches'] += 1
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as process:
+            ok = self._read_exact(process.stdout, self.full_buffer)
+            process.stdout.close()
+            process.wait()
+        return self.full_buffer if ok else None
+
+    def _stop(self):
+        if self.process is not None:
+            try:
+                self.process.stdout.close()
+                self.process.kill()
+                self.process.wait()
+            except Exception:
+                pass
+            self.process = None
+
+    def close(self):
+        self._stop()
+
+def open_frame_source(video_file, frame_source=FRAME_SOURCE, sampling_mode=FRAME_SAMPLING_MODE,
+                      quality_profile=DEFAULT_QUALITY_PROFILE):
+    """Settings के हिसाब से frame source बनाता है (ffmpeg न मिले तो OpenCV)"""
+    if frame_source == 'ffmpeg':
+        if FfmpegFrameSource.is_available():
+            return FfmpegFrameSource(video_file, quality_profile=quality_profile)
+        print("⚠️  ffmpeg not found, using OpenCV frame source")
+    return OpenCVFrameSource(video_file, sampling_mode, quality_profile)
+
+def _box_means(images, win_size):
+    """(B, H, W) batch को एक लंबी image मानकर एक ही cv2.boxFilter call में window means निकालता है
+
+    हर image की सिर्फ valid windows (border crop के बाद) लौटती हैं, इसलिए
+    batch में पड़ोसी images के rows आपस में नहीं मिलते।
+    """
+    batch, height, width = images.shape
+    pad = (win_size - 1) // 2
+    means = cv2.boxFilter(images.reshape(batch * height, width), -1, (win_size, win_size),
+                          borderType=cv2.BORDER_REFLECT)
+    return means.reshape(batch, height, width)[:, pad:height - pad, pad:width - pad]
+
+def batch_ssim(images, references, win_size=7, k1=0.01, k2=0.03):
+    """images[i] और references[i] का SSIM पूरे batch के लिए एक साथ निकालता है
+
+    skimage.metrics.structural_similarity(images[i], references[i], data_range=...) वाला
+    formula ही है (uniform 7x7 window, sample covariance, data_range = images[i] का
+    max - min, और data_range 0 हो तो 1.0)। skimage border crop करके mean लेता है, जो valid
+    windows के mean के बराबर है।
+
+    Tolerance: maps float32 में बनते हैं, इसलिए skimage से |Δ SSIM| < 1e-5 रहता है।
+    Bit-identical pairs का result ठीक 1.0 और बाकी सबका 1.0 से कम रहता है, इसलिए
+    SSIM_THRESHOLD = 1 वाले decisions skimage जैसे ही रहते हैं।
+    """
+    x = images.astype(np.float32)
+    y = references.astype(np.float32)
+    area = win_size * win_size
+    cov_norm = np.float32(area / (area - 1))
+
+    ux = _box_means(x, win_size)
+    uy = _box_means(y, win_size)
+    uxx = _box_means(x * x, win_size)
+    uyy = _box_means(y * y, win_size)
+    uxy = _box_means(x * y, win_size)
+
+    ux_uy = ux * uy
+    ux_sq = ux * ux
+    uy_sq = uy * uy
+    uxx -= ux_sq   # vx / cov_norm
+    uyy -= uy_sq   # vy / cov_norm
+    uxy -= ux_uy   # vxy / cov_norm
+
+    data_ranges = images.max(axis=(1, 2)).astype(np.float64) - images.min(axis=(1, 2))
+    c1 = ((k1 * data_ranges) ** 2).astype(np.float32)[:, None, None]
+    c2 = ((k2 * data_ranges) ** 2).astype(np.float32)[:, None, None]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        numerator = 2 * ux_uy + c1
+        numerator *= 2 * cov_norm * uxy + c2
+        denominator = ux_sq + uy_sq + c1
+        denominator *= cov_norm * (uxx + uyy) + c2
+        numerator /= denominator
+        similarities = numerator.mean(axis=(1, 2), dtype=np.float64)
+
+    identical = (images == references).all(axis=(1, 2))
+    similarities[~identical] = np.minimum(similarities[~identical], np.nextafter(1.0, 0.0))
+    similarities[identical | (data_ranges <= 0)] = 1.0
+    return similarities
+
+def compute_similarities(gray_frames, reference_frames, engine=SIMILARITY_ENGINE):
+    """हर gray frame की उसके reference से SSIM similarity (NumPy array) लौटाता है"""
+    if engine == 'batch':
+        return batch_ssim(gray_frames, reference_frames)
+
+    similarities = np.empty(len(gray_frames))
+    for i, (gray_frame, last_frame) in enumerate(zip(gray_frames, reference_frames)):
+        try:
+            data_range = gray_frame.max() - gray_frame.min()
+            if data_range > 0:
+                similarities[i] = ssim(gray_frame, last_frame, data_range=data_range)
+            else:
+                similarities[i] = 1.0
+        except Exception:
+            similarities[i] = 0.0
+    return similarities
+
+def dhash_frames(gray_frames):
+    """हर gray frame का 64-bit difference hash (uint64 array)"""
+    small = np.stack([cv2.resize(gray_frame, (9, 8), interpolation=cv2.INTER_AREA) for gray_frame in gray_frames])
+    bits = small[:, :, 1:] > small[:, :, :-1]
+    return np.packbits(bits.reshape(len(small), 64), axis=1).view('>u8').ravel().astype(np.uint64)
+
+def hamming_distances(hashes, other_hashes):
+    """दो uint64 hash arrays की element-wise Hamming distance"""
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.asarray(other_hashes, dtype=np.uint64))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def score_similarities(gray_frames, reference_frames, engine=SIMILARITY_ENGINE, counters=None):
+    """Two-tier change detector: पहले identical pixels और dHash distance, सिर्फ बाकी pairs पर SSIM
+
+    Prefilter के decisions किसी भी ssim_threshold पर SSIM वाले decisions जैसे ही रहते हैं:
+    identical pair का SSIM 1 है, और "same" के लिए hash distance पर भरोसा नहीं किया जाता।
+    counters में 'identical', 'hash_different' और 'ssim' (हर tier के pairs) गिने जाते हैं।
+    """
+    if counters is None:
+        counters = {}
+    for key in ('identical', 'hash_different', 'ssim', 'similarity_seconds'):
+        counters.setdefault(key, 0)
+    started = time.perf_counter()
+
+    if not HASH_PREFILTER_ENABLED:
+        counters['ssim'] += len(gray_frames)
+        similarities = compute_similarities(gray_frames, reference_frames, engine)
+        counters['similarity_seconds'] += time.perf_counter() - started
+        return similarities
+
+    same = np.all(gray_frames.reshape(len(gray_frames), -1) == reference_frames.reshape(len(reference_frames), -1),
+                  axis=1)
+    distances = hamming_distances(dhash_frames(gray_frames), dhash_frames(reference_frames))
+    different = ~same & (distances >= HASH_DIFF_MIN_DISTANCE)
+    uncertain = ~(same | different)
+
+    similarities = np.empty(len(gray_frames))
+    similarities[same] = 1.0
+    similarities[different] = 0.0
+    if uncertain.any():
+        similarities[uncertain] = compute_similarities(gray_frames[uncertain], reference_frames[uncertain], engine)
+
+    counters['identical'] += int(same.sum())
+    counters['hash_different'] += int(different.sum())
+    counters['ssim'] += int(uncertain.sum())
+    counters['similarity_seconds'] += time.perf_counter() - started
+    return similarities
+
+def iter_similarity_batches(samples, batch_size=SSIM_BATCH_SIZE, engine=SIMILARITY_ENGINE, counters=None):
+    """Samples को batches में जोड़कर हर sample की पिछले sample से similarity निकालता है
+
+    (frame_number, full frame, similarity) की lists yield करता है; पहले sample की similarity None।
+    Gray frames preallocated stack में copy होते हैं, इसलिए reused source buffers भी safe हैं।
+    """
+    gray_stack = np.empty((batch_size + 1, SSIM_RESIZE_DIM[1], SSIM_RESIZE_DIM[0]), dtype=np.uint8)
+    has_reference = False
+    pending = []
+
+    def score_pending():
+        count = len(pending)
+        first = 0 if has_reference else 1
+        similarities = [None] * count
+        if count > first:
+            scores = score_similarities(gray_stack[first + 1:count + 1], gray_stack[first:count], engine, counters)
+            similarities[first:] = scores.tolist()
+        return [(frame_number, frame, similarity) for (frame_number, frame), similarity in zip(pending, similarities)]
+
+    for frame_number, gray_frame, frame in samples:
+        gray_stack[len(pending) + 1] = gray_frame
+        pending.append((frame_number, frame))
+        if len(pending) == batch_size:
+            yield score_pending()
+            gray_stack[0] = gray_stack[batch_size]
+            has_reference = True
+            pending = []
+
+    if pending:
+        yield score_pending()
+
+# Memory pipeline का एक PDF page - encoded JPEG और उसका size
+# gray: dedup के लिए SSIM-size thumbnail, page_id: एक ही page_id वाले pages PDF में एक image share करते हैं
+FramePage = namedtuple('FramePage', ['frame_number', 'timestamp_seconds', 'image_bytes', 'width', 'height', 'gray', 'page_id'],
+                       defaults=(None, None))
+
+def save_frame_png(output_folder, chunk_num, frame_number, fps, frame):
+    frame_path = os.path.join(output_folder, f'chunk{chunk_num}_frame{frame_number:04d}_{frame_number // fps}.png')
+    cv2.imwrite(frame_path, frame, [int(cv2.IMWRITE_PNG_COMPRESSION), 3])
+
+def emit_frame_page(pages, output_folder, chunk_num, frame_number, fps, frame, timestamp_seconds,
+                    jpeg_quality=FRAME_JPEG_QUALITY):
+    """Selected frame को page बनाता है
+
+    output_folder दिया हो तो PNG file लिखकर (frame_number, timestamp) जोड़ता है (debug pipeline),
+    वरना frame को JPEG में encode करके FramePage जोड़ता है।
+    """
+    if output_folder:
+        save_frame_png(output_folder, chunk_num, frame_number, fps, frame)
+        pages.append((frame_number, timestamp_seconds))
+        return
+    ok, encoded = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality])
+    if ok:
+        height, width = frame.shape[:2]
+        gray = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), SSIM_RESIZE_DIM)
+        pages.append(FramePage(frame_number, timestamp_seconds, encoded.tobytes(), width, height, gray))
+
+extraction_progress_manager = None  # Lazily - सिर्फ bot process में, पहली job पर
+
+def get_extraction_progress_store():
+    """Workers और event loop के बीच shared dict {key: (frames done, total frames, elapsed)}, न बने तो None"""
+    global extraction_progress_manager
+    if not EXTRACTION_PROGRESS_ENABLED:
+        return None
+    if extraction_progress_manager is None:
+        try:
+            extraction_progress_manager = multiprocessing.get_context(CPU_POOL_START_METHOD).Manager()
+            extraction_progress_manager.store = extraction_progress_manager.dict()
+        except Exception as e:
+            print(f"⚠️  Extraction progress disabled: {e}")
+            extraction_progress_manager = False
+    return extraction_progress_manager.store if extraction_progress_manager else None
+
+class ExtractionProgress:
+    """Worker process में chunk की progress shared dict में लिखता है - हर sample पर नहीं, interval पर"""
+
+    def __init__(self, progress, total_frames):
+        self.store, self.key = progress if progress else (None, None)
+        self.total_frames = max(1, total_frames)
+        self.started = time.monotonic()
+        self.last_report = 0.0
+
+    def report(self, frames_done):
+        now = time.monotonic()
+        if self.store is None or now - self.last_report < EXTRACTION_PROGRESS_INTERVAL_SECONDS:
+            return
+        self.last_report = now
+        try:
+            self.store[self.key] = (frames_done, self.total_frames, now - self.started)
+        except Exception:
+            self.store = None  # Manager बंद हो गया - extraction progress के बिना चलती रहे
+
+def extract_unique_frames_for_chunk(video_file, output_folder, start_time, end_time, chunk_num, n=3, ssim_threshold=0.8,
+                                    sampling_mode=FRAME_SAMPLING_MODE, frame_source=FRAME_SOURCE, time_offset=0,
+                                    similarity_engine=SIMILARITY_ENGINE, counters=None,
+                                    quality_profile=DEFAULT_QUALITY_PROFILE, progress=None):
+    """Video के specific chunk से unique frames extract करता है
+
+    output_folder None हो तो frames memory में JPEG FramePage बनकर लौटते हैं।
+    time_offset (seconds) timestamps में जोड़ा जाता है - जब chunk अलग file में हो।
+    counters dict में sampling और change-detector tiers की गिनती जुड़ती है।
+    progress (shared dict, key) मिले तो scanned frames वहाँ लिखे जाते हैं।
+    """
+    if counters is None:
+        counters = {}
+    source = open_frame_source(video_file, frame_source, sampling_mode, quality_profile)
+    jpeg_quality = get_quality_profile(quality_profile)['jpeg_quality']
+    fps = source.fps
+    
+    start_frame = int(start_time * fps)
+    end_frame = int(end_time * fps)
+    
+    saved_frame = None
+    saved_frame_number = -1
+    last_saved_frame_number = -1
+    timestamps = []
+    progress = ExtractionProgress(progress, end_frame - start_frame)
+
+    try:
+        samples = source.samples(start_frame, end_frame, n)
+        for scored_batch in iter_similarity_batches(samples, engine=similarity_engine, counters=counters):
+            if scored_batch:
+                progress.report(scored_batch[-1][0] - start_frame)
+            for frame_number, frame, similarity in scored_batch:
+                if similarity is not None:
+                    if similarity < ssim_threshold:
+                        if saved_frame_number >= 0 and frame_number - last_saved_frame_number > fps:
+                            if saved_frame is None:
+                                saved_frame = source.full_frame(saved_frame_number)
+                            if saved_frame is not None:
+                                emit_frame_page(timestamps, output_folder, chunk_num, frame_number, fps, saved_frame,
+                                                frame_number // fps + time_offset, jpeg_quality)
+
+                        last_saved_frame_number = frame_number
+                    saved_frame = frame
+                    saved_frame_number = frame_number
+                else:
+                    if frame is None:
+                        frame = source.full_frame(frame_number)
+                    if frame is not None:
+                        emit_frame_page(timestamps, output_folder, chunk_num, frame_number, fps, frame,
+                                        frame_number // fps + time_offset, jpeg_quality)
+                    last_saved_frame_number = frame_number
+
+    finally:
+        source.close()
+        merge_counters(counters, source.counters)
+
+    return timestamps
+
+def extract_transition_frames_for_chunk(video_file, output_folder, start_time, end_time, chunk_num, n=3, ssim_threshold=0.8,
+                                        time_offset=0, similarity_engine=SIMILARITY_ENGINE, counters=None,
+                                        coarse_step_seconds=TRANSITION_COARSE_STEP_SECONDS,
+                                        precision_frames=TRANSITION_SEARCH_PRECISION_FRAMES,
+                                        quality_profile=DEFAULT_QUALITY_PROFILE, progress=None):
+    """Coarse-to-fine strategy: sparse samples लेकर, बदलाव मिलने पर binary search से transition frame ढूंढता है
+
+    हर slide का एक page बनता है - image slide का आखिरी frame (पूरी बनी slide) और
+    timestamp slide के शुरू होने का। एक second से छोटी slides (transition animations) छोड़ दी जाती हैं।
+    n इस strategy में use नहीं होता; coarse step settings से आता है।
+    """
+    if counters is None:
+        counters = {}
+    for key in ('retrieved', 'seeks'):
+        counters.setdefault(key, 0)
+
+    profile = get_quality_profile(quality_profile)
+    cap = cv2.VideoCapture(video_file)
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    start_frame = int(start_time * fps)
+    end_frame = int(end_time * fps)
+    step = max(1, int(coarse_step_seconds * fps))
+    precision_frames = max(1, precision_frames)
+    read_cache = {}  # एक search के दौरान पढ़े गए frames: {frame_number: (frame, gray)}
+    timestamps = []
+    progress = ExtractionProgress(progress, end_frame - start_frame)
+
+    def read_at(frame_number):
+        if frame_number not in read_cache:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            counters['seeks'] += 1
+            ret, frame = cap.read()
+            if not ret:
+                return None, None
+            counters['retrieved'] += 1
+            frame = cv2.resize(frame, profile['render_dim'], interpolation=profile['interpolation'])
+            gray_frame = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), SSIM_RESIZE_DIM)
+            read_cache[frame_number] = (frame, gray_frame)
+        return read_cache[frame_number]
+
+    def is_different(gray_frame, reference_frame):
+        similarity = score_similarities(gray_frame[None], reference_frame[None], similarity_engine, counters)[0]
+        return similarity < ssim_threshold
+
+    def save_slide(slide_start, slide_end):
+        """slide_start पर शुरू हुई slide का slide_end वाला frame page बनाता है"""
+        frame, _ = read_at(slide_end)
+        if frame is None:
+            return
+        emit_frame_page(timestamps, output_folder, chunk_num, slide_start, fps, frame, slide_start // fps + time_offset,
+                        profile['jpeg_quality'])
+
+    try:
+        _, slide_gray = read_at(start_frame)
+        if slide_gray is None:
+            return timestamps
+        slide_start = start_frame
+        last_frame_number = start_frame
+
+        coarse_points = list(range(start_frame + step, end_frame, step))
+        if end_frame - 1 > start_frame and (not coarse_points or coarse_points[-1] != end_frame - 1):
+            coarse_points.append(end_frame - 1)
+
+        low = start_frame
+        for high in coarse_points:
+            progress.report(high - start_frame)
+            _, high_gray = read_at(high)
+            if high_gray is None:
+                break
+            last_frame_number = high
+
+            # एक interval में कई transitions हो सकते हैं - हर बार पहला ढूंढकर आगे बढ़ना
+            while is_different(high_gray, slide_gray):
+                search_low, search_high = low, high
+                while search_high - search_low > precision_frames:
+                    middle = (search_low + search_high) // 2
+                    _, middle_gray = read_at(middle)
+                    if middle_gray is None:
+                        search_high = middle
+                    elif is_different(middle_gray, slide_gray):
+                        search_high = middle
+                    else:
+                        search_low = middle
+
+                transition = search_high
+                if transition - slide_start > fps:
+                    save_slide(slide_start, transition - 1)
+                slide_start = transition
+                _, slide_gray = read_at(transition)
+                if slide_gray is None:
+                    break
+                low = transition
+                if transition == high:
+                    break
+
+            low = high
+            # पुराने frames cache से हटाना, सिर्फ current slide की शुरुआत और high रखना
+            for cached_number in [k for k in read_cache if k not in (slide_start, high)]:
+                del read_cache[cached_number]
+
+        if last_frame_number - slide_start >= 0:
+            save_slide(slide_start, last_frame_number)
+    finally:
+        cap.release()
+
+    return timestamps
+
+EXTRACTION_STRATEGIES = {
+    'stride': extract_unique_frames_for_chunk,
+    'transition': extract_transition_frames_for_chunk,
+}
+
+def run_extraction_job(*args, strategy=EXTRACTION_STRATEGY, **kwargs):
+    """CPU worker का entry point - चुनी गई strategy से extraction चलाकर (timestamps, counters) लौटाता है
+
+    Worker process के counters parent तक return value से ही पहुँचते हैं।
+    """
+    counters = {}
+    started = time.perf_counter()
+    timestamps = EXTRACTION_STRATEGIES[strategy](*args, counters=counters, **kwargs)
+    counters['extract_seconds'] = time.perf_counter() - started
+    return timestamps, counters
+
+class VideoDedupIndex:
+    """पूरी video में emit हुई pages का index - chunks के बीच dedup state यहीं रहता है
+
+    Chunks अलग processes में parallel extract होते हैं, इसलिए dedup part order में
+    main process में होता है। हर chunk का पहला page पिछले page से SSIM पर मिलाया जाता है
+    (chunk boundary पर चल रही slide दोबारा न आए)। हर page का dHash पहले की सभी
+    pages के hashes से मिलाया जाता है - पास वाली पुरानी page SSIM से पक्की हो तो page
+    repeat है और DUPLICATE_PAGE_POLICY लगती है। हर unique page का सिर्फ 64-bit hash
+    और SSIM-size gray thumbnail रखा जाता है।
+    """
+
+    def __init__(self, policy=DUPLICATE_PAGE_POLICY, ssim_threshold=SSIM_THRESHOLD, engine=SIMILARITY_ENGINE,
+                 max_hash_distance=DUPLICATE_HASH_MAX_DISTANCE):
+        self.policy = policy
+        self.ssim_threshold = ssim_threshold
+        self.engine = engine
+        self.max_hash_distance = max_hash_distance
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.grays = []
+        self.last_gray = None
+
+    def _is_same(self, gray, reference):
+        # Hash prefilter नहीं - repeat सिर्फ असली SSIM से पक्का होता है, वरना एक bullet जोड़ने वाली slide drop हो जाती
+        return compute_similarities(gray[None], reference[None], self.engine)[0] >= self.ssim_threshold
+
+    def _find_repeat(self, gray, page_hash):
+        """पहले emit हुई मिलती-जुलती page का page_id, नई से पुरानी की तरफ"""
+        if not len(self.hashes):
+            return None
+        distances = hamming_distances(self.hashes, np.full(len(self.hashes), page_hash, dtype=np.uint64))
+        for page_id in np.flatnonzero(distances <= self.max_hash_distance)[::-1]:
+            if self._is_same(gray, self.grays[page_id]):
+                return int(page_id)
+        return None
+
+    def filter(self, pages, counters=None):
+        """Chunk की pages (part order में) से duplicates हटाकर emit होने वाली pages लौटाता है
+
+        counters में 'boundary_duplicates' और 'repeat_pages' गिने जाते हैं।
+        """
+        if counters is None:
+            counters = {}
+        for key in ('boundary_duplicates', 'repeat_pages'):
+            counters.setdefault(key, 0)
+
+        kept = []
+        for index, page in enumerate(pages):
+            if not isinstance(page, FramePage) or page.gray is None:
+                kept.append(page)
+                continue
+            if index == 0 and self.last_gray is not None and self._is_same(page.gray, self.last_gray):
+                counters['boundary_duplicates'] += 1
+                continue
+            self.last_gray = page.gray
+
+            page_hash = dhash_frames(page.gray[None])[0]
+            repeat_id = self._find_repeat(page.gray, page_hash) if self.policy != 'keep' else None
+            if repeat_id is not None:
+                counters['repeat_pages'] += 1
+                if self.policy == 'reference':
+                    kept.append(page._replace(gray=None, page_id=repeat_id))
+                continue
+
+            self.hashes = np.append(self.hashes, page_hash)
+            self.grays.append(page.gray)
+            kept.append(page._replace(gray=None, page_id=len(self.grays) - 1))
+        return kept
+
+def add_frame_page(pdf, image_name, width, height, timestamp_seconds):
+    """एक image को page के बीच में fit करके timestamp + watermark के साथ page जोड़ता है"""
+    pdf.add_page()
+
+    pdf_width = pdf.w
+    pdf_height = pdf.h
+
+    aspect_ratio = width / height
+    new_width = pdf_width
+    new_height = pdf_width / aspect_ratio
+
+    if new_height > pdf_height:
+        new_height = pdf_height
+        new_width = pdf_height * aspect_ratio
+
+    x = (pdf_width - new_width) / 2
+    y = (pdf_height - new_height) / 2
+
+    pdf.image(image_name, x=x, y=y, w=new_width, h=new_height)
+
+    timestamp = f"{timestamp_seconds // 3600:02d}:{(timestamp_seconds % 3600) // 60:02d}:{timestamp_seconds % 60:02d}"
+    watermark_text = WATERMARK_TEXT
+    combined_text = f"{timestamp} - {watermark_text}"
+
+    pdf.set_xy(5, 5)
+    pdf.set_font("Arial", size=18)
+    pdf.cell(0, 0, combined_text)
+
+def register_jpeg_image(pdf, image_name, image_bytes, width, height):
+    """JPEG bytes को बिना decode किए FPDF में image की तरह register करता है (DCTDecode passthrough)"""
+    pdf.images[image_name] = {
+        'w': width,
+        'h': height,
+        'cs': 'DeviceRGB',
+        'bpc': 8,
+        'f': 'DCTDecode',
+        'data': image_bytes,
+        'i': len(pdf.images) + 1,
+    }
+
+class StreamingPdfWriter:
+    """PDF को page-by-page सीधे file में लिखता है - FPDF की तरह पूरा document memory में नहीं रखता
+
+    हर page की JPEG (DCTDecode passthrough), content stream और page object तुरंत
+    disk पर जाते हैं; memory में सिर्फ object offsets रहते हैं। Pages tree, catalog
+    और xref close() पर आख़िर में लिखे जाते हैं। Layout FPDF("L") वाला ही है
+    (page_format का landscape page, image page के बीच में fit, ऊपर बाएं timestamp + watermark)।
+    """
+
+    SCALE = 72 / 25.4  # mm से points (FPDF के unit 'mm' जैसा)
+    PAGES_OBJECT = 1
+    FONT_OBJECT = 2
+    FONT_SIZE = 18
+    PAGE_OVERHEAD_BYTES = 1024  # Image dict + content stream + page object (ऊपरी सीमा)
+    PAGE_TRAILER_BYTES = 80  # हर page के xref entries + Kids reference
+
+    def __init__(self, output_file, page_format='A4'):
+        self.output_file = output_file
+        self.page_width, self.page_height = PDF_PAGE_SIZES[page_format]
+        self.temp_file = f"{output_file}.writing"
+        self.file = open(self.temp_file, 'wb')
+        self.offsets = {}
+        self.page_objects = []
+        self.image_objects = {}  # {image_key: object number} - repeat pages एक image share करते हैं
+        self.next_object = 3
+        self.bytes_written = 0
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._write_object(self.FONT_OBJECT,
+                           b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    @property
+    def pages(self):
+        return len(self.page_objects)
+
+    def projected_size(self, extra_image_bytes=None):
+        """एक और page (extra_image_bytes की नई JPEG) जोड़कर close करने पर file का अनुमानित size
+
+        extra_image_bytes None हो तो बिना नए page के; 0 हो तो page जिसकी image पहले से लिखी है।
+        """
+        pages = self.pages
+        page_bytes = 0
+        if extra_image_bytes is not None:
+            pages += 1
+            page_bytes = extra_image_bytes + self.PAGE_OVERHEAD_BYTES
+        return self.bytes_written + page_bytes + pages * self.PAGE_TRAILER_BYTES + 512
+
+    def _write(self, data):
+        self.file.write(data)
+        self.bytes_written += len(data)
+
+    def _allocate(self):
+        object_number = self.next_object
+        self.next_object += 1
+        return object_number
+
+    def _write_object(self, object_number, body, stream=None):
+        self.offsets[object_number] = self.bytes_written
+        self._write(f'{object_number} 0 obj\n'.encode())
+        self._write(body)
+        if stream is not None:
+            self._write(b'\nstream\n')
+            self._write(stream)
+            self._write(b'\nendstream')
+        self._write(b'\nendobj\n')
+
+    def add_jpeg(self, image_bytes, width, height, image_key=None):
+        """JPEG bytes को image XObject की तरह लिखता है और उसका object number लौटाता है
+
+        image_key पहले से लिखी image का हो तो वही object दोबारा use होता है।
+        """
+        if image_key is not None and image_key in self.image_objects:
+            return self.image_objects[image_key]
+        object_number = self._allocate()
+        if image_key is not None:
+            self.image_objects[image_key] = object_number
+        self._write_object(
+            object_number,
+            f'<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceRGB '
+            f'/BitsPerComponent 8 /Filter /DCTDecode /Length {len(image_bytes)} >>'.encode(),
+            image_bytes,
+        )
+        return object_number
+
+    def add_page(self, image_object, width, height, timestamp_seconds):
+        """पहले से लिखी image को नए page पर fit करके timestamp + watermark के साथ जोड़ता है"""
+        page_width_mm = self.page_width / self.SCALE
+        page_height_mm = self.page_height / self.SCALE
+
+        aspect_ratio = width / height
+        new_width = page_width_mm
+        new_height = page_width_mm / aspect_ratio
+        if new_height > page_height_mm:
+            new_height = page_height_mm
+            new_width = page_height_mm * aspect_ratio
+        x = (page_width_mm - new_width) / 2
+        y = (page_height_mm - new_height) / 2
+
+        timestamp = f"{timestamp_seconds // 3600:02d}:{(timestamp_seconds % 3600) // 60:02d}:{timestamp_seconds % 60:02d}"
+        combined_text = f"{timestamp} - {WATERMARK_TEXT}"
+        escaped_text = combined_text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+        # FPDF का cell(0, 0, text) at (5, 5): 1mm cell margin, baseline = y + 0.3 * font size
+        text_x = 6 * self.SCALE
+        text_y = self.page_height - (5 + 0.3 * self.FONT_SIZE / self.SCALE) * self.SCALE
+        content = (
+            f'q {new_width * self.SCALE:.2f} 0 0 {new_height * self.SCALE:.2f} '
+            f'{x * self.SCALE:.2f} {(page_height_mm - y - new_height) * self.SCALE:.2f} cm /I{image_object} Do Q\n'
+            f'BT /F1 {self.FONT_SIZE:.2f} Tf {text_x:.2f} {text_y:.2f} Td ({escaped_text}) Tj ET'
+        ).encode('latin-1', 'replace')
+
+        content_object = self._allocate()
+        self._write_object(content_object, f'<< /Length {len(content)} >>'.encode(), content)
+
+        page_object = self._allocate()
+        self._write_object(
+            page_object,
+            f'<< /Type /Page /Parent {self.PAGES_OBJECT} 0 R '
+            f'/MediaBox [0 0 {self.page_width:.2f} {self.page_height:.2f}] '
+            f'/Resources << /Font << /F1 {self.FONT_OBJECT} 0 R >> '
+            f'/XObject << /I{image_object} {image_object} 0 R >> >> '
+            f'/Contents {content_object} 0 R >>'.encode(),
+        )
+        self.page_objects.append(page_object)
+
+    def close(self):
+        """Pages tree, catalog, xref और trailer लिखकर file को उसकी जगह पर रखता है"""
+        kids = ' '.join(f'{page_object} 0 R' for page_object in self.page_objects)
+        self._write_object(self.PAGES_OBJECT, f'<< /Type /Pages /Kids [{kids}] /Count {self.pages} >>'.encode())
+
+        catalog_object = self._allocate()
+        self._write_object(catalog_object, f'<< /Type /Catalog /Pages {self.PAGES_OBJECT} 0 R >>'.encode())
+
+        xref_offset = self.bytes_written
+        xref = [f'xref\n0 {self.next_object}\n', '0000000000 65535 f \n']
+        for object_number in range(1, self.next_object):
+            xref.append(f'{self.offsets[object_number]:010d} 00000 n \n')
+        self._write(''.join(xref).encode())
+        self._write(f'trailer\n<< /Size {self.next_object} /Root {catalog_object} 0 R >>\n'
+                    f'startxref\n{xref_offset}\n%%EOF\n'.encode())
+        self.file.close()
+        os.replace(self.temp_file, self.output_file)
+
+    def abort(self):
+        """अधूरी file हटा देता है"""
+        self.file.close()
+        remove_file_quietly(self.temp_file)
+
+def fill_pdf_part(writer, pages, max_bytes=PART_TARGET_BYTES, max_pages=PART_MAX_PAGES):
+    """FramePages को writer में तब तक जोड़ता है जब तक part की size/page limit न आ जाए
+
+    Returns: कितने pages जुड़े - बाकी pages अगले part में जाएंगे। खाली part में
+    पहला page हमेशा जुड़ता है ताकि कोई page छूटे नहीं।
+    """
+    added = 0
+    for page in pages:
+        new_image_bytes = 0 if page.page_id in writer.image_objects else len(page.image_bytes)
+        if writer.pages and (writer.pages >= max_pages or writer.projected_size(new_image_bytes) > max_bytes):
+            break
+        image_object = writer.add_jpeg(page.image_bytes, page.width, page.height, page.page_id)
+        writer.add_page(image_object, page.width, page.height, page.timestamp_seconds)
+        added += 1
+    return added
+
+def convert_frames_to_pdf_chunk(input_folder, output_file, timestamps, chunk_num, page_format='A4'):
+    """Specific chunk के frames को PDF में convert करता है
+
+    input_folder None हो तो timestamps में FramePage (memory pipeline) होते हैं,
+    वरना (frame_number, timestamp) और frames folder की PNG files में।
+    Memory pages PDF_BACKEND = 'streaming' होने पर StreamingPdfWriter से लिखे जाते हैं।
+    """
+    if input_folder is None and PDF_BACKEND == 'streaming':
+        if not timestamps:
+            return 0
+        writer = StreamingPdfWriter(output_file, page_format)
+        try:
+            fill_pdf_part(writer, timestamps, max_bytes=float('inf'), max_pages=float('inf'))
+            writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.pages
+
+    pdf = FPDF("L", format=page_format)
+    pdf.set_auto_page_break(False)
+
+    total_pages = 0
+
+    if input_folder is None:
+        for page_number, page in enumerate(timestamps):
+            if page.page_id is not None:
+                image_name = f'page{page.page_id}.jpg'
+            else:
+                image_name = f'chunk{chunk_num}_page{page_number}.jpg'
+            if image_name not in pdf.images:
+                register_jpeg_image(pdf, image_name, page.image_bytes, page.width, page.height)
+            add_frame_page(pdf, image_name, page.width, page.height, page.timestamp_seconds)
+            total_pages += 1
+    else:
+        frame_files = [f for f in os.listdir(input_folder) if f.startswith(f'chunk{chunk_num}_')]
+        frame_files = sorted(frame_files, key=lambda x: int(x.split('_')[1].split('frame')[-1]))
+
+        for i, (frame_file, (frame_number, timestamp_seconds)) in enumerate(zip(frame_files, timestamps)):
+            frame_path = os.path.join(input_folder, frame_file)
+            if not os.path.exists(frame_path):
+                continue
+
+            image = Image.open(frame_path)
+            width, height = image.size
+            add_frame_page(pdf, frame_path, width, height, timestamp_seconds)
+            total_pages += 1
+
+    if total_pages > 0:
+        pdf.output(output_file)
+    return total_pages
+
+class JobQueue:
+    """SQLite में durable job queue - users के बीच weighted fair order, admin पहले
+
+    Scheduling self-clocked fair queueing है: हर job का virtual finish time
+    max(queue का virtual time, उसी user की पिछली job का finish) + video duration / weight
+    होता है और सबसे छोटा finish time पहले चलता है। इसलिए एक user की दस लंबी
+    videos बाकी users की छोटी videos को नहीं रोकतीं। Admin jobs की priority ऊंची है।
+    Bot restart होने पर बीच में रुकी ('running') jobs फिर से queue में आ जाती हैं और
+    उनके checkpoint (download हुई file, अगला chunk, भेजे गए parts) से आगे चलती हैं।
+    उसी video + settings की queued/running job होने पर नए requesters उसके subscribers
+    बनते हैं (subscribers table) - video एक ही बार download और process होती है।
+    """
+
+    COLUMNS = ('id', 'user_id', 'user_name', 'username', 'chat_id', 'reply_to', 'url', 'video_id',
+               'quality_profile', 'duration', 'title', 'priority', 'virtual_finish', 'status',
+               'enqueued_at', 'started_at', 'finished_at')
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()  # join_or_enqueue बाकी methods को lock पकड़े-पकड़े बुलाता है
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    user_name TEXT,
+                    username TEXT,
+                    chat_id INTEGER NOT NULL,
+                    reply_to INTEGER,
+                    url TEXT,
+                    video_id TEXT NOT NULL,
+                    quality_profile TEXT,
+                    duration REAL DEFAULT 0,
+                    title TEXT,
+                    priority INTEGER DEFAULT 0,
+                    virtual_finish REAL DEFAULT 0,
+                    status TEXT DEFAULT 'queued',
+                    enqueued_at REAL,
+                    started_at REAL,
+                    finished_at REAL,
+                    checkpoint TEXT
+                )
+            """)
+            self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, virtual_finish)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS jobs_video ON jobs (video_id, quality_profile, status)')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS subscribers (
+                    job_id TEXT NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    user_name TEXT,
+                    chat_id INTEGER NOT NULL,
+                    reply_to INTEGER,
+                    parts_sent INTEGER DEFAULT 0,
+                    joined_at REAL,
+                    PRIMARY KEY (job_id, user_id)
+                )
+            """)
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_info(jobs)')}
+            if 'checkpoint' not in columns:
+                self.conn.execute('ALTER TABLE jobs ADD COLUMN checkpoint TEXT')
+        self.virtual_time = 0.0
+        self.user_finish = {}  # {user_id: आख़िरी queued job का virtual finish}
+        self.processing_rate = DEFAULT_PROCESSING_RATE
+
+    def recover(self):
+        """पिछले run की running jobs को फिर queue करता है और virtual clock वापस बनाता है
+
+        सिर्फ bot के startup पर - किसी और process से चलाने पर live jobs दोबारा queue हो जाएँगी।
+        """
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+            self.conn.execute("DELETE FROM jobs WHERE status != 'queued' AND finished_at < ?",
+                              (time.time() - JOB_HISTORY_DAYS * 86400,))
+            self.conn.execute("DELETE FROM subscribers WHERE job_id NOT IN (SELECT id FROM jobs)")
+            rows = self.conn.execute(
+                "SELECT user_id, MIN(virtual_finish) AS first, MAX(virtual_finish) AS last "
+                "FROM jobs WHERE status = 'queued' GROUP BY user_id"
+            ).fetchall()
+        if rows:
+            self.virtual_time = min(row['first'] for row in rows)
+            self.user_finish = {row['user_id']: row['last'] for row in rows}
+
+    def enqueue(self, user_id, user_name, username, chat_id, reply_to, url, video_id, quality_profile,
+                duration, is_admin_user=False):
+        """नई job queue में डालता है और उसका id लौटाता है"""
+        job_id = str(uuid.uuid4())
+        weight = ADMIN_JOB_WEIGHT if is_admin_user else USER_JOB_WEIGHT
+        with self.lock, self.conn:
+            start = max(self.virtual_time, self.user_finish.get(user_id, 0.0))
+            virtual_finish = start + max(duration, 60) / weight
+            self.user_finish[user_id] = virtual_finish
+            self.conn.execute(
+                "INSERT INTO jobs (id, user_id, user_name, username, chat_id, reply_to, url, video_id, "
+                "quality_profile, duration, title, priority, virtual_finish, status, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, user_id, user_name, username, chat_id, reply_to, url, video_id, quality_profile,
+                 duration, 'Processing...', 1 if is_admin_user else 0, virtual_finish, time.time())
+            )
+        return job_id
+
+    def next_job(self, max_running_per_user):
+        """Fair order में अगली चलने लायक job को 'running' mark करके लौटाता है, न हो तो None"""
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND user_id NOT IN ("
+                "  SELECT user_id FROM jobs WHERE status = 'running' GROUP BY user_id HAVING COUNT(*) >= ?"
+                ") ORDER BY priority DESC, virtual_finish, enqueued_at LIMIT 1",
+                (max_running_per_user,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                              (time.time(), row['id']))
+            self.virtual_time = max(self.virtual_time, row['virtual_finish'])
+            job = dict(row)
+            job['checkpoint'] = json.loads(job['checkpoint']) if job['checkpoint'] else None
+            return job
+
+    def finish(self, job_id, status='done'):
+        """Job को done/failed mark करता है; done jobs से processing rate (ETA के लिए) update होता है"""
+        with self.lock, self.conn:
+            now = time.time()
+            row = self.conn.execute("SELECT duration, started_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            self.conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (status, now, job_id))
+            if status == 'done' and row and row['started_at'] and row['duration']:
+                sample = (now - row['started_at']) / row['duration']
+                self.processing_rate = 0.8 * self.processing_rate + 0.2 * sample
+
+    def save_checkpoint(self, job_id, checkpoint):
+        """Job की progress (JSON) लिखता है - crash/restart के बाद यहीं से resume होगा"""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE jobs SET checkpoint = ? WHERE id = ?", (json.dumps(checkpoint), job_id))
+
+    def checkpointed_files(self):
+        """अधूरी jobs के checkpoints में दर्ज video files (इन्हें startup cleanup में नहीं हटाना)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT checkpoint FROM jobs WHERE status IN ('queued', 'running') AND checkpoint IS NOT NULL"
+            ).fetchall()
+        paths = set()
+        for row in rows:
+            video_path = json.loads(row['checkpoint']).get('video_path')
+            if video_path:
+                paths.add(os.path.abspath(video_path))
+        return paths
+
+    def find_active(self, video_id, quality_profile):
+        """उसी video + quality profile की queued/running job (dict) या None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE video_id = ? AND quality_profile = ? AND status IN ('queued', 'running') "
+                "ORDER BY enqueued_at LIMIT 1", (video_id, quality_profile)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def add_subscriber(self, job_id, user_id, user_name, chat_id, reply_to):
+        """User को चल रही job का subscriber बनाता है; पहले से हो तो False"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO subscribers (job_id, user_id, user_name, chat_id, reply_to, joined_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (job_id, user_id, user_name, chat_id, reply_to, time.time())
+            )
+        return cursor.rowcount > 0
+
+    def join_or_enqueue(self, user_id, user_name, username, chat_id, reply_to, url, video_id, quality_profile,
+                        duration, is_admin_user=False):
+        """Singleflight lookup और enqueue एक ही lock में - (job_id, active job या None, subscriber बना या नहीं)
+
+        उसी video + quality profile की queued/running job हो तो user उसका subscriber बनता है
+        (job का मालिक या पहले से subscriber हो तो नहीं), वरना नई job queue में जाती है। Calls
+        io stage पर चलते हैं, इसलिए बीच में दूसरा request वही video enqueue न कर दे।
+        """
+        with self.lock:
+            active_job = self.find_active(video_id, quality_profile)
+            if active_job is None:
+                job_id = self.enqueue(user_id, user_name, username, chat_id, reply_to, url, video_id,
+                                      quality_profile, duration, is_admin_user)
+                return job_id, None, False
+            joined = active_job['user_id'] != user_id and self.add_subscriber(
+                active_job['id'], user_id, user_name, chat_id, reply_to)
+            return active_job['id'], active_job, joined
+
+    def subscribers(self, job_id):
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM subscribers WHERE job_id = ? ORDER BY joined_at",
+                                     (job_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_subscriber_progress(self, job_id, user_id, parts_sent):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE subscribers SET parts_sent = ? WHERE job_id = ? AND user_id = ?",
+                              (parts_sent, job_id, user_id))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def set_title(self, job_id, title):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE jobs SET title = ? WHERE id = ?", (title, job_id))
+
+    def user_counts(self, user_id):
+        """(queued, running) jobs of user"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) AS count FROM jobs WHERE user_id = ? AND status IN ('queued', 'running') "
+                "GROUP BY status", (user_id,)
+            ).fetchall()
+        counts = {row['status']: row['count'] for row in rows}
+        return counts.get('queued', 0), counts.get('running', 0)
+
+    def counts(self):
+        """(queued, running) jobs पूरे server पर"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) AS count FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+            ).fetchall()
+        counts = {row['status']: row['count'] for row in rows}
+        return counts.get('queued', 0), counts.get('running', 0)
+
+    def position(self, job_id):
+        """Queue में (position, अनुमानित इंतज़ार seconds); job queued न हो तो (0, 0)
+
+        इंतज़ार = आगे वाली jobs का अनुमानित काम / अभी चल रही jobs की संख्या।
+        """
+        with self.lock:
+            job = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None or job['status'] != 'queued':
+                return 0, 0
+            ahead = self.conn.execute(
+                "SELECT COUNT(*) AS count, COALESCE(SUM(duration), 0) AS seconds FROM jobs "
+                "WHERE status = 'queued' AND (priority > ? OR (priority = ? AND "
+                "(virtual_finish < ? OR (virtual_finish = ? AND enqueued_at < ?))))",
+                (job['priority'], job['priority'], job['virtual_finish'], job['virtual_finish'], job['enqueued_at'])
+            ).fetchone()
+            running = self.conn.execute(
+                "SELECT COUNT(*) AS count, COALESCE(SUM(duration), 0) AS seconds, "
+                "COALESCE(SUM(? - started_at), 0) AS elapsed FROM jobs WHERE status = 'running'",
+                (time.time(),)
+            ).fetchone()
+        remaining_running = max(0.0, running['seconds'] * self.processing_rate - running['elapsed'])
+        work_ahead = ahead['seconds'] * self.processing_rate + remaining_running
+        return ahead['count'] + 1, work_ahead / max(1, running['count'])
+
+job_queue = None  # open_state_stores() में; recovery start_job_scheduler() में
+running_jobs = {}  # {job_id: asyncio task} - इसी process में चल रही jobs
+job_fanouts = {}  # {job_id: JobFanout} - चल रही jobs के subscribers
+fanout_tasks = set()  # Subscribers तक parts भेजने वाले background tasks (shutdown पर cancel)
+job_scheduler_wakeup = None  # Event loop के अंदर lazily बनता है
+
+def wake_job_scheduler():
+    """नई job या खाली हुई capacity पर scheduler को जगाता है"""
+    if job_scheduler_wakeup is not None:
+        job_scheduler_wakeup.set()
+
+def has_job_capacity():
+    """Measured load के हिसाब से नई job शुरू हो सकती है या नहीं
+
+    चल रही jobs की limit के साथ stage queues भी देखी जाती हैं - extract stage में
+    CPU workers से कई गुना काम पहले से queued हो तो नई job सिर्फ backlog बढ़ाएगी।
+    """
+    if len(running_jobs) >= MAX_CONCURRENT_TOTAL_REQUESTS:
+        return False
+    stats = stage_executor.stats()
+    if stats['extract']['queued'] >= CPU_POOL_WORKERS * ADMISSION_MAX_EXTRACT_BACKLOG:
+        return False
+    if stats['download']['queued'] >= stats['download']['limit']:
+        return False
+    return True
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Start command handler"""
+    user_name = update.effective_user.first_name
+    user_id = update.effective_user.id
+    username = update.effective_user.username or "No username"
+
+    # Save user to database
+    add_user(user_id, username, user_name)
+
+    # Parts का विवरण अभी की PART_POLICY से
+    if size_based_parts_enabled():
+        parts_steps = (
+            f"2. Bot video की slides को PDF parts में जोड़ेगा - हर part लगभग "
+            f"{PART_TARGET_BYTES // (1024 * 1024)} MB या {PART_MAX_PAGES} pages तक\n"
+            f"3. हर part भरते ही उसकी PDF तुरंत भेजी जाएगी"
+        )
+    else:
+        parts_steps = (
+            f"2. Bot video को {CHUNK_DURATION_MINUTES:g}-{CHUNK_DURATION_MINUTES:g} मिनट के भागों में बांटेगा\n"
+            f"3. हर भाग की PDF बनकर तुरंत भेजी जाएगी"
+        )
+
+    welcome_message = f"""
 👋 नमस्ते {user_name}!
 
 🎬 YouTube to PDF Bot में आपका स्वागत है!
 
 📋 कैसे काम करता है:
 1. YouTube video का link भेजें 
-2. Bot video को 30-30 मिनट के भागों में बांटेगा
-3. हर भाग की PDF बनकर तुरंत भेजी जाएगी
+{parts_steps}
 
 🚀 नई सुविधाएं:
 • आप एक साथ {MAX_REQUESTS_PER_USER} videos process कर सकते हैं
 • Multiple users एक साथ bot use कर सकते हैं
 • Real-time parallel processing
 • Instant responses और updates
+• Quality चुनें: /profile (fast / standard / hq)
 
 🚨 Bot को लिंक के अलावा कोई और मैसेज न करें 
 यह मैसेज Owner के पास नहीं जाता है
 📞 Contact Owner - @LODHIJI27
 
-बस YouTube link भेजिए! 🚀
+बस YouTube link भेजिए! 🚀
+
+⚠️ नोट: केवल 1.5 घंटे तक की videos ही process होंगी
+    """
+
+    await update.message.reply_text(welcome_message)
+
+    # /start message और user info channel outbox में (forward के बाद info)
+    audit_outbox.forward(update.message, priority='low')
+    audit_outbox.text(f"""
+🆕 नया User Bot को Start किया!
+
+👤 Name: {user_name}
+🆔 User ID: {user_id}
+📝 Username: @{username}
+⏰ Time: {time.strftime('%Y-%m-%d %H:%M:%S')}
+    """, key=f"user{user_id}")
+
+async def upload_pdf(bot, chat_id, pdf_path, filename, caption, reply_to_message_id=None):
+    """PDF file को disk से सीधे upload करता है और भेजा गया message लौटाता है"""
+    with open(pdf_path, 'rb') as pdf_file, metrics.time('upload'):
+        message = await bot.send_document(
+            chat_id=chat_id,
+            document=pdf_file,
+            filename=filename,
+            caption=caption,
+            reply_to_message_id=reply_to_message_id
+        )
+    metrics.inc('uploads')
+    metrics.inc('upload_bytes', os.path.getsize(pdf_path))
+    return message
+
+async def deliver_pdf_part(bot, pdf_path, filename, channel_caption, user_chat_id, user_caption, reply_to_message_id=None):
+    """PDF को सिर्फ एक बार upload करता है, दूसरी copy Telegram file_id से भेजता है
+
+    Returns: Telegram file_id (cache के लिए) या None
+    """
+    file_size = os.path.getsize(pdf_path)
+    file_id = None
+
+    # STEP 1: Channel में real upload
+    try:
+        channel_doc_msg = await upload_pdf(bot, CHANNEL_USERNAME, pdf_path, filename, channel_caption)
+        if channel_doc_msg and channel_doc_msg.document:
+            file_id = channel_doc_msg.document.file_id
+    except Exception as e:
+        print(f"⚠️  Channel upload error: {e}")
+
+    try:
+        await bot.send_chat_action(chat_id=user_chat_id, action=ChatAction.UPLOAD_DOCUMENT)
+    except Exception:
+        pass
+
+    # STEP 2: User को file_id से भेजना (दोबारा upload नहीं)
+    if file_id:
+        try:
+            await bot.send_document(
+                chat_id=user_chat_id,
+                document=file_id,
+                caption=user_caption,
+                reply_to_message_id=reply_to_message_id
+            )
+            # Upload reuse - /stats और /metrics में file_id sends और बचे हुए bytes
+            metrics.inc('file_id_sends')
+            metrics.inc('bytes_saved', file_size)
+            return file_id
+        except Exception as e:
+            print(f"⚠️  file_id send failed, uploading again: {e}")
+
+    # STEP 3: Fallback - user को real upload
+    try:
+        user_doc_msg = await upload_pdf(bot, user_chat_id, pdf_path, filename, user_caption, reply_to_message_id)
+        if file_id:
+            metrics.inc('fallback_uploads')
+        elif user_doc_msg and user_doc_msg.document:
+            file_id = user_doc_msg.document.file_id
+    except Exception as e:
+        # Do not send error message to user, as PDF might have been sent.
+        print(f"⚠️  User upload error: {e}")
+
+    return file_id
+
+async def send_job_message(bot, chat_id, text, reply_to_message_id=None):
+    """Job के chat में message भेजता है - job queue से चलती है, इसलिए update object नहीं होता"""
+    return await bot.send_message(chat_id=chat_id, text=text, reply_to_message_id=reply_to_message_id,
+                                  allow_sending_without_reply=True)
+
+class ProgressReporter:
+    """एक status message की progress edits - सिर्फ latest text, PROGRESS_EDIT_INTERVAL_SECONDS में एक edit
+
+    update() किसी भी thread से call हो सकता है (yt-dlp progress hook worker thread
+    में चलता है): text सिर्फ रख लिया जाता है और flush loop.call_soon_threadsafe से
+    event loop में schedule होता है, हर tick पर नया task नहीं बनता। पिछली edit
+    जैसा text दोबारा नहीं भेजा जाता।
+    """
+
+    def __init__(self, message, min_interval=PROGRESS_EDIT_INTERVAL_SECONDS):
+        self.message = message
+        self.min_interval = min_interval
+        self.loop = asyncio.get_running_loop()
+        self.latest = None
+        self.shown = None
+        self.last_edit = 0.0
+        self.wake_pending = False
+        self.flush_handle = None
+        self.flush_task = None
+        self.closed = False
+
+    def update(self, text):
+        """नया progress text (thread-safe) - पुराना unsent text बस बदल जाता है"""
+        self.latest = text
+        if not self.wake_pending and not self.closed:
+            self.wake_pending = True
+            try:
+                self.loop.call_soon_threadsafe(self._schedule)
+            except RuntimeError:
+                pass  # Loop बंद हो चुका
+
+    def _schedule(self):
+        self.wake_pending = False
+        if self.closed or self.flush_handle is not None or self.flush_task is not None:
+            return
+        if self.latest is None or self.latest == self.shown:
+            return
+        delay = max(0.0, self.last_edit + self.min_interval - time.monotonic())
+        self.flush_handle = self.loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self.flush_handle = None
+        self.flush_task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        text = self.latest
+        self.last_edit = time.monotonic()
+        try:
+            await self.message.edit_text(text)
+            self.shown = text
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            self.last_edit += retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else retry_after
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                self.shown = text
+        except Exception as e:
+            logger.debug(f"Progress update error: {e}")
+        finally:
+            self.flush_task = None
+        self._schedule()  # इस बीच नया text आया हो तो
+
+    async def close(self):
+        """आगे की edits बंद; चल रही edit पूरी होने देता है ताकि बाद की direct edit उसके ऊपर आए"""
+        self.closed = True
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.flush_task is not None:
+            try:
+                await self.flush_task
+            except Exception:
+                pass
+
+def format_extraction_progress(chunk_label, start_time, end_time, request_id, state):
+    """Worker की (frames done, total frames, elapsed) state से processing message"""
+    frames_done, total_frames, elapsed = state
+    fraction = min(1.0, frames_done / max(1, total_frames))
+    eta = elapsed / fraction * (1 - fraction) if fraction > 0 else 0
+    bar_length = 20
+    filled_length = int(bar_length * fraction)
+    return (
+        f"🔄 Processing {chunk_label}\n"
+        f"📍 Time: {format_duration(start_time)} - {format_duration(end_time)}\n"
+        f"🆔 Request: {request_id[:8]}...\n"
+        f"⚙️ [{'▓' * filled_length}{'░' * (bar_length - filled_length)}] {fraction * 100:.0f}%\n"
+        f"🎞️ Frames scanned: {frames_done}/{total_frames}\n"
+        f"⌛ ETA: ~{format_duration(int(eta))}"
+    )
+
+class JobFanout:
+    """Singleflight: चल रही job के parts उसी video + settings के बाकी requesters तक पहुँचाता है
+
+    Job के parts channel में upload होते ही उनका file_id subscribers को भेजा जाता है,
+    इसलिए subscriber के लिए न download होता है न extraction। बाद में जुड़ा subscriber
+    पहले बन चुके parts भी पाता है। हर subscriber का अपना lock और parts_sent है, जिससे
+    parts order में और एक ही बार जाते हैं; parts_sent job queue में रहता है ताकि
+    restart के बाद resume हुई job भी वहीं से आगे भेजे।
+
+    Subscribers को भेजना background tasks में होता है, इसलिए धीमा subscriber या
+    late joiner का backlog parts बनाने वाली job को नहीं रोकता। file_id fail होने पर
+    upload के लिए part की PDF का hard link तब तक रखा जाता है जब तक सब subscribers
+    उससे आगे न निकल जाएँ।
+    """
+
+    def __init__(self, bot, job_id, title, parts=()):
+        self.bot = bot
+        self.job_id = job_id
+        self.title = title
+        self.parts = list(parts)  # अब तक भेजे गए parts (checkpoint वाले dicts)
+        self.live_paths = {}  # {part index: pdf link} - file_id fail हो तो upload के लिए, सब subscribers भेजे जाने तक
+        self.subscribers = []
+        self.outcome = None  # Job खत्म होने का message (completion या error)
+
+    def attach(self, subscriber):
+        """Subscriber जोड़ता है और उसे अब तक के parts background में भेजना शुरू करता है
+
+        Job start पर DB से आए subscribers और उसी समय join करने वाला user दोनों रास्तों से
+        आ सकते हैं - एक user एक ही बार जुड़ता है।
+        """
+        if any(existing['user_id'] == subscriber['user_id'] for existing in self.subscribers):
+            return
+        subscriber = dict(subscriber, lock=asyncio.Lock(), finished=False)
+        self.subscribers.append(subscriber)
+        self._schedule(subscriber)
+
+    def _schedule(self, subscriber):
+        task = asyncio.ensure_future(self.catch_up(subscriber))
+        fanout_tasks.add(task)
+        task.add_done_callback(fanout_tasks.discard)
+
+    def _keep_live_copy(self, index, pdf_path):
+        """Job अपनी PDF part भेजते ही हटा देती है - subscribers के लिए उसका hard link (या copy)"""
+        os.makedirs(DOWNLOAD_DIR, exist_ok=True)  # Restart पर बचे links orphan cleanup में हटते हैं
+        live_path = os.path.join(DOWNLOAD_DIR, f"{self.job_id}_part{index}.pdf")
+        try:
+            try:
+                os.link(pdf_path, live_path)
+            except OSError:
+                shutil.copyfile(pdf_path, live_path)
+        except OSError as e:
+            print(f"⚠️  Subscriber PDF copy error: {e}")
+            return
+        self.live_paths[index] = live_path
+
+    def _release_live_copies(self):
+        """जिन parts से सब subscribers आगे निकल चुके उनकी PDF copies हटाना"""
+        for index in list(self.live_paths):
+            if all(subscriber['parts_sent'] > index for subscriber in self.subscribers):
+                remove_file_quietly(self.live_paths.pop(index))
+
+    async def send_part(self, subscriber, index):
+        part = self.parts[index]
+        part_label = f"{part['part']}/{part['total']}" if part.get('total') else f"{part['part']}"
+        caption = f"""
+✅ Part {part_label} Complete!
+
+🎬 Title: {self.title}
+📄 Pages: {part['pages']}
+⏱️ Time Range: {format_duration(part['start'])} - {format_duration(part['end'])}
+🔗 Shared Processing
+        """
+        if part.get('file_id'):
+            try:
+                await self.bot.send_document(chat_id=subscriber['chat_id'], document=part['file_id'], caption=caption,
+                                             reply_to_message_id=subscriber['reply_to'],
+                                             allow_sending_without_reply=True)
+                metrics.inc('file_id_sends')
+                return
+            except Exception as e:
+                print(f"⚠️  Subscriber file_id send error: {e}")
+        pdf_path = self.live_paths.get(index)
+        if pdf_path and os.path.exists(pdf_path):
+            try:
+                await upload_pdf(self.bot, subscriber['chat_id'], pdf_path, part['filename'], caption,
+                                 subscriber['reply_to'])
+                return
+            except Exception as e:
+                print(f"⚠️  Subscriber upload error: {e}")
+        await send_job_message(self.bot, subscriber['chat_id'],
+                               f"⚠️ Part {part_label} आप तक नहीं भेजा जा सका, कृपया link बाद में फिर भेजें।")
+
+    async def catch_up(self, subscriber):
+        """Subscriber को उसके बाद के सभी parts (और job खत्म हो गई हो तो आख़िरी message) भेजता है"""
+        async with subscriber['lock']:
+            while subscriber['parts_sent'] < len(self.parts):
+                try:
+                    await self.send_part(subscriber, subscriber['parts_sent'])
+                except Exception as e:
+                    print(f"⚠️  Subscriber delivery error: {e}")
+                subscriber['parts_sent'] += 1
+                await stage_executor.run('io', job_queue.set_subscriber_progress,
+                                         self.job_id, subscriber['user_id'], subscriber['parts_sent'])
+                self._release_live_copies()
+            if self.outcome and not subscriber['finished']:
+                subscriber['finished'] = True
+                try:
+                    await send_job_message(self.bot, subscriber['chat_id'], self.outcome, subscriber['reply_to'])
+                except Exception as e:
+                    print(f"⚠️  Subscriber message error: {e}")
+
+    async def publish(self, part, pdf_path):
+        """नया part सभी subscribers को background में भेजना शुरू करता है - job इंतज़ार नहीं करती"""
+        index = len(self.parts)
+        self.parts.append(part)
+        if not self.subscribers:
+            return
+        self._keep_live_copy(index, pdf_path)
+        for subscriber in self.subscribers:
+            self._schedule(subscriber)
+
+    async def finish(self, text):
+        """Job का आख़िरी message (completion या error) सभी subscribers को, बचे parts के बाद"""
+        if self.outcome is None:
+            self.outcome = text
+        for subscriber in self.subscribers:
+            self._schedule(subscriber)
+
+async def process_video_chunks(bot, chat_id, reply_to, video_id, title, chunk_input, user_name, user_id, username, url, duration_seconds, request_id,
+                               quality_profile=DEFAULT_QUALITY_PROFILE, checkpoint=None):
+    """Video को chunks में process करता है और हर part की PDF बनते ही भेजता है
+
+    chunk_input बताता है कि हर chunk की video file कब और कहाँ मिलेगी
+    (FullFileChunkInput, WatermarkChunkInput या SectionChunkInput)। 'size' part
+    policy में chunks सिर्फ extraction की इकाई हैं - pages एक चलती हुई streaming PDF
+    में जुड़ते हैं और part PART_TARGET_BYTES / PART_MAX_PAGES पर बंद होकर भेजा जाता है।
+
+    checkpoint (job queue में रखा dict) हर भेजे गए part के बाद update होता है:
+    'chunk' से extraction दोबारा शुरू होती है और 'resume_from' से पहले के pages
+    छोड़ दिए जाते हैं, इसलिए restart के बाद पहला न भेजा गया part ही आगे आता है।
+    """
+    start_time = time.time()
+    extraction_futures = {}  # {chunk_num: future}
+    current_part = None  # Size policy में अभी बन रहा part
+    suspended = False
+    if checkpoint is None:
+        checkpoint = {}
+    resumed = 'chunk' in checkpoint
+    
+    try:
+        chunk_duration_seconds = CHUNK_DURATION_MINUTES * 60
+        total_chunks = int(np.ceil(duration_seconds / chunk_duration_seconds))
+        size_parts = size_based_parts_enabled()
+        page_format = get_quality_profile(quality_profile)['page_format']
+        
+        # Update request info
+        await stage_executor.run('io', job_queue.set_title, request_id, title)
+        
+        # Send initial analysis
+        if size_parts:
+            parts_line = f"📦 Parts: ~{PART_TARGET_BYTES // (1024 * 1024)} MB / {PART_MAX_PAGES} pages तक के"
+        else:
+            parts_line = f"📦 Total Chunks: {total_chunks}"
+        analysis_text = (
+            f"📊 Video Analysis:\n"
+            f"🎬 Title: {title}\n"
+            f"⏱️ कुल समय: {format_duration(duration_seconds)}\n"
+            f"{parts_line}\n"
+            f"🎚️ Quality: {quality_profile}\n"
+            f"🆔 Request ID: {request_id[:8]}...\n\n"
+            + (f"♻️ Resuming from Part {checkpoint['next_part']} "
+               f"({format_duration(checkpoint['resume_from'])} से)..." if resumed else
+               f"🔄 Starting to process {total_chunks} chunks...")
+        )
+        await send_job_message(bot, chat_id, analysis_text)
+        audit_outbox.text(analysis_text, key=request_id)
+
+        delivered_parts = checkpoint.get('parts', [])
+        total_pages_all = checkpoint.get('total_pages', 0)
+        total_parts_sent = len(delivered_parts)
+        all_chunks_done = True
+        safe_title = sanitize_filename(title)[:50]
+        dedup_index = VideoDedupIndex()  # पूरी video का dedup state, chunks के बीच चलता है
+
+        # Result cache में नई entry शुरू करना (resumed job के पहले parts पिछले run में गए, वो cache नहीं होगी)
+        cache_key = get_result_cache_key(video_id, quality_profile)
+        if not resumed:
+            await stage_executor.run('io', result_cache.begin, cache_key, video_id, title, duration_seconds)
+
+        async def save_checkpoint(next_chunk, resume_from):
+            """अब तक भेजे गए parts के बाद job कहाँ से resume होगी, यह job queue में लिखता है"""
+            checkpoint.update({
+                'chunk': next_chunk,
+                'resume_from': resume_from,
+                'next_part': next_part_num,
+                'total_pages': total_pages_all,
+                'parts': delivered_parts,
+            })
+            # Snapshot - io thread में JSON बनते समय parts list न बदले
+            await stage_executor.run('io', job_queue.save_checkpoint, request_id, dict(checkpoint, parts=list(delivered_parts)))
+
+        # Parallel mode में chunks process pool में एक साथ चलते हैं, पर per-video window तक सीमित
+        if PARALLEL_CHUNK_EXTRACTION:
+            parallel_window = max(1, min(MAX_PARALLEL_CHUNKS_PER_VIDEO, CPU_POOL_WORKERS, chunk_input.max_parallel_chunks))
+        else:
+            parallel_window = 1
+
+        def chunk_time_range(chunk_num):
+            return chunk_num * chunk_duration_seconds, min((chunk_num + 1) * chunk_duration_seconds, duration_seconds)
+
+        progress_store = get_extraction_progress_store()
+
+        def progress_key(chunk_num):
+            return f"{request_id}:{chunk_num}"
+
+        async def extract_chunk(chunk_num):
+            """Chunk की file ready होने का इंतज़ार करके उसकी extraction चलाता है"""
+            chunk_start, chunk_end = chunk_time_range(chunk_num)
+            chunk_file, file_start, file_end, time_offset = await chunk_input.wait_for_chunk(chunk_num, chunk_start, chunk_end)
+            try:
+                timestamps, job_counters = await stage_executor.run(
+                    'extract', run_extraction_job,
+                    chunk_file, frames_folder, file_start, file_end, chunk_num,
+                    n=FRAME_SKIP_FOR_SSIM_CHECK, ssim_threshold=SSIM_THRESHOLD, time_offset=time_offset,
+                    strategy=EXTRACTION_STRATEGY, quality_profile=quality_profile,
+                    progress=(progress_store, progress_key(chunk_num)) if progress_store is not None else None
+                )
+                merge_counters(extraction_counters, job_counters)
+                # Worker के अंदर का बँटवारा: similarity (hash + SSIM) और बाकी decode/resize/JPEG
+                extract_seconds = job_counters.get('extract_seconds', 0)
+                similarity_seconds = job_counters.get('similarity_seconds', 0)
+                metrics.observe('extract.similarity', similarity_seconds)
+                metrics.observe('extract.decode', max(0.0, extract_seconds - similarity_seconds))
+                metrics.inc('frames_sampled', job_counters.get('retrieved', 0))
+                metrics.inc('frames_emitted', len(timestamps))
+                trace_event(request_id, 'chunk_extracted', chunk=chunk_num, frames=len(timestamps),
+                            sampled=job_counters.get('retrieved', 0), extract_seconds=round(extract_seconds, 3),
+                            similarity_seconds=round(similarity_seconds, 3))
+                return timestamps
+            finally:
+                chunk_input.release_chunk(chunk_num)
+                if progress_store is not None:
+                    try:
+                        progress_store.pop(progress_key(chunk_num), None)
+                    except Exception:
+                        pass
+
+        async def wait_for_extraction(chunk_num, processing_msg, chunk_label, chunk_start, chunk_end):
+            """Chunk की extraction का इंतज़ार, बीच-बीच में worker की progress message में दिखाते हुए"""
+            future = extraction_futures.pop(chunk_num)
+            if progress_store is None:
+                return await future
+            reporter = ProgressReporter(processing_msg)
+            try:
+                while True:
+                    done, _ = await asyncio.wait([future], timeout=EXTRACTION_PROGRESS_INTERVAL_SECONDS)
+                    if done:
+                        return future.result()
+                    try:
+                        state = await stage_executor.run('io', progress_store.get, progress_key(chunk_num))
+                    except Exception:
+                        state = None
+                    if state:
+                        reporter.update(format_extraction_progress(chunk_label, chunk_start, chunk_end, request_id, state))
+            finally:
+                if not future.done():
+                    future.cancel()  # Job cancel हुई - worker का काम भी रोकना
+                await reporter.close()
+
+        def schedule_extractions(first_chunk):
+            """first_chunk से आगे window भर के chunks को executor में submit करता है"""
+            for next_chunk in range(first_chunk, min(first_chunk + parallel_window, total_chunks)):
+                if next_chunk in extraction_futures:
+                    continue
+                extraction_futures[next_chunk] = asyncio.ensure_future(extract_chunk(next_chunk))
+
+        async def deliver_part(part_num, total_parts, pdf_path, filename, pages, part_start, part_end):
+            """बनी हुई part PDF को channel + user को भेजता है और cache में रखता है"""
+            nonlocal total_pages_all, total_parts_sent, all_chunks_done
+            part_label = f"{part_num}/{total_parts}" if total_parts else f"{part_num}"
+            time_range = f"{format_duration(part_start)} - {format_duration(part_end)}"
+
+            # Telegram limit से बड़ी file upload करने की कोशिश नहीं - user को साफ बताना
+            file_size = os.path.getsize(pdf_path)
+            if file_size > TELEGRAM_MAX_UPLOAD_BYTES:
+                all_chunks_done = False
+                print(f"⚠️  Part {part_label} is {file_size / (1024 * 1024):.1f} MB, over the upload limit - not sent")
+                await send_job_message(bot, chat_id,
+                    f"⚠️ Part {part_label} ({file_size / (1024 * 1024):.1f} MB) Telegram की upload limit से बड़ा है, "
+                    f"इसलिए भेजा नहीं जा सका।\n⏱️ Time Range: {time_range}"
+                )
+                return
+
+            total_pages_all += pages
+            total_parts_sent += 1
+
+            # Prepare caption for user
+            chunk_caption = f"""
+✅ Part {part_label} Complete!
+
+🎬 Title: {title}
+📄 Pages: {pages}
+⏱️ Time Range: {time_range}
+🆔 Request: {request_id[:8]}...
+            """
+
+            # STEP 1: Channel info message (outbox से)
+            audit_outbox.text(f"""
+📤 PDF Part Ready!
 
-⚠️ नोट: केवल 1.5 घंटे तक की videos ही process होंगी
-    """
+👤 User: {user_name} (@{username})
+🆔 ID: {user_id}
+🎬 Video: {title}
+📄 Part {part_label} - {pages} pages
+⏱️ Time: {format_duration(part_start)}-{format_duration(part_end)}
+🆔 Request: {request_id[:8]}...
+🔗 URL: {url}
+            """, key=request_id, priority='high')
 
-    await update.message.reply_text(welcome_message)
+            # STEP 2: PDF एक बार upload, दूसरी copy file_id से
+            delivery_started = time.perf_counter()
+            channel_file_id = await deliver_pdf_part(
+                bot, pdf_path, filename,
+                channel_caption=f"📤 {user_name} का Part {part_label}",
+                user_chat_id=chat_id,
+                user_caption=chunk_caption,
+                reply_to_message_id=reply_to
+            )
+            delivery_seconds = time.perf_counter() - delivery_started
+            metrics.observe('deliver_part', delivery_seconds)
+            metrics.inc('parts_delivered')
+            metrics.inc('pages_delivered', pages)
+            metrics.inc('pdf_bytes', file_size)
+            trace_event(request_id, 'part_delivered', part=part_num, pages=pages, bytes=file_size,
+                        start=part_start, end=part_end, deliver_seconds=round(delivery_seconds, 3))
+            if channel_file_id:
+                print(f"📤 Part {part_label} sent to channel & user: {user_name}")
+            part_record = {
+                'part': part_num,
+                'total': total_parts,
+                'pages': pages,
+                'start': part_start,
+                'end': part_end,
+                'filename': filename,
+                'file_id': channel_file_id,
+            }
+            delivered_parts.append(part_record)
 
-    # Forward original /start message to channel FIRST
-    try:
-        await update.message.forward(chat_id=CHANNEL_USERNAME)
-        print(f"📤 /start command forwarded to channel from user: {user_name}")
-    except Exception as e:
-        print(f"⚠️ Start message forward error: {e}")
-    
-    # Send additional info message for channel
-    try:
-        channel_message = f"""
-🆕 नया User Bot को Start किया!
+            # उसी video के subscribers को यही part (file_id से)
+            fanout = job_fanouts.get(request_id)
+            if fanout:
+                await fanout.publish(part_record, pdf_path)
 
-👤 Name: {user_name}
-🆔 User ID: {user_id}
-📝 Username: @{username}
-⏰ Time: {time.strftime('%Y-%m-%d %H:%M:%S')}
-        """
-        await context.bot.send_message(chat_id=CHANNEL_USERNAME, text=channel_message)
-        print(f"📤 Start info sent to channel for user: {user_name}")
-    except Exception as e:
-        print(f"⚠️ Channel info message error: {e}")
+            # STEP 3: PDF और file_id को result cache में रखना
+            try:
+                await stage_executor.run(
+                    'io', result_cache.add_part, cache_key, part_num, total_parts,
+                    pages, part_start, part_end, filename, pdf_path, channel_file_id
+                )
+            except Exception as e:
+                print(f"⚠️  Cache store error: {e}")
 
-async def process_video_chunks(update, context, video_id, title, video_path, user_name, user_id, username, url, duration_seconds, request_id):
-    """Video को chunks में process करता है और हर chunk की PDF instantly भेजता है"""
-    start_time = time.time()
-    
-    try:
-        chunk_duration_seconds = CHUNK_DURATION_MINUTES * 60
-        total_chunks = int(np.ceil(duration_seconds / chunk_duration_seconds))
-        
-        # Update request info
-        if request_id in processing_requests:
-            processing_requests[request_id]['title'] = title
-        
-        # Send initial analysis
-        analysis_msg = await update.message.reply_text(
-            f"📊 Video Analysis:\n"
-            f"🎬 Title: {title}\n"
-            f"⏱️ कुल समय: {format_duration(duration_seconds)}\n"
-            f"📦 Total Chunks: {total_chunks}\n"
-            f"🆔 Request ID: {request_id[:8]}...\n\n"
-            f"🔄 Starting to process {total_chunks} chunks..."
-        )
-        
-        # Forward analysis to channel
-        try:
-            await analysis_msg.forward(chat_id=CHANNEL_USERNAME)
-        except:
-            pass
+        def open_part(part_num, part_start):
+            """Size policy का नया part - streaming PDF temp folder में खुलता है"""
+            filename = f"{safe_title}_Part{part_num}_{request_id[:8]}.pdf"
+            pdf_path = os.path.join(temp_folder, filename)
+            return {
+                'num': part_num,
+                'start': part_start,
+                'filename': filename,
+                'path': pdf_path,
+                'writer': StreamingPdfWriter(pdf_path, page_format),
+            }
 
-        total_pages_all = 0
+        async def close_part(part, part_end):
+            """Part की PDF पूरी करके भेजता है"""
+            await stage_executor.run('io', part['writer'].close)
+            await deliver_part(part['num'], None, part['path'], part['filename'],
+                               part['writer'].pages, part['start'], part_end)
+            remove_file_quietly(part['path'])
 
         with tempfile.TemporaryDirectory() as temp_folder:
-            for chunk_num in range(total_chunks):
+            # Memory pipeline में frames JPEG bytes बनकर सीधे PDF builder तक जाते हैं, files सिर्फ debug में
+            frames_folder = temp_folder if FRAME_PIPELINE == 'files' else None
+            first_chunk = checkpoint.get('chunk', 0)
+            next_part_num = checkpoint.get('next_part', 1)
+            next_part_start = checkpoint.get('resume_from', 0)
+            for chunk_num in range(first_chunk, total_chunks):
                 # Check if request is still active
-                if request_id not in processing_requests:
+                if request_id not in running_jobs:
+                    all_chunks_done = False
                     break
                     
-                start_time_chunk = chunk_num * chunk_duration_seconds
-                end_time_chunk = min((chunk_num + 1) * chunk_duration_seconds, duration_seconds)
+                start_time_chunk, end_time_chunk = chunk_time_range(chunk_num)
+                schedule_extractions(chunk_num)
+                chunk_label = f"Section {chunk_num + 1}/{total_chunks}" if size_parts else f"Part {chunk_num + 1}/{total_chunks}"
                 
                 # Send processing update immediately
-                processing_msg = await update.message.reply_text(
-                    f"🔄 Processing Part {chunk_num + 1}/{total_chunks}\n"
+                processing_text = (
+                    f"🔄 Processing {chunk_label}\n"
                     f"📍 Time: {format_duration(start_time_chunk)} - {format_duration(end_time_chunk)}\n"
                     f"🆔 Request: {request_id[:8]}...\n"
                     f"⚙️ Extracting frames for chunk..."
                 )
+                processing_msg = await send_job_message(bot, chat_id, processing_text)
+                audit_outbox.text(processing_text, key=request_id, priority='low')
                 
-                # Forward processing update to channel
-                try:
-                    await processing_msg.forward(chat_id=CHANNEL_USERNAME)
-                except:
-                    pass
-                
-                # Process chunk in thread pool to avoid blocking
-                def process_chunk():
-                    return extract_unique_frames_for_chunk(
-                        video_path, temp_folder, start_time_chunk, end_time_chunk, chunk_num, 
-                        n=FRAME_SKIP_FOR_SSIM_CHECK, ssim_threshold=SSIM_THRESHOLD
-                    )
-                
-                # Run frame extraction in thread
-                loop = asyncio.get_event_loop()
-                timestamps = await loop.run_in_executor(thread_pool, process_chunk)
+                # Chunk की extraction (पहले से चल रही हो सकती है) पूरी होने का इंतज़ार, part order में
+                timestamps = await wait_for_extraction(chunk_num, processing_msg, chunk_label,
+                                                       start_time_chunk, end_time_chunk)
+                if timestamps:
+                    dedup_counters = {}
+                    timestamps = await stage_executor.run('io', dedup_index.filter, timestamps, dedup_counters)
+                    merge_counters(extraction_counters, dedup_counters)
+                if chunk_num == first_chunk and next_part_start:
+                    # Resume: पिछले run में भेजे जा चुके pages छोड़ना (index 1 = timestamp, दोनों pipelines में)
+                    timestamps = [page for page in timestamps if page[1] >= next_part_start]
                 
                 if not timestamps:
-                    await processing_msg.edit_text(f"⚠️ Part {chunk_num + 1}: कोई unique frames नहीं मिले")
+                    await processing_msg.edit_text(f"⚠️ {chunk_label.split('/')[0]}: कोई unique frames नहीं मिले")
                     continue
                 
                 # Update progress
                 try:
                     await processing_msg.edit_text(
-                        f"✅ Part {chunk_num + 1}/{total_chunks} - Frames Extracted!\n"
+                        f"✅ {chunk_label} - Frames Extracted!\n"
                         f"📍 Time: {format_duration(start_time_chunk)} - {format_duration(end_time_chunk)}\n"
                         f"🆔 Request: {request_id[:8]}...\n"
                         f"📄 Creating PDF... ({len(timestamps)} frames)"
                     )
                 except:
                     pass
-                
-                # Create chunk filename
-                safe_title = sanitize_filename(title)[:50]
-                chunk_filename = f"{safe_title}_Part{chunk_num + 1}_of_{total_chunks}_{request_id[:8]}.pdf"
-                chunk_pdf_path = os.path.join(temp_folder, chunk_filename)
-                
-                # Convert to PDF in thread
-                def create_pdf():
-                    return convert_frames_to_pdf_chunk(temp_folder, chunk_pdf_path, timestamps, chunk_num)
-                
-                pages_in_chunk = await loop.run_in_executor(thread_pool, create_pdf)
-                total_pages_all += pages_in_chunk
-                
-                if pages_in_chunk > 0 and os.path.exists(chunk_pdf_path):
-                    # Update message to indicate PDF creation is complete
-                    try:
-                        await processing_msg.edit_text(
-                            f"✅ Part {chunk_num + 1}/{total_chunks} - PDF Created!\n"
-                            f"📄 Pages: {pages_in_chunk}\n"
-                            f"📍 Time: {format_duration(start_time_chunk)} - {format_duration(end_time_chunk)}\n"
-                            f"🆔 Request: {request_id[:8]}...\n"
-                            f"📤 Preparing to send..."
-                        )
-                    except:
-                        pass
-                    
-                    # Prepare caption for user
-                    chunk_caption = f"""
-✅ Part {chunk_num + 1}/{total_chunks} Complete!
-
-🎬 Title: {title}
-📄 Pages: {pages_in_chunk}
-⏱️ Time Range: {format_duration(start_time_chunk)} - {format_duration(end_time_chunk)}
-🆔 Request: {request_id[:8]}...
-                    """
-                    
-                    # STEP 1: Send to CHANNEL FIRST (with proper file handling)
-                    try:
-                        # Channel message first
-                        channel_update = f"""
-📤 PDF Part Ready!
 
-👤 User: {user_name} (@{username})
-🆔 ID: {user_id}
-🎬 Video: {title}
-📄 Part {chunk_num + 1}/{total_chunks} - {pages_in_chunk} pages
-⏱️ Time: {format_duration(start_time_chunk)}-{format_duration(end_time_chunk)}
-🆔 Request: {request_id[:8]}...
-🔗 URL: {url}
-                        """
-                        await context.bot.send_message(chat_id=CHANNEL_USERNAME, text=channel_update)
-                        
-                        # Send PDF to channel (with proper file reading)
-                        with open(chunk_pdf_path, 'rb') as pdf_file:
-                            pdf_content = pdf_file.read()  # Read file content first
-                        
-                        # Send to channel using BytesIO to avoid file closing issues
-                        pdf_stream = io.BytesIO(pdf_content)
-                        pdf_stream.name = chunk_filename
-                        
-                        await context.bot.send_document(
-                            chat_id=CHANNEL_USERNAME,
-                            document=pdf_stream,
-                            filename=chunk_filename,
-                            caption=f"📤 {user_name} का Part {chunk_num + 1}/{total_chunks}"
+                if size_parts:
+                    # Pages चलती हुई part PDF में जुड़ते हैं; part भरते ही बंद होकर भेजा जाता है
+                    pending_pages = timestamps
+                    while pending_pages:
+                        if current_part is None:
+                            current_part = open_part(next_part_num, next_part_start)
+                            next_part_num += 1
+                        added = await stage_executor.run(
+                            'io', fill_pdf_part, current_part['writer'], pending_pages, PART_TARGET_BYTES, PART_MAX_PAGES
                         )
-                        
-                        print(f"📤 Part {chunk_num + 1}/{total_chunks} sent to channel & user: {user_name}")
-                        
-                    except Exception as e:
-                        print(f"⚠️  Channel send error: {e}")
+                        pending_pages = pending_pages[added:]
+                        if pending_pages:
+                            # Part भर गया - उसका time range अगले part के पहले page तक
+                            next_part_start = pending_pages[0].timestamp_seconds
+                            finished_part, current_part = current_part, None
+                            await close_part(finished_part, next_part_start)
+                            await save_checkpoint(chunk_num, next_part_start)
+                else:
+                    # Create chunk filename
+                    chunk_filename = f"{safe_title}_Part{chunk_num + 1}_of_{total_chunks}_{request_id[:8]}.pdf"
+                    chunk_pdf_path = os.path.join(temp_folder, chunk_filename)
                     
-                    # STEP 2: Send to USER (after channel)
-                    try:
-                        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.UPLOAD_DOCUMENT)
-
-                        # Create new stream for user
-                        user_pdf_stream = io.BytesIO(pdf_content)
-                        user_pdf_stream.name = chunk_filename
-
-                        await update.message.reply_document(
-                            document=user_pdf_stream,
-                            filename=chunk_filename,
-                            caption=chunk_caption
-                        )
-
-                        print(f"✅ PDF Part {chunk_num + 1} delivered to user: {user_name}")
-
-                    except Exception as e:
-                        # Do not send error message to user, as PDF might have been sent.
-                        pass # Add pass to satisfy indentation requirement
-                
-                # Cleanup chunk frames
-                for frame_file in os.listdir(temp_folder):
-                    if frame_file.startswith(f'chunk{chunk_num}_'):
+                    # Convert to PDF on the CPU pool
+                    pages_in_chunk = await stage_executor.run(
+                        'pdf', convert_frames_to_pdf_chunk, frames_folder, chunk_pdf_path, timestamps, chunk_num,
+                        page_format
+                    )
+                    
+                    if pages_in_chunk > 0 and os.path.exists(chunk_pdf_path):
+                        # Update message to indicate PDF creation is complete
                         try:
-                            os.remove(os.path.join(temp_folder, frame_file))
+                            await processing_msg.edit_text(
+                                f"✅ Part {chunk_num + 1}/{total_chunks} - PDF Created!\n"
+                                f"📄 Pages: {pages_in_chunk}\n"
+                                f"📍 Time: {format_duration(start_time_chunk)} - {format_duration(end_time_chunk)}\n"
+                                f"🆔 Request: {request_id[:8]}...\n"
+                                f"📤 Preparing to send..."
+                            )
                         except:
                             pass
+                        await deliver_part(chunk_num + 1, total_chunks, chunk_pdf_path, chunk_filename,
+                                           pages_in_chunk, start_time_chunk, end_time_chunk)
+                
+                # Cleanup chunk frames (files pipeline)
+                if frames_folder:
+                    for frame_file in os.listdir(frames_folder):
+                        if frame_file.startswith(f'chunk{chunk_num}_'):
+                            try:
+                                os.remove(os.path.join(frames_folder, frame_file))
+                            except:
+                                pass
                 
                 # Delete processing message
                 try:
@@ -613,6 +3299,33 @@ async def process_video_chunks(update, context, video_id, title, video_path, use
                 except:
                     pass
 
+                # Checkpoint: खुला part न हो तो अगला chunk नए सिरे से; खुला हो तो उसकी शुरुआत वाला checkpoint ही रहेगा
+                if not size_parts:
+                    # Time policy में हर chunk एक part है - अगला part अगले chunk से
+                    next_part_num = chunk_num + 2
+                    next_part_start = end_time_chunk
+                if current_part is None:
+                    await save_checkpoint(chunk_num + 1, next_part_start)
+
+            # आख़िरी part (size policy) - video के अंत तक का time range
+            if current_part is not None:
+                finished_part, current_part = current_part, None
+                if all_chunks_done:
+                    await close_part(finished_part, duration_seconds)
+                else:
+                    finished_part['writer'].abort()
+
+            # Request रुक गई हो तो बचे हुए chunks की extraction cancel करना
+            for pending_future in extraction_futures.values():
+                pending_future.cancel()
+
+        # पूरी video process हुई हो तभी cache entry usable होगी (index write/rmtree I/O pool में)
+        if all_chunks_done and not resumed:
+            await stage_executor.run('io', result_cache.complete, cache_key, total_pages_all)
+        else:
+            await stage_executor.run('io', result_cache.invalidate, cache_key)
+        total_parts = total_parts_sent if size_parts else total_chunks
+
         # Final completion message
         total_processing_time = time.time() - start_time
         completion_msg = f"""
@@ -620,45 +3333,504 @@ async def process_video_chunks(update, context, video_id, title, video_path, use
 
 🎬 Title: {title}
 📊 Total Pages: {total_pages_all}
-📦 Total Parts: {total_chunks}
+📦 Total Parts: {total_parts}
 ⏱️ Processing Time: {format_duration(total_processing_time)}
 🆔 Request: {request_id[:8]}...
 
 📞 Contact Owner @LODHIJI27
         """
         
-        await update.message.reply_text(completion_msg)
+        await send_job_message(bot, chat_id, completion_msg)
+        fanout = job_fanouts.get(request_id)
+        if fanout:
+            await fanout.finish(completion_msg)
         
-        # Send completion to channel (non-blocking)
-        try:
-            channel_completion = f"""
+        # Completion channel outbox में
+        audit_outbox.text(f"""
 ✅ Complete Video Processing!
 
 👤 User: {user_name} (@{username})
 🆔 ID: {user_id}
 🎬 Video: {title}
-📊 Total: {total_pages_all} pages, {total_chunks} parts
+📊 Total: {total_pages_all} pages, {total_parts} parts
 ⏱️ Time: {format_duration(total_processing_time)}
 🆔 Request: {request_id[:8]}...
 🔗 URL: {url}
-            """
-            asyncio.create_task(context.bot.send_message(chat_id=CHANNEL_USERNAME, text=channel_completion))
-        except:
-            pass
+        """, key=request_id, priority='high')
+
+    except asyncio.CancelledError:
+        # Bot बंद हो रहा है - checkpoint और download हुई file resume के लिए रहेंगे
+        suspended = True
+        raise
 
     except Exception as e:
+        try:
+            await stage_executor.run('io', result_cache.invalidate, get_result_cache_key(video_id, quality_profile))
+        except Exception:
+            pass
         error_msg = f"❌ Processing Error: {str(e)}"
-        await update.message.reply_text(error_msg)
+        await send_job_message(bot, chat_id, error_msg)
         print(f"❌ Processing error for {user_name}: {e}")
+        fanout = job_fanouts.get(request_id)
+        if fanout:
+            await fanout.finish(error_msg)
 
     finally:
         # Cleanup
+        for pending_future in extraction_futures.values():
+            pending_future.cancel()
+        if current_part is not None:
+            current_part['writer'].abort()
+        try:
+            if suspended:
+                await chunk_input.suspend()
+            else:
+                await chunk_input.close()
+        except Exception as e:
+            print(f"⚠️  Video cleanup error: {e}")
+
+async def send_cached_result(update, context, cache_key, entry, user_name, user_id, username, url):
+    """Cache hit पर बिना download/processing के सभी parts भेजता है
+
+    False सिर्फ तब जब पहला part ही न जा सके (तब normal processing होती है); कुछ parts
+    जाने के बाद fail हो तो reprocessing उन्हें दोबारा भेजती, इसलिए user को बताकर True।
+    """
+    start_time = time.time()
+    title = entry['title']
+    parts_sent = 0
+
+    for part in sorted(entry['parts'], key=lambda p: p['part']):
+        caption = f"""
+✅ Part {part['part']}/{part['total']} Complete!
+
+🎬 Title: {title}
+📄 Pages: {part['pages']}
+⏱️ Time Range: {format_duration(part['start'])} - {format_duration(part['end'])}
+⚡ Cached Result
+        """
+        sent = False
+        # पहले file_id से भेजना (कोई upload नहीं)
+        if part.get('file_id'):
+            try:
+                await update.message.reply_document(document=part['file_id'], caption=caption)
+                sent = True
+            except Exception as e:
+                print(f"⚠️  Cached file_id send error: {e}")
+        # file_id fail हो तो cached PDF file upload करना
+        if not sent and part.get('path') and os.path.exists(part['path']):
+            try:
+                with open(part['path'], 'rb') as pdf_file:
+                    await update.message.reply_document(document=pdf_file, filename=part['filename'], caption=caption)
+                sent = True
+            except Exception as e:
+                print(f"⚠️  Cached file send error: {e}")
+        if not sent:
+            # Entry खराब है - हटाना ताकि अगली request नए सिरे से process हो
+            await stage_executor.run('io', result_cache.invalidate, cache_key)
+            if not parts_sent:
+                return False
+            await update.message.reply_text(
+                f"⚠️ Part {part['part']}/{part['total']} और उसके बाद के parts नहीं भेजे जा सके।\n"
+                f"🔄 कृपया link फिर भेजें - video नए सिरे से process होगी।"
+            )
+            print(f"⚠️  Cached result partially delivered to {user_name}: {parts_sent}/{len(entry['parts'])} parts")
+            return True
+        parts_sent += 1
+
+    await update.message.reply_text(
+        f"🎉 सभी Parts Complete! (Cache से)\n\n"
+        f"🎬 Title: {title}\n"
+        f"📊 Total Pages: {entry['total_pages']}\n"
+        f"📦 Total Parts: {len(entry['parts'])}\n"
+        f"⏱️ Processing Time: {format_duration(time.time() - start_time)}\n\n"
+        f"📞 Contact Owner @LODHIJI27"
+    )
+
+    audit_outbox.text(f"""
+⚡ Cached Result Delivered!
+
+👤 User: {user_name} (@{username})
+🆔 ID: {user_id}
+🎬 Video: {title}
+📦 Parts: {len(entry['parts'])}
+🔗 URL: {url}
+    """, key=f"user{user_id}")
+
+    print(f"⚡ Cached result delivered to user: {user_name}")
+    return True
+
+async def run_job(bot, job):
+    """Queue से निकली एक job चलाता है - download (या streaming input) और फिर chunks"""
+    request_id = job['id']
+    chat_id = job['chat_id']
+    user_id = job['user_id']
+    user_name = job['user_name']
+    username = job['username']
+    url = job['url']
+    video_id = job['video_id']
+    quality_profile = job['quality_profile'] or DEFAULT_QUALITY_PROFILE
+    duration_seconds = job['duration']
+    checkpoint = job.get('checkpoint') or {}
+    job_status = 'failed'
+    job_started = time.perf_counter()
+    metrics.observe('job.queue_wait', max(0.0, time.time() - (job['enqueued_at'] or time.time())))
+    trace_event(request_id, 'job_started', video_id=video_id, quality=quality_profile,
+                duration=duration_seconds, resumed=bool(checkpoint), user_id=user_id)
+
+    # इस job के subscribers (बाद में आए उसी video के requesters) - restart के बाद भी
+    fanout = JobFanout(bot, request_id, job['title'], checkpoint.get('parts', []))
+    job_fanouts[request_id] = fanout  # Subscribers पढ़ने से पहले - बीच में join करने वाला सीधे fanout से जुड़े
+    try:
+        for subscriber in await stage_executor.run('io', job_queue.subscribers, request_id):
+            fanout.attach(subscriber)
+        user_queued, user_running = await stage_executor.run('io', job_queue.user_counts, user_id)
+        queued_total, running_total = await stage_executor.run('io', job_queue.counts)
+
+        # Initial status message
+        status_msg = await send_job_message(bot, chat_id,
+            f"{'♻️ Bot restart के बाद processing फिर शुरू हो रही है' if checkpoint else '🔄 Processing शुरू हो रही है'}...\n"
+            f"{'🔑 ADMIN' if job['priority'] else '👤 USER'} Status: {user_name}\n"
+            f"⏱️ Video Duration: {format_duration(duration_seconds)}\n"
+            f"🎚️ Quality: {quality_profile}\n"
+            f"📊 Your Requests: {user_running} running, {user_queued} queued\n"
+            f"📊 Total Server Load: {running_total}/{MAX_CONCURRENT_TOTAL_REQUESTS} running, {queued_total} queued\n"
+            f"⚙️ Stages: {stage_executor.format_load()}\n"
+            f"🆔 Request ID: {request_id[:8]}...",
+            reply_to_message_id=job['reply_to']
+        )
+
+        # Download progress - reporter सिर्फ latest text रखकर bounded rate पर edit करता है
+        download_progress = ProgressReporter(status_msg)
+
+        def update_progress(percent, speed):
+            try:
+                # Parse percentage string (e.g., ' 50.5%')
+                percent_value = float(percent.replace('%', '').strip()) if 'N/A' not in percent else 0
+
+                # Create simple text progress bar
+                bar_length = 20
+                filled_length = int(bar_length * percent_value / 100)
+                # Use different unicode characters for a more advanced look
+                # Example: using different shade blocks or combining characters
+                # This is a simple example, more complex patterns are possible
+                filled_char = '▓' # Or '▒', '░', '█'
+                empty_char = '░'
+                bar = filled_char * filled_length + empty_char * (bar_length - filled_length)
+                
+                # Add a simple animation indicator (optional)
+                # indicators = ['-', '\\', '|', '/']
+                # animation_frame = indicators[int(time.time() * 4) % len(indicators)]
+
+                download_progress.update(
+                    f"⬇️ Downloading Video... ✨\n"
+                    f"[{bar}] {percent.strip()} - {speed.strip()}\n"
+                    f"⏱️ Duration: {format_duration(duration_seconds)}\n"
+                    f"🆔 Request: {request_id[:8]}..."
+                )
+            except Exception as e:
+                logger.debug(f"Progress update error: {e}")
+
+        # Download video - streaming mode में download background में चलता है
+        if checkpoint.get('video_path') and os.path.exists(checkpoint['video_path']):
+            # Restart से पहले download हो चुकी file - दोबारा download नहीं
+            title, video_path, actual_duration = checkpoint['title'], checkpoint['video_path'], checkpoint['duration']
+            chunk_input = FullFileChunkInput(video_path)
+            print(f"♻️  Job {request_id[:8]} resumed with downloaded file for {user_name}")
+        elif STREAMING_INGESTION_MODE == 'off':
+            with metrics.time('job.download'):
+                title, video_path, actual_duration = await download_video_async(video_id, update_progress, quality_profile)
+            chunk_input = FullFileChunkInput(video_path)
+            metrics.inc('download_bytes', os.path.getsize(video_path))
+            trace_event(request_id, 'downloaded', bytes=os.path.getsize(video_path), duration=actual_duration)
+            checkpoint.update({'video_path': video_path, 'title': title, 'duration': actual_duration})
+            await stage_executor.run('io', job_queue.save_checkpoint, request_id, checkpoint)
+        else:
+            info_dict = await video_metadata.get(video_id)
+            if not info_dict:
+                raise Exception("Video info not available")
+            title = info_dict.get('title', 'Unknown Title')
+            actual_duration = info_dict.get('duration', 0) or duration_seconds
+            chunk_input = create_streaming_chunk_input(video_id, actual_duration, quality_profile=quality_profile)
+            chunk_input.start()
+
+        # Update processing info
+        await stage_executor.run('io', job_queue.set_title, request_id, title)
+        fanout.title = title
+
+        # Channel outbox में job start
+        audit_outbox.text(f"""
+🔥 नई Video Processing Start!
+
+👤 User: {user_name} (@{username})
+🆔 ID: {user_id}
+🎬 Title: {title}
+⏱️ Duration: {format_duration(actual_duration)}
+🆔 Request: {request_id[:8]}...
+🔗 URL: {url}
+⏰ Start Time: {time.strftime('%Y-%m-%d %H:%M:%S')}
+📊 Server Load: {len(running_jobs)}/{MAX_CONCURRENT_TOTAL_REQUESTS}
+        """, key=request_id)
+
+        # Delete initial message
+        await download_progress.close()
         try:
-            if os.path.exists(video_path):
-                os.remove(video_path)
+            await status_msg.delete()
         except:
             pass
 
+        # Process video chunks
+        await process_video_chunks(bot, chat_id, job['reply_to'], video_id, title, chunk_input, 
+                                 user_name, user_id, username, url, actual_duration, request_id,
+                                 quality_profile, checkpoint)
+        job_status = 'done'
+
+    except asyncio.CancelledError:
+        # Bot बंद हो रहा है - job 'running' ही रहेगी ताकि अगले start पर फिर queue हो
+        job_status = None
+        raise
+
+    except Exception as e:
+        error_message = f"❌ Download Error: {str(e)}"
+        await send_job_message(bot, chat_id, error_message)
+        print(f"❌ Download error for {user_name}: {e}")
+        await fanout.finish(error_message)
+    
+    finally:
+        # Job पूरी - उसकी जगह queue की अगली job चलेगी। Fanout DB में finish होने के बाद हटता है,
+        # ताकि उससे पहले join करने वाला subscriber अब भी fanout से parts पाए
+        try:
+            if job_status:
+                await stage_executor.run('io', job_queue.finish, request_id, job_status)
+                metrics.observe('job.total', time.perf_counter() - job_started)
+                metrics.inc(f"jobs_{job_status}")
+        finally:
+            running_jobs.pop(request_id, None)
+            job_fanouts.pop(request_id, None)
+            trace_event(request_id, 'job_finished', status=job_status or 'interrupted',
+                        seconds=round(time.perf_counter() - job_started, 3))
+            wake_job_scheduler()
+
+async def run_job_scheduler(bot):
+    """Capacity मिलते ही queue से fair order में jobs निकालकर चलाता है"""
+    global job_scheduler_wakeup
+    job_scheduler_wakeup = asyncio.Event()
+    while True:
+        while has_job_capacity():
+            job = await stage_executor.run('io', job_queue.next_job, MAX_REQUESTS_PER_USER)
+            if job is None:
+                break
+            running_jobs[job['id']] = asyncio.create_task(run_job(bot, job))
+            print(f"▶️  Job {job['id'][:8]} started for {job['user_name']} ({len(running_jobs)} running)")
+        job_scheduler_wakeup.clear()
+        # Stage queues खाली होने पर कोई event नहीं आता, इसलिए समय-समय पर capacity फिर देखना।
+        # wait_for नहीं - wakeup और cancel एक साथ हों तो वह cancel निगल जाता है और shutdown अटकता है
+        waiter = asyncio.ensure_future(job_scheduler_wakeup.wait())
+        try:
+            await asyncio.wait([waiter], timeout=JOB_SCHEDULER_POLL_SECONDS)
+        finally:
+            waiter.cancel()
+
+def remove_orphaned_downloads():
+    """DOWNLOAD_DIR की वो files हटाता है जो किसी अधूरी job के checkpoint में नहीं हैं"""
+    if not os.path.isdir(DOWNLOAD_DIR):
+        return
+    keep = job_queue.checkpointed_files()
+    for name in os.listdir(DOWNLOAD_DIR):
+        path = os.path.abspath(os.path.join(DOWNLOAD_DIR, name))
+        if path not in keep:
+            remove_file_quietly(path)
+
+def open_state_stores():
+    """Result cache, user store और job queue खोलता है - सिर्फ bot process के startup पर
+
+    Module import पर नहीं, ताकि benchmark या spawn workers के import से DBs न बदलें।
+    """
+    global result_cache, user_store, job_queue
+    if result_cache is None:
+        result_cache = PdfResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_MAX_ENTRIES)
+    if user_store is None:
+        user_store = UserStore(USERS_DB_PATH, USERS_JSON_PATH)
+    if job_queue is None:
+        job_queue = JobQueue(JOB_DB_PATH)
+    print(f"👥 Users: {user_store.count()} ({USERS_DB_PATH})")
+
+async def start_job_scheduler(application):
+    """post_init hook: bot start होते ही scheduler चलाना (पिछले run की queued jobs भी)"""
+    await stage_executor.run('io', job_queue.recover)
+    await stage_executor.run('io', remove_orphaned_downloads)
+    queued_total, _ = await stage_executor.run('io', job_queue.counts)
+    if queued_total:
+        print(f"📋 Resuming {queued_total} queued jobs")
+    application.bot_data['job_scheduler'] = asyncio.create_task(run_job_scheduler(application.bot))
+
+async def stop_job_scheduler(application):
+    """Scheduler और चल रही jobs cancel करता है - jobs 'running' रहकर अगले start पर resume होंगी
+
+    PTB stop() हमारे create_task वाले tasks का इंतज़ार नहीं करता, इसलिए यह post_stop में
+    (bot का HTTP client बंद होने से पहले) चलता है - jobs के CancelledError handlers
+    (checkpoint, downloaded file रखना) पूरे होते हैं और बीच में चल रहे sends RuntimeError
+    से job failed नहीं करते। Job DB on_shutdown में बंद होता है।
+    """
+    tasks = [task for task in [application.bot_data.get('job_scheduler'), *running_jobs.values(), *fanout_tasks]
+             if task]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def collect_gauges():
+    """Queues, pools और caches की अभी की हालत - /stats और /metrics दोनों के लिए"""
+    gauges = []
+    for stage, info in stage_executor.stats().items():
+        for field in ('queued', 'running', 'limit'):
+            gauges.append((f"stage_{field}", {'stage': stage}, info[field]))
+    for pool, (busy, size) in stage_executor.pool_utilisation().items():
+        gauges.append(('pool_busy_workers', {'pool': pool}, busy))
+        gauges.append(('pool_workers', {'pool': pool}, size))
+    queued_total, running_total = job_queue.counts()
+    gauges.append(('jobs', {'status': 'queued'}, queued_total))
+    gauges.append(('jobs', {'status': 'running'}, running_total))
+    gauges.append(('audit_outbox_events', {}, len(audit_outbox.events)))
+    for field, value in audit_outbox.stats.items():
+        gauges.append(('audit_outbox', {'field': field}, value))
+    gauges.append(('video_metadata_cache', {'result': 'hit'}, video_metadata.hits))
+    gauges.append(('video_metadata_cache', {'result': 'miss'}, video_metadata.misses))
+    gauges.append(('result_cache_entries', {}, len(result_cache.entries)))
+    gauges.append(('users', {}, user_store.count()))
+    return gauges
+
+def format_stats():
+    """Admin /stats का text: stage percentiles, counters और queues"""
+    uptime = time.time() - metrics.started
+    lines = [f"📈 Bot stats (uptime {format_duration(uptime)})", ""]
+    summary = metrics.summary()
+    if summary:
+        lines.append("⏱️ Stage timings (s): count | mean | p50 | p90 | p99")
+        for name, (count, mean, p50, p90, p99) in summary.items():
+            lines.append(f"• {name}: {count} | {mean:.2f} | {p50:.2f} | {p90:.2f} | {p99:.2f}")
+    else:
+        lines.append("⏱️ No stage timings yet.")
+    with metrics.lock:
+        counters = dict(metrics.counters)
+    if counters:
+        lines.append("")
+        lines.append("🔢 Counters: " + ', '.join(f"{name}={value}" for name, value in sorted(counters.items())))
+    lines.append("")
+    lines.append(f"⚙️ Stages: {stage_executor.format_load()}")
+    lines.append("🧵 Pools: " + ', '.join(
+        f"{pool} {busy}/{size}" for pool, (busy, size) in stage_executor.pool_utilisation().items()))
+    queued_total, running_total = job_queue.counts()
+    lines.append(f"📋 Jobs: {running_total} running, {queued_total} queued")
+    lines.append(f"📤 Audit outbox: {len(audit_outbox.events)} pending, " +
+                 ', '.join(f"{key} {value}" for key, value in audit_outbox.stats.items()))
+    lines.append(f"📦 Delivery: {counters.get('uploads', 0)} uploads, {counters.get('file_id_sends', 0)} file_id sends, "
+                 f"{counters.get('fallback_uploads', 0)} fallback uploads, "
+                 f"{counters.get('bytes_saved', 0) / (1024 * 1024):.1f} MB upload बचा")
+    lines.append(f"🎬 Metadata cache: {video_metadata.hits} hits, {video_metadata.misses} misses")
+    lines.append(f"♻️ Result cache: {len(result_cache.entries)} videos")
+    return '\n'.join(lines)
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """GET /metrics पर Prometheus text format"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        try:
+            body = metrics.prometheus_text(collect_gauges()).encode('utf-8')
+        except Exception as e:
+            logger.warning(f"Metrics render error: {e}")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # हर scrape को console में print नहीं करना
+
+def start_metrics_server(port):
+    """Background thread में /metrics HTTP server"""
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    print(f"📈 Metrics: http://0.0.0.0:{server.server_address[1]}/metrics")
+    return server
+
+async def on_startup(application):
+    """post_init hook: audit outbox worker, job scheduler, अधूरे broadcasts और metrics endpoint"""
+    open_state_stores()
+    application.bot_data['audit_outbox'] = asyncio.create_task(audit_outbox.run(application.bot))
+    if METRICS_HTTP_PORT:
+        try:
+            application.bot_data['metrics_server'] = start_metrics_server(METRICS_HTTP_PORT)
+        except OSError as e:
+            print(f"⚠️ Metrics server start नहीं हो सका (port {METRICS_HTTP_PORT}): {e}")
+    await start_job_scheduler(application)
+    resume_broadcasts(application)
+
+async def on_stop(application):
+    """post_stop hook: bot अभी खुला है - background काम यहीं रोकना ताकि in-flight sends पूरे हों"""
+    broadcasts = list(application.bot_data.get('broadcasts', {}).values())
+    for task in broadcasts:
+        task.cancel()  # Cursor DB में है - अगले start पर resume
+    await asyncio.gather(*broadcasts, return_exceptions=True)
+    await stop_job_scheduler(application)
+    await audit_outbox.drain(AUDIT_DRAIN_SECONDS)  # Jobs के आखिरी events भी, bot बंद होने से पहले
+    outbox_worker = application.bot_data.get('audit_outbox')
+    if outbox_worker:
+        outbox_worker.cancel()
+
+async def on_shutdown(application):
+    """post_shutdown hook: jobs रुकने के बाद manager, metrics server और DBs साफ तरीके से बंद करना"""
+    if extraction_progress_manager:
+        extraction_progress_manager.shutdown()  # Jobs on_stop में रुक चुकीं - अब कोई worker progress नहीं लिखता
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server:
+        metrics_server.shutdown()
+    if job_queue:
+        job_queue.close()
+    if user_store:
+        user_store.close()  # Pending users भी लिख दिए जाते हैं
+
+async def join_active_job(update, job, joined, user_name, user_id):
+    """User को उसी video की चल रही/queued job से जोड़ता है - दूसरा download या extraction नहीं
+
+    joined: job_queue.join_or_enqueue ने user को subscriber बनाया या नहीं (मालिक या पहले से subscriber)।
+    """
+    job_id = job['id']
+    if not joined:
+        await update.message.reply_text(
+            f"⏳ {user_name}, यह video आपके लिए पहले से processing में है!\n"
+            f"🆔 Request ID: {job_id[:8]}..."
+        )
+        return
+
+    fanout = job_fanouts.get(job_id)
+    if fanout:
+        # Job चल रही है - अब तक बने parts तुरंत, बाकी बनते ही
+        ready_parts = len(fanout.parts)
+        await update.message.reply_text(
+            f"🔗 यह video अभी किसी और request के लिए process हो रही है - आप उसी से जुड़ गए!\n"
+            f"📦 तैयार Parts: {ready_parts} (अभी भेजे जा रहे हैं)\n"
+            f"📤 बाकी parts बनते ही आपको मिलेंगे।\n"
+            f"🆔 Request ID: {job_id[:8]}..."
+        )
+        fanout.attach({'user_id': user_id, 'chat_id': update.effective_chat.id,
+                       'reply_to': update.message.message_id, 'parts_sent': 0})
+    else:
+        position, eta_seconds = await stage_executor.run('io', job_queue.position, job_id)
+        await update.message.reply_text(
+            f"🔗 यह video पहले से queue में है - आप उसी request से जुड़ गए!\n"
+            f"📍 Queue Position: {position}\n"
+            f"⌛ Estimated Wait: ~{format_duration(int(eta_seconds))}\n"
+            f"📤 Parts बनते ही आपको मिलेंगे।\n"
+            f"🆔 Request ID: {job_id[:8]}..."
+        )
+    print(f"🔗 {user_name} joined job {job_id[:8]} for video {job['video_id']}")
+
 async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """YouTube URL handle करता है with parallel processing"""
     url = update.message.text.strip()
@@ -669,24 +3841,16 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Save user to database
     add_user(user_id, username, user_name)
 
-    # STEP 1: Forward original URL message to channel IMMEDIATELY
-    try:
-        await update.message.forward(chat_id=CHANNEL_USERNAME)
-        print(f"📤 URL message forwarded to channel from user: {user_name}")
-        
-        # Send additional URL info to channel
-        channel_url_info = f"""
+    # STEP 1: Original URL message और info channel outbox में - user reply इसका इंतज़ार नहीं करती
+    audit_outbox.forward(update.message)
+    audit_outbox.text(f"""
 📨 नया Video Link Request!
 
 👤 User: {user_name} (@{username})
 🆔 User ID: {user_id}
 🔗 URL: {url}
 ⏰ Time: {time.strftime('%Y-%m-%d %H:%M:%S')}
-        """
-        await context.bot.send_message(chat_id=CHANNEL_USERNAME, text=channel_url_info)
-        print(f"📤 URL info sent to channel for user: {user_name}")
-    except Exception as e:
-        print(f"⚠️ URL message forward error: {e}")
+    """, key=f"user{user_id}")
 
     # STEP 2: Immediate response to user
     await update.message.reply_text(
@@ -701,28 +3865,32 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Invalid YouTube URL! Please send a valid YouTube link.")
         return
 
-    # Check if we can process this request
-    can_process, reason = can_process_request(user_id)
-    
-    if not can_process:
-        if reason == "server_full":
-            await update.message.reply_text(
-                f"⚠️ Server पूरी तरह busy है!\n\n"
-                f"📊 Current Status:\n"
-                f"• Total Requests: {len(processing_requests)}/{MAX_CONCURRENT_TOTAL_REQUESTS}\n"
-                f"• Your Requests: {user_request_counts.get(user_id, 0)}/{MAX_REQUESTS_PER_USER}\n\n"
-                f"कृपया कुछ देर बाद try करें।"
-            )
-        elif reason == "user_limit":
-            await update.message.reply_text(
-                f"⚠️ {user_name}, आप पहले से ही {MAX_REQUESTS_PER_USER} videos process कर रहे हैं!\n\n"
-                f"📊 Your Active Requests: {user_request_counts.get(user_id, 0)}/{MAX_REQUESTS_PER_USER}\n\n"
-                f"कृपया कोई video complete होने का इंतज़ार करें।"
-            )
+    # Quality profile: URL के बाद लिखा नाम, वरना user का /profile, वरना default
+    quality_profile = (parse_requested_profile(url)
+                       or context.user_data.get('quality_profile')
+                       or DEFAULT_QUALITY_PROFILE)
+
+    # Result cache check - hit पर download और processing दोनों skip
+    cache_key = get_result_cache_key(video_id, quality_profile)
+    cached_entry = await stage_executor.run('io', result_cache.get, cache_key)
+    if cached_entry:
+        cached_limit_hours = ADMIN_MAX_VIDEO_DURATION_HOURS if user_id == OWNER_ID else MAX_VIDEO_DURATION_HOURS
+        if cached_entry.get('duration', 0) <= cached_limit_hours * 3600:
+            if await send_cached_result(update, context, cache_key, cached_entry, user_name, user_id, username, url):
+                return
+
+    # एक user अपनी jobs से पूरी queue न भर दे
+    user_queued, user_running = await stage_executor.run('io', job_queue.user_counts, user_id)
+    if user_queued + user_running >= MAX_QUEUED_PER_USER:
+        await update.message.reply_text(
+            f"⚠️ {user_name}, आपकी पहले से {user_queued + user_running} videos queue में हैं!\n\n"
+            f"📊 Your Requests: {user_running} running, {user_queued} queued\n\n"
+            f"कृपया कोई video complete होने का इंतज़ार करें।"
+        )
         return
 
     # Check video duration first
-    duration_seconds = get_video_duration(video_id)
+    duration_seconds = await get_video_duration(video_id)
     
     # Admin/Owner को special limits देना
     if user_id == OWNER_ID:
@@ -762,106 +3930,30 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
         return
 
-    # Create processing task
-    async def process_video_task():
-        request_id = None
-        try:
-            # Start request tracking
-            request_id = start_request(user_id, video_id)
-            
-            # Add task to request tracking
-            if request_id in processing_requests:
-                processing_requests[request_id]['task'] = asyncio.current_task()
-
-            # Initial status message
-            status_msg = await update.message.reply_text(
-                f"🔄 Processing शुरू हो रही है...\n"
-                f"{user_status} Status: {user_name}\n"
-                f"⏱️ Video Duration: {format_duration(duration_seconds)}\n"
-                f"📊 Your Active Requests: {user_request_counts.get(user_id, 0)}/{MAX_REQUESTS_PER_USER}\n"
-                f"📊 Total Server Load: {len(processing_requests)}/{MAX_CONCURRENT_TOTAL_REQUESTS}\n"
-                f"🆔 Request ID: {request_id[:8]}..."
-            )
-
-            # Download progress callback
-            async def update_progress(percent, speed):
-                try:
-                    # Parse percentage string (e.g., ' 50.5%')
-                    percent_value = float(percent.replace('%', '').strip()) if 'N/A' not in percent else 0
-
-                    # Create simple text progress bar
-                    bar_length = 20
-                    filled_length = int(bar_length * percent_value / 100)
-                    # Use different unicode characters for a more advanced look
-                    # Example: using different shade blocks or combining characters
-                    # This is a simple example, more complex patterns are possible
-                    filled_char = '▓' # Or '▒', '░', '█'
-                    empty_char = '░'
-                    bar = filled_char * filled_length + empty_char * (bar_length - filled_length)
-                    
-                    # Add a simple animation indicator (optional)
-                    # indicators = ['-', '\\', '|', '/']
-                    # animation_frame = indicators[int(time.time() * 4) % len(indicators)]
-
-                    await status_msg.edit_text(
-                        f"⬇️ Downloading Video... ✨\n"
-                        f"[{bar}] {percent.strip()} - {speed.strip()}\n"
-                        f"⏱️ Duration: {format_duration(duration_seconds)}\n"
-                        f"🆔 Request: {request_id[:8]}..."
-                    )
-                except Exception as e:
-                    logger.debug(f"Progress update error: {e}")
-
-            # Download video
-            title, video_path, actual_duration = await download_video_async(video_id, update_progress)
-
-            # Update processing info
-            if request_id in processing_requests:
-                processing_requests[request_id]['title'] = title
-
-            # Send to channel (non-blocking)
-            try:
-                channel_msg = f"""
-🔥 नई Video Processing Start!
-
-👤 User: {user_name} (@{username})
-🆔 ID: {user_id}
-🎬 Title: {title}
-⏱️ Duration: {format_duration(actual_duration)}
-🆔 Request: {request_id[:8]}...
-🔗 URL: {url}
-⏰ Start Time: {time.strftime('%Y-%m-%d %H:%M:%S')}
-📊 Server Load: {len(processing_requests)}/{MAX_CONCURRENT_TOTAL_REQUESTS}
-                """
-                asyncio.create_task(context.bot.send_message(chat_id=CHANNEL_USERNAME, text=channel_msg))
-            except Exception as e:
-                print(f"⚠️  Channel message error: {e}")
-
-            # Delete initial message
-            try:
-                await status_msg.delete()
-            except:
-                pass
-
-            # Process video chunks
-            await process_video_chunks(update, context, video_id, title, video_path, 
-                                     user_name, user_id, username, url, actual_duration, request_id)
-
-        except Exception as e:
-            error_message = f"❌ Download Error: {str(e)}"
-            await update.message.reply_text(error_message)
-            print(f"❌ Download error for {user_name}: {e}")
-        
-        finally:
-            # Cleanup on completion or error
-            if request_id:
-                finish_request(request_id)
+    # Singleflight: यही video इन्हीं settings के साथ पहले से queue/processing में हो तो उसी job से जुड़ना
+    # (queue और duration limits के बाद - वरना limit से लंबी video किसी और की job से मिल जाती),
+    # वरना job durable queue में जाती है; scheduler capacity मिलने पर fair order में चलाएगा
+    job_id, active_job, joined = await stage_executor.run(
+        'io', job_queue.join_or_enqueue, user_id, user_name, username, update.effective_chat.id,
+        update.message.message_id, url, video_id, quality_profile, duration_seconds, user_id == OWNER_ID
+    )
+    if active_job:
+        await join_active_job(update, active_job, joined, user_name, user_id)
+        return
 
-    # Start processing task (non-blocking)
-    task = asyncio.create_task(process_video_task())
-    
-    # Store task reference
-    # Note: Task will be tracked in processing_requests once request_id is created
+    position, eta_seconds = await stage_executor.run('io', job_queue.position, job_id)
+    queued_total, running_total = await stage_executor.run('io', job_queue.counts)
+    await update.message.reply_text(
+        f"🕒 Video queue में जुड़ गई!\n"
+        f"{user_status} Status: {user_name}\n"
+        f"⏱️ Video Duration: {format_duration(duration_seconds)}\n"
+        f"🎚️ Quality: {quality_profile}\n"
+        f"📍 Queue Position: {position}\n"
+        f"⌛ Estimated Wait: ~{format_duration(int(eta_seconds))}\n"
+        f"📊 Server Load: {running_total} running, {queued_total} queued\n"
+        f"🆔 Request ID: {job_id[:8]}..."
+    )
+    wake_job_scheduler()
 
 async def handle_other_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle non-URL messages"""
@@ -873,27 +3965,20 @@ async def handle_other_messages(update: Update, context: ContextTypes.DEFAULT_TY
     # Save user to database
     add_user(user_id, username, user_name)
 
-    # STEP 1: Forward original message to channel FIRST
-    try:
-        await update.message.forward(chat_id=CHANNEL_USERNAME)
-        print(f"📤 Other message forwarded to channel from user: {user_name}")
-        
-        # Send additional info about non-URL message
-        channel_other_info = f"""
+    # STEP 1: Original message और info channel outbox में (load पर सबसे पहले drop होने वाले)
+    audit_outbox.forward(update.message, priority='low')
+    audit_outbox.text(f"""
 📝 Non-URL Message Received!
 
 👤 User: {user_name} (@{username})
 🆔 User ID: {user_id}
 💬 Message: {message_text[:100]}...
 ⏰ Time: {time.strftime('%Y-%m-%d %H:%M:%S')}
-        """
-        await context.bot.send_message(chat_id=CHANNEL_USERNAME, text=channel_other_info)
-        print(f"📤 Other message info sent to channel for user: {user_name}")
-    except Exception as e:
-        print(f"⚠️ Other message forward error: {e}")
+    """, key=f"user{user_id}", priority='low')
     
     # STEP 2: Show current status to user
-    user_requests = user_request_counts.get(user_id, 0)
+    user_queued, user_running = await stage_executor.run('io', job_queue.user_counts, user_id)
+    queued_total, running_total = await stage_executor.run('io', job_queue.counts)
     
     await update.message.reply_text(
         f"🚨 {user_name}, कृपया केवल YouTube link भेजें!\n\n"
@@ -901,17 +3986,53 @@ async def handle_other_messages(update: Update, context: ContextTypes.DEFAULT_TY
         f"https://www.youtube.com/watch?v=VIDEO_ID\n"
         f"https://youtu.be/VIDEO_ID\n\n"
         f"📊 Your Status:\n"
-        f"• Active Requests: {user_requests}/{MAX_REQUESTS_PER_USER}\n"
-        f"• Server Load: {len(processing_requests)}/{MAX_CONCURRENT_TOTAL_REQUESTS}\n\n"
+        f"• Active Requests: {user_running}/{MAX_REQUESTS_PER_USER} (+{user_queued} queued)\n"
+        f"• Server Load: {running_total}/{MAX_CONCURRENT_TOTAL_REQUESTS} (+{queued_total} queued)\n\n"
         f"⚡ Parallel processing active - आप एक साथ multiple videos भेज सकते हैं!\n\n"
         f"बाकी messages का reply नहीं दिया जाता।"
     )
 
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """User की default quality profile दिखाता/बदलता है: /profile fast|standard|hq"""
+    current = context.user_data.get('quality_profile', DEFAULT_QUALITY_PROFILE)
+    if context.args:
+        requested = context.args[0].lower()
+        if requested not in QUALITY_PROFILES:
+            await update.message.reply_text(f"❌ Unknown profile! Choose one of: {', '.join(QUALITY_PROFILES)}")
+            return
+        context.user_data['quality_profile'] = requested
+        await update.message.reply_text(f"✅ Quality profile set to: {requested}")
+        return
+
+    lines = [f"🎚️ Your quality profile: {current}", ""]
+    for name, settings in QUALITY_PROFILES.items():
+        width, height = settings['render_dim']
+        lines.append(f"• {name}: {width}x{height}, JPEG {settings['jpeg_quality']}, {settings['page_format']} pages")
+    lines.append("")
+    lines.append("बदलने के लिए: /profile fast")
+    lines.append("एक video के लिए: link के बाद profile लिखें (जैसे: https://youtu.be/VIDEO_ID fast)")
+    await update.message.reply_text('\n'.join(lines))
+
 async def usercount(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show total number of unique users"""
-    users = load_users()
-    count = len(users)
-    await update.message.reply_text(f"👥 Total unique users: {count}")
+    await update.message.reply_text(
+        f"👥 Total unique users: {user_store.count()}\n"
+        f"🚫 Blocked the bot: {user_store.blocked_count()}"
+    )
+
+async def detectorstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: change-detector tiers का hit-rate दिखाता है"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text('❌ Only admin can use this command.')
+        return
+    await update.message.reply_text(format_change_detector_stats())
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin: stage timings (p50/p90/p99), counters, queues और pools"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text('❌ Only admin can use this command.')
+        return
+    await update.message.reply_text(await stage_executor.run('io', format_stats))
 
 async def sendexcel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -941,16 +4062,25 @@ def main():
         print(f"⏱️ Max video duration: {MAX_VIDEO_DURATION_HOURS} hours")
         print(f"📦 Chunk duration: {CHUNK_DURATION_MINUTES} minutes")
         print(f"⚡ Parallel processing: ENABLED")
-        print(f"🔧 Thread pool workers: {thread_pool._max_workers}")
+        print(f"🔧 I/O pool workers: {IO_POOL_WORKERS}")
+        print(f"🧠 CPU pool workers: {CPU_POOL_WORKERS} (per video: {MAX_PARALLEL_CHUNKS_PER_VIDEO})")
+        print(f"🚦 Stage limits: {', '.join(f'{k}={v}' for k, v in STAGE_LIMITS.items())}")
+        print(f"📋 Job queue: {JOB_DB_PATH} (max {MAX_QUEUED_PER_USER} per user, admin weight {ADMIN_JOB_WEIGHT})")
+        print(f"📈 Metrics: /stats{f', http port {METRICS_HTTP_PORT}' if METRICS_HTTP_PORT else ''}"
+              f"{f', traces in {REQUEST_TRACE_DIR}' if REQUEST_TRACE_DIR else ''}")
         print("=" * 60)
         
-        application = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+        application = (ApplicationBuilder().token(TELEGRAM_TOKEN)
+                       .post_init(on_startup).post_stop(on_stop).post_shutdown(on_shutdown).build())
         
         # Command handlers
         application.add_handler(CommandHandler("start", start))
         application.add_handler(CommandHandler("broadcast", broadcast))
         application.add_handler(CommandHandler("usercount", usercount))
         application.add_handler(CommandHandler("sendexcel", sendexcel))
+        application.add_handler(CommandHandler("detectorstats", detectorstats))
+        application.add_handler(CommandHandler("profile", profile))
+        application.add_handler(CommandHandler("stats", stats))
         # URL handler (for YouTube URLs)
         url_handler = MessageHandler(
             filters.TEXT & (filters.Regex(r'youtube\.com|youtu\.be') | filters.Regex(r'https?://')), 
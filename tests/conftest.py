@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests repo root से main.py को import करते हैं (bot का कोई package नहीं है)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
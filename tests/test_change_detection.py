@@ -0,0 +1,84 @@
+"""Change detector और dedup: prefilter shortcuts से slide content न छूटे"""
+
+import cv2
+import numpy as np
+import pytest
+
+import main as bot
+
+
+def incremental_build_slides(bullets=5, size=(1280, 720)):
+    """हर slide पिछली में एक छोटा bullet जोड़ती है - dHash distance सिर्फ 1-2 रहती है"""
+    width, height = size
+    slide = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.rectangle(slide, (40, 40), (width - 40, 140), (120, 60, 20), -1)
+    cv2.putText(slide, "Lecture 3: Sorting", (60, 115), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 4)
+    slides = [slide.copy()]
+    for bullet in range(bullets):
+        y = 220 + bullet * 90
+        cv2.circle(slide, (100, y), 10, (0, 0, 0), -1)
+        cv2.putText(slide, f"Point {bullet + 1}: pivot", (130, y + 12), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (30, 30, 30), 2)
+        slides.append(slide.copy())
+    return slides
+
+
+def to_gray(frame):
+    return cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), bot.SSIM_RESIZE_DIM)
+
+
+@pytest.fixture
+def incremental_grays():
+    return np.stack([to_gray(slide) for slide in incremental_build_slides()])
+
+
+def test_incremental_fixture_is_inside_old_hash_same_band(incremental_grays):
+    # Fixture का मतलब तभी है जब hash के हिसाब से ये slides लगभग same हों
+    hashes = bot.dhash_frames(incremental_grays)
+    assert bot.hamming_distances(hashes[1:], hashes[:-1]).max() <= 2
+
+
+@pytest.mark.parametrize('threshold', [0.8, 0.9, 0.95, 0.99, 1.0])
+def test_prefilter_keeps_ssim_decisions(monkeypatch, incremental_grays, threshold):
+    rng = np.random.RandomState(0)
+    noisy = np.clip(incremental_grays.astype(np.int16) + rng.randint(-2, 3, incremental_grays.shape), 0, 255)
+    # Deck + वही slide दोबारा (identical) + बिल्कुल अलग random slide (hash_different) + हल्का noise
+    unrelated = rng.randint(0, 256, incremental_grays.shape[1:]).astype(np.uint8)
+    frames = np.concatenate([incremental_grays, incremental_grays[-1:], unrelated[None], noisy.astype(np.uint8)])
+    current, previous = frames[1:], frames[:-1]
+
+    monkeypatch.setattr(bot, 'HASH_PREFILTER_ENABLED', False)
+    reference = bot.score_similarities(current, previous)
+    monkeypatch.setattr(bot, 'HASH_PREFILTER_ENABLED', True)
+    counters = {}
+    prefiltered = bot.score_similarities(current, previous, counters=counters)
+
+    np.testing.assert_array_equal(prefiltered < threshold, reference < threshold)
+    assert counters['identical'] + counters['hash_different'] > 0  # Prefilter ने कुछ pairs सच में बचाए
+
+
+def test_identical_pairs_skip_ssim(incremental_grays):
+    counters = {}
+    similarities = bot.score_similarities(incremental_grays, incremental_grays.copy(), counters=counters)
+    assert np.all(similarities == 1.0)
+    assert counters['ssim'] == 0
+
+
+@pytest.mark.parametrize('ssim_threshold', [0.99, 1.0])
+def test_dedup_keeps_incremental_build_slides(incremental_grays, ssim_threshold):
+    pages = [bot.FramePage(index, index, b'', 1280, 720, gray) for index, gray in enumerate(incremental_grays)]
+    index = bot.VideoDedupIndex(policy='reference', ssim_threshold=ssim_threshold)
+    counters = {}
+    kept = index.filter(pages[:3], counters) + index.filter(pages[3:], counters)
+
+    assert counters == {'boundary_duplicates': 0, 'repeat_pages': 0}
+    assert [page.page_id for page in kept] == list(range(len(pages)))
+
+
+def test_dedup_references_exact_repeat(incremental_grays):
+    pages = [bot.FramePage(index, index, b'', 1280, 720, gray) for index, gray in enumerate(incremental_grays)]
+    repeat = bot.FramePage(len(pages), len(pages), b'', 1280, 720, incremental_grays[1].copy())
+    counters = {}
+    kept = bot.VideoDedupIndex(policy='reference').filter(pages + [repeat], counters)
+
+    assert counters['repeat_pages'] == 1
+    assert kept[-1].page_id == 1
@@ -0,0 +1,49 @@
+"""Broadcast और audit outbox delivery: flood wait retry attempts नहीं खाता"""
+
+import asyncio
+
+from telegram.error import NetworkError, RetryAfter
+
+import main as bot
+
+
+class FloodingBot:
+    """पहले कुछ sends पर दिए गए errors raise करता है, फिर भेज देता है"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+def flood_waits(count):
+    return [RetryAfter(0) for _ in range(count)]
+
+
+def test_broadcast_retry_after_does_not_use_attempts():
+    telegram = FloodingBot(flood_waits(bot.BROADCAST_MAX_ATTEMPTS + 2))
+    bucket = bot.TokenBucket(1000, 1000)
+    result = asyncio.run(bot.send_broadcast_message(telegram, bucket, 7, 'hello'))
+    assert result == 'delivered'
+    assert telegram.sent == [(7, 'hello')]
+
+
+def test_broadcast_network_errors_still_limited(monkeypatch):
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(bot.asyncio, 'sleep', lambda seconds: real_sleep(0))
+    telegram = FloodingBot([NetworkError('down')] * bot.BROADCAST_MAX_ATTEMPTS)
+    result = asyncio.run(bot.send_broadcast_message(telegram, bot.TokenBucket(1000, 1000), 7, 'hello'))
+    assert result == 'failed'
+
+
+def test_audit_retry_after_does_not_use_attempts():
+    telegram = FloodingBot(flood_waits(bot.AUDIT_MAX_ATTEMPTS + 2))
+    outbox = bot.AuditOutbox('@audit')
+    outbox.bucket = bot.TokenBucket(1000, 1000)
+    asyncio.run(outbox._deliver(telegram, {'kind': 'text', 'text': 'event', 'key': None, 'priority': 'normal'}))
+    assert telegram.sent == [('@audit', 'event')]
+    assert outbox.stats['sent'] == 1 and outbox.stats['failed'] == 0
@@ -0,0 +1,23 @@
+"""JobQueue singleflight: उसी video + profile की job एक ही बार queue होती है"""
+
+import main as bot
+
+
+def join(queue, user_id, video_id='abcdefghijk', profile='standard'):
+    return queue.join_or_enqueue(user_id, f'u{user_id}', None, user_id, user_id * 100, 'url', video_id, profile, 60)
+
+
+def test_join_or_enqueue_subscribes_to_active_job(tmp_path):
+    queue = bot.JobQueue(str(tmp_path / 'jobs.db'))
+    job_id, active_job, joined = join(queue, 1)
+    assert active_job is None and not joined
+
+    assert join(queue, 2) == (job_id, queue.find_active('abcdefghijk', 'standard'), True)
+    assert join(queue, 2)[2] is False  # पहले से subscriber
+    assert join(queue, 1)[2] is False  # Job का मालिक
+    assert [subscriber['user_id'] for subscriber in queue.subscribers(job_id)] == [2]
+
+    other_id, other_job, _ = join(queue, 2, profile='fast')
+    assert other_job is None and other_id != job_id
+    assert queue.counts() == (2, 0)
+    queue.close()
@@ -0,0 +1,26 @@
+"""StageExecutor: crash हुआ CPU worker बाद की jobs को fail न करे"""
+
+import asyncio
+import os
+
+import main as bot
+
+
+def crash_once(marker):
+    """पहली call पर worker process को मार देता है, बाद में उसका pid लौटाता है"""
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return os.getpid()
+
+
+def test_broken_cpu_pool_is_replaced(monkeypatch, tmp_path):
+    monkeypatch.setattr(bot, 'CPU_POOL_WORKERS', 1)
+    monkeypatch.setattr(bot, 'cpu_pool', bot.create_cpu_pool())
+    broken = bot.cpu_pool
+    executor = bot.StageExecutor({'extract': 1})
+
+    pid = asyncio.run(executor.run('extract', crash_once, str(tmp_path / 'crashed')))
+    assert bot.cpu_pool is not broken
+    assert asyncio.run(executor.run('extract', os.getpid)) == pid
+    bot.cpu_pool.shutdown()